@@ -0,0 +1,117 @@
+"""
+Throughput of transactional sends against the local wasender mock.
+
+Compares the old single-send path (one request at a time, headers rebuilt
+per call, default client) with FastSender (shared tuned client, cached
+headers, bounded concurrency) and reports messages/s and latency
+percentiles. The mock runs in its own process with MOCK_LATENCY_MS of
+simulated provider latency.
+
+The mock is plain-HTTP uvicorn, so both runs use HTTP/1.1 here; against
+the real https endpoint FastSender negotiates HTTP/2 when `h2` is
+installed.
+
+Usage:
+    python benchmarks/bench_fast_send.py [messages] [concurrency]
+"""
+
+import asyncio
+import os
+import subprocess
+import sys
+import time
+
+import httpx
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from messaging.wasender import FastSender
+
+PORT = 8912
+URL = f"http://127.0.0.1:{PORT}/api/send-message"
+LATENCY_MS = os.getenv("MOCK_LATENCY_MS", "20")
+
+
+def start_mock() -> subprocess.Popen:
+    env = dict(os.environ, MOCK_LATENCY_MS=LATENCY_MS)
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "benchmarks.mock_wasender:app",
+         "--port", str(PORT), "--log-level", "warning"],
+        cwd=ROOT, env=env)
+    deadline = time.time() + 15
+    while time.time() < deadline:
+        try:
+            httpx.get(f"http://127.0.0.1:{PORT}/stats")
+            return proc
+        except httpx.TransportError:
+            time.sleep(0.1)
+    proc.kill()
+    raise RuntimeError("mock server did not start")
+
+
+def percentile(values, p: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p))]
+
+
+async def run_legacy(n: int):
+    """One request at a time, new headers dict per call (the old path)."""
+    latencies = []
+    async with httpx.AsyncClient() as client:
+        for i in range(n):
+            headers = {"Authorization": "Bearer bench-key", "Content-Type": "application/json"}
+            start = time.perf_counter()
+            response = await client.post(URL, headers=headers,
+                                         json={"to": f"+9665{i:08d}", "text": "code 1234"})
+            latencies.append(time.perf_counter() - start)
+            assert response.status_code == 200
+    return latencies
+
+
+async def run_fast(n: int, concurrency: int):
+    """`concurrency` callers sending back to back (closed loop)."""
+    sender = FastSender(URL, concurrency=concurrency)
+    latencies = []
+    numbers = iter(range(n))
+
+    async def caller():
+        for i in numbers:
+            start = time.perf_counter()
+            result = await sender.send("bench-key", f"+9665{i:08d}", "code 1234")
+            latencies.append(time.perf_counter() - start)
+            assert result.success, result.info
+
+    await asyncio.gather(*(caller() for _ in range(concurrency)))
+    await sender.aclose()
+    return latencies
+
+
+def report(label: str, n: int, elapsed: float, latencies):
+    print(f"{label:<24}: {n:>6} msgs in {elapsed:6.2f}s -> {n / elapsed:8.1f} msgs/s  "
+          f"p50 {percentile(latencies, 0.50) * 1000:6.1f} ms  "
+          f"p99 {percentile(latencies, 0.99) * 1000:6.1f} ms")
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 64
+    legacy_n = min(n, 300)
+
+    proc = start_mock()
+    try:
+        print(f"mock latency {LATENCY_MS} ms")
+        start = time.perf_counter()
+        latencies = asyncio.run(run_legacy(legacy_n))
+        report("sequential (old path)", legacy_n, time.perf_counter() - start, latencies)
+
+        start = time.perf_counter()
+        latencies = asyncio.run(run_fast(n, concurrency))
+        report(f"FastSender x{concurrency}", n, time.perf_counter() - start, latencies)
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+/send-bulk ingestion time versus CSV row count.
+
+Posts generated CSVs of doubling size to the real endpoint (against a
+throw-away queue database) and reports time per row. With per-row work
+bounded, time per row stays roughly constant, i.e. ingestion is linear.
+
+Usage:
+    python benchmarks/bench_ingest.py [max_rows]
+"""
+
+import io
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ["QUEUE_DB_PATH"] = os.path.join(tempfile.mkdtemp(), "queue.db")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+from fastapi.testclient import TestClient
+
+import main
+
+
+def make_csv(rows: int) -> bytes:
+    out = io.StringIO()
+    out.write("name,phone\n")
+    for i in range(rows):
+        if i % 10 == 9:
+            out.write(f"Customer {i},12345\n")          # invalid
+        else:
+            out.write(f"Customer {i},05{i % 10**8:08d}\n")
+    return out.getvalue().encode("utf-8")
+
+
+def run():
+    max_rows = int(sys.argv[1]) if len(sys.argv) > 1 else 80_000
+    sizes = []
+    n = 10_000
+    while n <= max_rows:
+        sizes.append(n)
+        n *= 2
+
+    with TestClient(main.app) as client:
+        baseline = None
+        for rows in sizes:
+            body = make_csv(rows)
+            start = time.perf_counter()
+            response = client.post(
+                "/send-bulk",
+                data={"api_key": f"bench-key-{rows}", "message": "[التحية] [الاسم]"},
+                files={"file": ("bench.csv", body, "text/csv")},
+            )
+            elapsed = time.perf_counter() - start
+            response.raise_for_status()
+            per_row_us = elapsed / rows * 1e6
+            baseline = baseline or per_row_us
+            print(f"{rows:>8} rows: {elapsed:7.3f}s  {per_row_us:6.1f} µs/row  "
+                  f"(x{per_row_us / baseline:.2f} vs smallest)  "
+                  f"ingest={response.json()['ingest']}")
+
+
+if __name__ == "__main__":
+    run()
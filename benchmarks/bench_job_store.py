@@ -0,0 +1,73 @@
+"""
+Enqueue throughput of the SQLite JobStore for large /send-bulk uploads.
+
+Compares the bulk path used by /send-bulk (one transaction for the whole
+upload) with committing every row on its own.
+
+Usage:
+    python benchmarks/bench_job_store.py [rows]
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from messaging import JobStore, Priority
+
+
+def make_jobs(n: int, batch_id: str):
+    return [{
+        "api_key": "bench-key",
+        "phone": f"9665{i:08d}",
+        "message": "‫مرحبا، هذه رسالة تجريبية‬",
+        "name": f"Customer {i}",
+        "batch_id": batch_id,
+    } for i in range(n)]
+
+
+def bench_bulk(store: JobStore, n: int) -> float:
+    jobs = make_jobs(n, "bulk")
+    store.create_batch({"batch_id": "bulk", "status": "ingesting", "total": 0, "pending": 0})
+    start = time.perf_counter()
+    store.enqueue_many(jobs, "bulk")
+    return time.perf_counter() - start
+
+
+def bench_per_row(store: JobStore, n: int) -> float:
+    jobs = make_jobs(n, "per-row")
+    start = time.perf_counter()
+    for job in jobs:
+        store.enqueue(job)
+    return time.perf_counter() - start
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    per_row_rows = min(rows, 5_000)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = JobStore(os.path.join(tmp, "queue.db"))
+
+        elapsed = bench_bulk(store, rows)
+        print(f"bulk transaction : {rows:>8} rows in {elapsed:7.3f}s "
+              f"-> {rows / elapsed:>10,.0f} rows/s")
+
+        elapsed = bench_per_row(store, per_row_rows)
+        print(f"commit per row   : {per_row_rows:>8} rows in {elapsed:7.3f}s "
+              f"-> {per_row_rows / elapsed:>10,.0f} rows/s")
+
+        start = time.perf_counter()
+        claimed = 0
+        while claimed < 1_000 and store.claim_next("bench-key", Priority.NORMAL):
+            claimed += 1
+        elapsed = time.perf_counter() - start
+        print(f"claim_next       : {claimed:>8} jobs in {elapsed:7.3f}s "
+              f"-> {claimed / elapsed:>10,.0f} claims/s")
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
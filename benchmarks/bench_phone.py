@@ -0,0 +1,76 @@
+"""
+Phone normalization: vectorized batch API vs the old per-row path.
+
+The per-row function is the chain of replace/startswith/slice calls that
+/send-bulk used to run for every CSV row (without its print() calls).
+
+Usage:
+    python benchmarks/bench_phone.py [rows]
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from messaging.phone import _STRING_DTYPE, normalize_numbers
+
+
+def legacy_normalize(raw):
+    phone = raw.strip() if raw else ""
+    if phone:
+        phone = phone.replace(" ", "").replace("-", "").replace("+", "")
+        if phone.startswith("00966"):
+            phone = phone[5:]
+        if phone.startswith("0"):
+            phone = phone[1:]
+        if not phone.startswith("966"):
+            phone = "966" + phone
+        if len(phone) != 12 or not phone.isdigit():
+            phone = ""
+    return phone
+
+
+FORMATS = (
+    lambda i: f"05{i:08d}",
+    lambda i: f"+966 5{i:08d}",
+    lambda i: f"009665{i:08d}",
+    lambda i: f"9665{i:08d}",
+    lambda i: f"05-{i:04d}-{i:04d}",
+    lambda i: "12345",
+    lambda i: "",
+)
+
+
+def make_numbers(n: int):
+    return [FORMATS[i % len(FORMATS)](i % 10**8) for i in range(n)]
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    raw = make_numbers(rows)
+    print(f"{rows:,} rows, string dtype: {_STRING_DTYPE}")
+
+    start = time.perf_counter()
+    legacy = [legacy_normalize(x) for x in raw]
+    legacy_s = time.perf_counter() - start
+    print(f"per-row (old)   : {legacy_s:6.3f}s  {rows / legacy_s:>12,.0f} rows/s")
+
+    start = time.perf_counter()
+    result = normalize_numbers(raw)
+    batch_s = time.perf_counter() - start
+    print(f"normalize_numbers: {batch_s:6.3f}s  {rows / batch_s:>12,.0f} rows/s "
+          f"(x{legacy_s / batch_s:.2f})")
+
+    # Both paths must accept the same Saudi numbers
+    mismatches = sum(
+        1 for old, new in zip(legacy, result["e164"])
+        if (old or None) != (new[1:] if new else None)
+    )
+    print(f"mismatches vs old path: {mismatches}")
+    print(result["reason"].value_counts(dropna=False).to_string())
+
+
+if __name__ == "__main__":
+    main()
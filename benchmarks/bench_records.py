@@ -0,0 +1,78 @@
+"""
+Per-job memory of queued jobs and per-recipient outcomes.
+
+Builds N jobs and N outcomes the way the worker sees them (api_key and
+batch_id arrive as fresh strings for every row claimed from SQLite) and
+measures them with tracemalloc, first as the old dicts, then as the
+Job / Outcome slot records.
+
+Usage:
+    python benchmarks/bench_records.py [jobs]
+"""
+
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from messaging.records import Job, Outcome, Status
+
+API_KEY = "0123456789abcdef0123456789abcdef"
+BATCH_ID = "3ce47a2c3c3948a3b30681ebf9726cd8"
+
+
+def fresh(s: str) -> str:
+    # A new string object with the same value, like a column read per row
+    return "".join(list(s))
+
+
+def dict_jobs(n: int):
+    return [{
+        "id": i,
+        "api_key": fresh(API_KEY),
+        "batch_id": fresh(BATCH_ID),
+        "phone": f"+9665{i:08d}",
+        "name": f"Customer {i}",
+        "fields": {},
+    } for i in range(n)]
+
+
+def record_jobs(n: int):
+    return [Job(i, fresh(API_KEY), fresh(BATCH_ID),
+                f"+9665{i:08d}", f"Customer {i}", fields={})
+            for i in range(n)]
+
+
+def dict_outcomes(n: int):
+    return [{"phone": f"+9665{i:08d}", "name": f"Customer {i}", "status": "✅ sent"}
+            for i in range(n)]
+
+
+def record_outcomes(n: int):
+    return [Outcome(f"+9665{i:08d}", f"Customer {i}", Status.SENT) for i in range(n)]
+
+
+def measure(build, n: int) -> int:
+    tracemalloc.start()
+    items = build(n)
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del items
+    return size
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    for label, before, after in (
+            ("queued jobs", dict_jobs, record_jobs),
+            ("outcomes   ", dict_outcomes, record_outcomes)):
+        old = measure(before, n)
+        new = measure(after, n)
+        print(f"{label}: dicts {old / n:6.0f} B/job ({old / 2**20:7.1f} MiB)  "
+              f"slots {new / n:6.0f} B/job ({new / 2**20:7.1f} MiB)  "
+              f"-> {1 - new / old:5.1%} less")
+
+
+if __name__ == "__main__":
+    main()
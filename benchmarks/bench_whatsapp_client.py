@@ -0,0 +1,87 @@
+"""
+WhatsAppClient send throughput against a local stub server.
+
+Sends N messages through WhatsAppClient.send_message with C sends in
+flight (asyncio.gather over one client, i.e. one pooled session) and
+reports messages per second and how many TCP connections the server saw.
+For comparison it also times the old path: one blocking `requests.post`
+per message, each on a new connection.
+
+Usage:
+    python benchmarks/bench_whatsapp_client.py [messages] [concurrency] [latency_ms]
+"""
+
+import asyncio
+import contextlib
+import io
+import os
+import sys
+import time
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks import mock_whatsapp_server
+from whatsapp_client_python import WhatsAppClient
+
+PORT = 8901
+SERVER = f"http://127.0.0.1:{PORT}"
+
+
+async def bench_async(messages: int, concurrency: int) -> float:
+    async with WhatsAppClient(session_name="bench", server_url=SERVER,
+                              max_connections_per_host=concurrency) as client:
+        gate = asyncio.Semaphore(concurrency)
+
+        async def send(i: int) -> bool:
+            async with gate:
+                return await client.send_message(f"+9665{i:08d}", "bench")
+
+        start = time.perf_counter()
+        results = await asyncio.gather(*(send(i) for i in range(messages)))
+        elapsed = time.perf_counter() - start
+    assert all(results), "some sends failed"
+    return elapsed
+
+
+def bench_blocking(messages: int, token: str) -> float:
+    # What send_message used to do for every message
+    start = time.perf_counter()
+    for i in range(messages):
+        response = requests.post(f"{SERVER}/api/bench/send-message",
+                                 json={"phone": f"+9665{i:08d}", "message": "bench"},
+                                 headers={"Authorization": f"Bearer {token}"},
+                                 timeout=90)
+        assert response.status_code == 201
+    return time.perf_counter() - start
+
+
+async def main():
+    messages = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 32
+    latency_ms = float(sys.argv[3]) if len(sys.argv) > 3 else 20
+    runner = await mock_whatsapp_server.start(PORT, latency_ms=latency_ms)
+    app = runner.app
+
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):  # per-message prints
+            elapsed = await bench_async(messages, concurrency)
+        connections = len(app["peers"])
+        print(f"async pooled : {messages} msgs in {elapsed:6.2f}s  "
+              f"{messages / elapsed:8.1f} msg/s  ({connections} connections, "
+              f"concurrency {concurrency}, server latency {latency_ms:g} ms)")
+
+        app["peers"].clear()
+        blocking = min(messages, 200)
+        async with WhatsAppClient(session_name="bench", server_url=SERVER) as client:
+            token = client.auth_token
+        elapsed = await asyncio.to_thread(bench_blocking, blocking, token)
+        print(f"blocking     : {blocking} msgs in {elapsed:6.2f}s  "
+              f"{blocking / elapsed:8.1f} msg/s  ({len(app['peers'])} connections)")
+    finally:
+        await runner.cleanup()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
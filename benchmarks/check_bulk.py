@@ -0,0 +1,130 @@
+"""
+WhatsAppClient bulk engine against the local stub server.
+
+Checks that:
+  * stream_bulk_messages keeps at most `concurrency` sends in flight and
+    reports every recipient exactly once, invalid rows included
+  * a session rate_limit paces the sends (messages per second)
+  * streaming a large generator keeps memory flat: peak allocations while
+    streaming 4x the recipients stay about the same
+  * leaving the stream early stops the remaining sends
+and prints the throughput of the streamed run.
+
+Usage:
+    python benchmarks/check_bulk.py [messages] [concurrency] [latency_ms]
+"""
+
+import asyncio
+import contextlib
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks import mock_whatsapp_server
+from whatsapp_client_python import WhatsAppClient
+from whatsapp_client_python.bulk import run_bulk
+
+PORT = 8903
+SERVER = f"http://127.0.0.1:{PORT}"
+
+
+def recipients(n: int, invalid_every: int = 0):
+    for i in range(n):
+        if invalid_every and i % invalid_every == 0:
+            yield {"phone": f"+9665{i:08d}"}
+        else:
+            yield {"phone": f"+9665{i:08d}", "message": "bulk"}
+
+
+async def check_concurrency(concurrency: int) -> bool:
+    in_flight = peak = 0
+
+    async def send(phone: str, message: str) -> bool:
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.001)
+        in_flight -= 1
+        return True
+
+    seen = set()
+    failed = 0
+    async for result in run_bulk(send, recipients(1000, invalid_every=10), concurrency):
+        seen.add(result.index)
+        failed += not result.sent
+    print(f"concurrency   : peak in flight={peak} (limit {concurrency}), "
+          f"results={len(seen)}/1000, invalid={failed}")
+    return peak == concurrency and len(seen) == 1000 and failed == 100
+
+
+async def stream_peak(client: WhatsAppClient, n: int, concurrency: int) -> int:
+    tracemalloc.start()
+    sent = 0
+    async for result in client.stream_bulk_messages(recipients(n), concurrency):
+        sent += result.sent
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    assert sent == n, f"only {sent}/{n} sent"
+    return peak
+
+
+async def main():
+    messages = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 32
+    latency_ms = float(sys.argv[3]) if len(sys.argv) > 3 else 20
+    runner = await mock_whatsapp_server.start(PORT, latency_ms=latency_ms)
+    stats = runner.app["stats"]
+    ok = await check_concurrency(concurrency)
+    try:
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            async with WhatsAppClient(session_name="bulk", server_url=SERVER,
+                                      max_connections_per_host=concurrency) as client:
+                start = time.perf_counter()
+                summary = await client.send_bulk_messages(recipients(messages), delay=0,
+                                                          concurrency=concurrency,
+                                                          keep_details=False)
+                elapsed = time.perf_counter() - start
+
+                small = await stream_peak(client, messages // 4, concurrency)
+                large = await stream_peak(client, messages, concurrency)
+
+                before = stats["sent"]
+                stream = client.stream_bulk_messages(recipients(messages), concurrency)
+                async for result in stream:
+                    if result.index >= 50:
+                        break
+                await stream.aclose()
+                await asyncio.sleep(0.2)
+                after_break = stats["sent"] - before
+
+            async with WhatsAppClient(session_name="paced", server_url=SERVER,
+                                      rate_limit=50) as client:
+                start = time.perf_counter()
+                paced = await client.send_bulk_messages(recipients(100), delay=0,
+                                                        concurrency=concurrency)
+                paced_elapsed = time.perf_counter() - start
+
+        print(f"throughput    : {summary['sent']} msgs in {elapsed:6.2f}s  "
+              f"{summary['sent'] / elapsed:8.1f} msg/s  (concurrency {concurrency}, "
+              f"server latency {latency_ms:g} ms)")
+        ok &= summary == {"sent": messages, "failed": 0}
+        print(f"memory        : peak {small / 1024:.0f} KiB for {messages // 4} msgs, "
+              f"{large / 1024:.0f} KiB for {messages}")
+        ok &= large < 2 * small
+        print(f"early exit    : {after_break} sent after leaving at result 50")
+        ok &= after_break <= 50 + 2 * concurrency
+        in_order = ([d["phone"] for d in paced["details"]]
+                    == [r["phone"] for r in recipients(100)])
+        print(f"rate limit    : 100 msgs at 50/s in {paced_elapsed:.2f}s, "
+              f"details in input order={in_order}")
+        ok &= paced["sent"] == 100 and 1.9 <= paced_elapsed < 3 and in_order
+    finally:
+        await runner.cleanup()
+    print("OK" if ok else "FAILED")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,127 @@
+"""
+Provider routing and failover against the local mocks: wasenderapi.com
+(benchmarks.mock_wasender, 5 ms) and a session server
+(benchmarks.mock_whatsapp_server, 40 ms).
+
+Checks that:
+  * with both up, sends favour the faster provider (latency weighting)
+  * while wasender is down (connection refused) every send still goes
+    out through the session server, and wasender's breaker opens after
+    PROVIDER_FAILURE_THRESHOLD failures, so later sends skip it
+  * with both down, once both breakers are open the router refuses at
+    once (NoProviderAvailable) instead of trying either
+  * once wasender is back, the trial send after the reset timeout closes
+    its breaker again
+
+Usage:
+    python benchmarks/check_failover.py [sends]
+"""
+
+import asyncio
+import contextlib
+import os
+import sys
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault("MOCK_LATENCY_MS", "5")
+
+import uvicorn
+
+from benchmarks import mock_wasender, mock_whatsapp_server
+from messaging.providers import (NoProviderAvailable, ProviderRouter, SessionProvider,
+                                 WasenderProvider)
+from whatsapp_client_python import WhatsAppClient
+
+WASENDER_PORT = 8912
+SESSION_PORT = 8913
+WASENDER_URL = f"http://127.0.0.1:{WASENDER_PORT}/api/send-message"
+DOWN_URL = "http://127.0.0.1:9/api/send-message"  # nothing listens there
+RESET_SECONDS = 1.0
+
+
+def start_wasender() -> uvicorn.Server:
+    server = uvicorn.Server(uvicorn.Config(mock_wasender.app, port=WASENDER_PORT,
+                                           log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+
+async def send_all(router: ProviderRouter, n: int, concurrency: int = 10):
+    gate = asyncio.Semaphore(concurrency)
+
+    async def send(i: int):
+        async with gate:
+            return await router.send("key", f"+9665{i:08d}", "hi")
+
+    results = await asyncio.gather(*(send(i) for i in range(n)))
+    return all(result.success for result, _ in results), [name for _, name in results]
+
+
+async def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    wasender_server = start_wasender()
+    session_runner = await mock_whatsapp_server.start(SESSION_PORT, latency_ms=40)
+    wasender = WasenderProvider(WASENDER_URL)
+    session_client = WhatsAppClient(session_name="failover",
+                                    server_url=f"http://127.0.0.1:{SESSION_PORT}")
+    session = SessionProvider(sessions={"key": session_client})
+    router = ProviderRouter([wasender, session], failure_threshold=5,
+                            reset_timeout=RESET_SECONDS)
+    ok = True
+    try:
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            await send_all(router, 20)  # warm up both latency averages
+            healthy, names = await send_all(router, n)
+
+            wasender.url = DOWN_URL
+            outage, outage_names = await send_all(router, n)
+            during = router.snapshot()
+
+            # The session breaker opens too after its own run of failures
+            session_client.server_url = "http://127.0.0.1:9"
+            refused = False
+            for _ in range(10):
+                try:
+                    await router.send("key", "+966500000000", "hi")
+                except NoProviderAvailable as e:
+                    refused = e.retry_at > time.time()
+                    break
+            session_client.server_url = f"http://127.0.0.1:{SESSION_PORT}"
+
+            # After the reset timeout one trial send per provider goes
+            # through; it closes the breaker for everything after it
+            wasender.url = WASENDER_URL
+            await asyncio.sleep(RESET_SECONDS)
+            trial, _ = await router.send("key", "+966500000001", "hi")
+            recovered, _ = await send_all(router, n)
+            after = router.snapshot()
+
+        share = names.count("wasender") / n
+        print(f"both up       : all sent={healthy}, wasender share={share:.0%} "
+              f"(latency wasender={during['wasender']['latency_ms']} ms, "
+              f"session={during['session']['latency_ms']} ms)")
+        ok &= healthy and share > 0.6
+        print(f"wasender down : all sent={outage}, via session={outage_names.count('session')}"
+              f"/{n}, wasender breaker={during['wasender']['state']}, "
+              f"failed over={during['wasender']['failovers']}")
+        ok &= outage and outage_names.count("session") == n
+        ok &= during["wasender"]["state"] == "open" and during["wasender"]["failovers"] <= 5 + 10
+        print(f"both down     : refused without sending={refused}")
+        ok &= refused
+        print(f"recovered     : all sent={recovered}, wasender breaker={after['wasender']['state']}, "
+              f"wasender sent={after['wasender']['sent']}")
+        ok &= trial.success and recovered and after["wasender"]["state"] == "closed"
+    finally:
+        await router.aclose()
+        await session_runner.cleanup()
+        wasender_server.should_exit = True
+    print("OK" if ok else "FAILED")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
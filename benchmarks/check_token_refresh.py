@@ -0,0 +1,76 @@
+"""
+WhatsAppClient token handling against the local stub server.
+
+Checks that:
+  * concurrent first sends share one token fetch (single-flight)
+  * after the server revokes every token, the concurrent sends that get
+    401 share one refresh and are each retried once, successfully
+  * with short-lived tokens, the background refresh replaces the token
+    before it expires, so a steady stream of sends never sees a 401
+
+Usage:
+    python benchmarks/check_token_refresh.py
+"""
+
+import asyncio
+import contextlib
+import io
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks import mock_whatsapp_server
+from whatsapp_client_python import TokenManager, WhatsAppClient
+
+PORT = 8902
+SERVER = f"http://127.0.0.1:{PORT}"
+
+
+async def burst(client: WhatsAppClient, n: int) -> bool:
+    results = await asyncio.gather(*(client.send_message(f"+9665{i:08d}", "hi")
+                                     for i in range(n)))
+    return all(results)
+
+
+async def main():
+    runner = await mock_whatsapp_server.start(PORT, token_ttl=3)
+    stats = runner.app["stats"]
+    ok = True
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            client = WhatsAppClient(session_name="check", server_url=SERVER,
+                                    token_manager=TokenManager(refresh_margin=1))
+            first = await burst(client, 100)
+            after_first = stats["tokens"]
+
+            await client.session.post(f"{SERVER}/revoke-tokens")
+            revoked = await burst(client, 100)
+            after_revoke = dict(stats)
+
+            # 5 s of sends with 3 s tokens refreshed 1 s before expiry
+            deadline = time.time() + 5
+            steady = True
+            while time.time() < deadline:
+                steady &= await burst(client, 10)
+                await asyncio.sleep(0.1)
+            await client.close()
+
+        print(f"first burst   : all sent={first}, token fetches={after_first}")
+        ok &= first and after_first == 1
+        print(f"after revoke  : all sent={revoked}, 401s={after_revoke['unauthorized']}, "
+              f"token fetches={after_revoke['tokens']}")
+        ok &= revoked and after_revoke["unauthorized"] == 100 and after_revoke["tokens"] == 2
+        print(f"steady stream : all sent={steady}, new 401s="
+              f"{stats['unauthorized'] - after_revoke['unauthorized']}, "
+              f"token fetches={stats['tokens']}")
+        ok &= steady and stats["unauthorized"] == after_revoke["unauthorized"]
+        ok &= stats["tokens"] >= after_revoke["tokens"] + 2
+    finally:
+        await runner.cleanup()
+    print("OK" if ok else "FAILED")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
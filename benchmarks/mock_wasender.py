@@ -0,0 +1,78 @@
+"""
+Local stand-in for the wasenderapi.com send endpoint.
+
+Point the app at it with WASENDER_API_URL to exercise retries, throttling
+and throughput without sending real messages:
+
+    MOCK_FAIL_FIRST=2 MOCK_FAIL_STATUS=429 MOCK_RETRY_AFTER=1 \\
+        uvicorn benchmarks.mock_wasender:app --port 8900
+    WASENDER_API_URL=http://127.0.0.1:8900/api/send-message python main.py
+
+Behaviour (environment variables):
+    MOCK_FAIL_FIRST   first N requests for each phone fail (default 0)
+    MOCK_FAIL_STATUS  status of those failures (default 503)
+    MOCK_RETRY_AFTER  Retry-After header value sent with failures (optional)
+    MOCK_ERROR_RATE   probability of a random 500 afterwards (default 0)
+    MOCK_LATENCY_MS   added latency per request (default 0)
+
+GET /stats returns request counts; POST /reset clears them.
+"""
+
+import asyncio
+import os
+import random
+from collections import Counter
+
+from fastapi import FastAPI, Header
+from fastapi.responses import JSONResponse
+
+FAIL_FIRST = int(os.getenv("MOCK_FAIL_FIRST", "0"))
+FAIL_STATUS = int(os.getenv("MOCK_FAIL_STATUS", "503"))
+RETRY_AFTER = os.getenv("MOCK_RETRY_AFTER")
+ERROR_RATE = float(os.getenv("MOCK_ERROR_RATE", "0"))
+LATENCY = float(os.getenv("MOCK_LATENCY_MS", "0")) / 1000
+
+app = FastAPI(title="wasender mock")
+
+attempts_by_phone: Counter = Counter()
+responses: Counter = Counter()
+
+
+@app.post("/api/send-message")
+async def send_message(payload: dict, authorization: str = Header("")):
+    if LATENCY:
+        await asyncio.sleep(LATENCY)
+    if not authorization.startswith("Bearer "):
+        return _respond(401, {"message": "Unauthenticated."})
+    to = payload.get("to")
+    if not to or not payload.get("text"):
+        return _respond(422, {"message": "The to and text fields are required."})
+
+    attempts_by_phone[to] += 1
+    if attempts_by_phone[to] <= FAIL_FIRST:
+        headers = {"Retry-After": RETRY_AFTER} if RETRY_AFTER else None
+        return _respond(FAIL_STATUS, {"message": "Try again later."}, headers)
+    if ERROR_RATE and random.random() < ERROR_RATE:
+        return _respond(500, {"message": "Internal error."})
+    return _respond(200, {"success": True, "data": {"msgId": sum(responses.values())}})
+
+
+@app.get("/stats")
+async def stats():
+    return {
+        "requests": sum(responses.values()),
+        "by_status": {str(k): v for k, v in responses.items()},
+        "phones": len(attempts_by_phone),
+    }
+
+
+@app.post("/reset")
+async def reset():
+    attempts_by_phone.clear()
+    responses.clear()
+    return {"status": "ok"}
+
+
+def _respond(status: int, body: dict, headers: dict = None) -> JSONResponse:
+    responses[status] += 1
+    return JSONResponse(status_code=status, content=body, headers=headers)
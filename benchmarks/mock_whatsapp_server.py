@@ -0,0 +1,94 @@
+"""
+Local stand-in for the WhatsApp session server used by WhatsAppClient
+(whatsapp_client_python): secret key, token generation and send-message.
+
+Run it on its own:
+
+    python benchmarks/mock_whatsapp_server.py [port]
+
+and point a client at it with server_url="http://127.0.0.1:8901", or start
+it inside a benchmark with `start(port)`.
+
+Behaviour (environment variables, or keyword arguments of make_app):
+    MOCK_LATENCY_MS   added latency per send (default 0)
+    MOCK_TOKEN_TTL    seconds a token is accepted (default 3600); tokens
+                      are JWT-shaped and carry it as their `exp` claim
+
+Sends with an unknown or expired token get 401. POST /revoke-tokens makes
+every issued token invalid (like a server-side logout); GET /stats returns
+request and connection counts.
+"""
+
+import asyncio
+import base64
+import json
+import os
+import sys
+import time
+from collections import Counter
+
+from aiohttp import web
+
+
+def make_app(latency_ms: float = None, token_ttl: float = None) -> web.Application:
+    latency = (float(os.getenv("MOCK_LATENCY_MS", "0")) if latency_ms is None
+               else latency_ms) / 1000
+    ttl = float(os.getenv("MOCK_TOKEN_TTL", "3600")) if token_ttl is None else token_ttl
+    stats = Counter()
+    peers = set()
+    tokens = {}  # issued token -> expiry
+
+    async def secret_key(request):
+        stats["secret_key"] += 1
+        return web.json_response({"secretKey": "mock-secret"})
+
+    async def generate_token(request):
+        stats["tokens"] += 1
+        claims = {"sub": request.match_info["session"], "n": stats["tokens"],
+                  "exp": time.time() + ttl}
+        payload = base64.urlsafe_b64encode(json.dumps(claims).encode()).rstrip(b"=").decode()
+        token = f"mock.{payload}.sig"
+        tokens[token] = claims["exp"]
+        return web.json_response({"full": token}, status=201)
+
+    async def revoke_tokens(request):
+        tokens.clear()
+        return web.json_response({"status": "revoked"})
+
+    async def send_message(request):
+        peers.add(request.transport.get_extra_info("peername"))
+        token = request.headers.get("Authorization", "").removeprefix("Bearer ")
+        if tokens.get(token, 0) <= time.time():
+            stats["unauthorized"] += 1
+            return web.json_response({"error": "unauthorized"}, status=401)
+        body = await request.json()
+        if latency:
+            await asyncio.sleep(latency)
+        stats["sent"] += 1
+        return web.json_response({"status": "success", "phone": body.get("phone")}, status=201)
+
+    async def get_stats(request):
+        return web.json_response({**stats, "connections": len(peers)})
+
+    app = web.Application()
+    app.router.add_get("/api/secret-key", secret_key)
+    app.router.add_post("/api/{session}/{secret}/generate-token", generate_token)
+    app.router.add_post("/api/{session}/send-message", send_message)
+    app.router.add_post("/revoke-tokens", revoke_tokens)
+    app.router.add_get("/stats", get_stats)
+    app["stats"] = stats
+    app["peers"] = peers
+    return app
+
+
+async def start(port: int, **options) -> web.AppRunner:
+    """Serve a mock app on 127.0.0.1:`port` in the running loop."""
+    runner = web.AppRunner(make_app(**options), access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", port).start()
+    return runner
+
+
+if __name__ == "__main__":
+    web.run_app(make_app(), host="127.0.0.1",
+                port=int(sys.argv[1]) if len(sys.argv) > 1 else 8901)
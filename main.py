@@ -1,12 +1,15 @@
 # main.py
-from fastapi import FastAPI, File, UploadFile, Form, HTTPException
-from fastapi.responses import HTMLResponse, JSONResponse
+from fastapi import FastAPI, File, UploadFile, Form, HTTPException, Query, Request
+from fastapi.responses import HTMLResponse, JSONResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
 import asyncio
 import csv
+import logging
 import io
-from typing import List, Dict, Tuple
+import json
+import time
+from typing import List, Dict, Tuple, Optional
 import smtplib
 import pandas as pd
 from email.mime.text import MIMEText
@@ -15,84 +18,91 @@ from pydantic import BaseModel
 import sys
 import os
 
-import httpx  # NEW: async HTTP client for wasenderapi.com
 import uuid
-import random
 from datetime import datetime, timezone
-from collections import OrderedDict
 
-whatsapp_queue = asyncio.Queue()
-
-# Per-batch results so the UI can poll progress while the worker drains the queue.
-# OrderedDict lets us evict the oldest batch when we exceed MAX_BATCHES.
-MAX_BATCHES = 100
-batch_results: "OrderedDict[str, dict]" = OrderedDict()
+from messaging import (CSVUploadStream, EmailOutcome, MessageTemplate, Priority,
+                       Status, mask_key, open_store)
+from messaging.events import BatchEventHub
+from messaging.ingest import CSVFormatError
+from messaging.mailer import SMTPPool, send_all
+from messaging.priority import DEFAULT_POLICIES, QueueWaitStats, parse_priority
+from messaging.window import SendWindow, earliest_send, recipient_zone
+from messaging.log import IngestStats, fields, get_logger, setup_logging
+from messaging.wasender import FastSender
+from messaging.phone import (
+    COUNTRY_RULES,
+    DEFAULT_COUNTRY_CODE,
+    REJECT_EMPTY,
+    normalize_number,
+    normalize_numbers,
+)
+from sender import (BATCH_ARCHIVE_DIR, MAX_DELAY_SECONDS, MIN_DELAY_SECONDS,
+                    QUEUE_STORE_URL, WASENDER_API_URL, Sender)
+
+setup_logging()
+logger = get_logger("app")
+queue_logger = get_logger("queue")
+bulk_logger = get_logger("bulk")
+
+# Which tiers run in this process: "all" (API plus the sender lanes, for
+# small deployments) or "api" (web tier only; run `python sender.py` next
+# to it). Set with APP_ROLE or `python main.py --role`.
+APP_ROLES = ("all", "api")
+APP_ROLE = os.getenv("APP_ROLE", "all").lower()
+if APP_ROLE not in APP_ROLES:
+    raise ValueError(f"APP_ROLE must be one of {APP_ROLES}, got {APP_ROLE!r}")
+
+# Every process (uvicorn --workers, sender processes, replicas on the same
+# volume) opens the same store, so any of them can answer /queue-status.
+job_store = open_store(QUEUE_STORE_URL, archive_dir=BATCH_ARCHIVE_DIR)
+
+# Queue wait (enqueue -> send) per priority class, for /queue-metrics. Only
+# sends made by this process are counted (fast path, plus the lanes when
+# APP_ROLE=all).
+queue_waits = QueueWaitStats(DEFAULT_POLICIES)
+
+# Wakes the /queue-events streams of a batch when its counters change
+batch_events = BatchEventHub()
+
+# One lane per api_key (sender number), each with its own pacing clock.
+# Senders are drained concurrently; jobs of the same sender stay serialized,
+# with transactional jobs ahead of campaign traffic (messaging.priority).
+whatsapp_sender: Optional[Sender] = None
+if APP_ROLE == "all":
+    whatsapp_sender = Sender(job_store, waits=queue_waits, on_progress=batch_events.publish)
+
+
+def _wake_sender(api_key: str):
+    """
+    Start sending new jobs of `api_key` now if this process runs the
+    lanes; separate sender processes see them on their next store poll.
+    """
+    if whatsapp_sender is not None:
+        whatsapp_sender.notify(api_key)
 
-# Random per-message delay window (seconds) — 2 to 3 minutes
-MIN_DELAY_SECONDS = 1200
-MAX_DELAY_SECONDS = 1800
 
+# /send-bulk normalizes and enqueues parsed rows in bounded chunks of this
+# size (large enough to amortize the per-call cost of the vectorized
+# phone normalization, small enough to keep memory flat)
+ENQUEUE_BATCH_SIZE = 5000
 
-def _evict_old_batches():
-    """Drop oldest batches if we're over the cap."""
-    while len(batch_results) > MAX_BATCHES:
-        batch_results.popitem(last=False)
+# A number queued by one /send-bulk batch isn't queued again by another
+# batch of the same api_key for this long, nor while that batch is still
+# sending (0: only dedupe within a batch and against unfinished batches)
+DEDUPE_WINDOW_SECONDS = float(os.getenv("DEDUPE_WINDOW_SECONDS", str(24 * 3600)))
 
 # Add the parent directory to path (kept for any other local imports you may add later)
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
-# -----------------------------------------------------------------------------
-# wasenderapi.com integration
-# -----------------------------------------------------------------------------
-WASENDER_API_URL = "https://wasenderapi.com/api/send-message"
-WASENDER_TIMEOUT = 30.0  # seconds
-
-
-async def send_whatsapp_via_wasender(
-    api_key: str,
-    phone: str,
-    text: str,
-    http_client: httpx.AsyncClient,
-) -> Tuple[bool, str]:
-    """
-    Send a single WhatsApp message via wasenderapi.com.
-
-    Returns (success, info). On failure, `info` contains the error message
-    (HTTP status + body, or exception message).
-    """
-    # The API expects E.164 format with a leading '+'.
-    # Our CSV normalization strips '+', so re-add it here.
-    to = phone if phone.startswith("+") else f"+{phone}"
-
-    headers = {
-        "Authorization": f"Bearer {api_key}",
-        "Content-Type": "application/json",
-    }
-    payload = {"to": to, "text": text}
-
-    try:
-        response = await http_client.post(
-            WASENDER_API_URL,
-            headers=headers,
-            json=payload,
-            timeout=WASENDER_TIMEOUT,
-        )
-    except httpx.TimeoutException:
-        return False, "request timed out"
-    except httpx.RequestError as e:
-        return False, f"request error: {e}"
-
-    if 200 <= response.status_code < 300:
-        return True, f"HTTP {response.status_code}"
-
-    # Try to extract a useful error message from the response body
-    try:
-        body = response.json()
-        err_msg = body.get("message") or body.get("error") or str(body)
-    except Exception:
-        err_msg = response.text or "<empty body>"
-
-    return False, f"HTTP {response.status_code}: {err_msg}"
+# Transactional single sends skip lane pacing: they go out right away
+# through one shared HTTP/2 client with bounded concurrency.
+fast_sender = FastSender(
+    WASENDER_API_URL,
+    concurrency=int(os.getenv("FAST_SEND_CONCURRENCY", "64")),
+    max_connections=int(os.getenv("FAST_SEND_MAX_CONNECTIONS", "100")),
+    on_wait=lambda seconds: queue_waits.record(Priority.TRANSACTIONAL, seconds),
+)
 
 
 app = FastAPI(title="WhatsApp Bulk Messaging System")
@@ -369,7 +379,7 @@ async def get_interface():
         <h1>📱 نظام إرسال رسائل WhatsApp الجماعية</h1>
         
         <div class="note">
-            💡 يمكنك استخدام [الاسم] في الرسالة وسيتم استبداله باسم العميل تلقائياً
+            💡 يمكنك استخدام [الاسم] في الرسالة وسيتم استبداله باسم العميل تلقائياً، وكذلك [التحية] و[الفريق] أو اسم أي عمود من ملف CSV بين قوسين مثل [city]
         </div>
         
         <form id="bulkForm">
@@ -461,63 +471,66 @@ async def get_interface():
                     return;
                 }
 
-                // Batch is queued. Now poll /queue-status/{batch_id} every 5s.
+                // Batch is queued. Follow its progress over /queue-events:
+                // the server pushes an event whenever a counter changes, with
+                // only the details appended since the previous event.
                 const batchId = data.batch_id;
+                const details = [];
                 const total = data.total;
                 progressText.innerHTML = `📋 تم إضافة <b>${total}</b> رسالة للطابور.<br>` +
                     `⏱️ الوقت المتوقع: ${data.estimated_minutes_min}-${data.estimated_minutes_max} دقيقة<br>` +
                     `<small>كل رسالة تنتظر 2-3 دقائق قبل الإرسال</small>`;
 
-                const pollInterval = 5000; // 5 seconds
-                const poll = async () => {
-                    try {
-                        const r = await fetch(`/queue-status/${batchId}`);
-                        if (!r.ok) {
-                            progressText.textContent = '⚠️ تعذر جلب حالة الطابور';
-                            return;
-                        }
-                        const s = await r.json();
-                        const done = s.sent + s.failed;
-                        const pct = s.total ? Math.round((done / s.total) * 100) : 0;
-                        progressText.innerHTML =
-                            `📊 التقدم: <b>${done}/${s.total}</b> (${pct}%)<br>` +
-                            `✅ مرسل: ${s.sent} &nbsp;&nbsp; ❌ فشل: ${s.failed} &nbsp;&nbsp; ⏳ متبقي: ${s.pending}`;
-
-                        if (s.status === 'completed') {
-                            progress.classList.remove('active');
-                            result.className = 'result success';
-                            result.innerHTML = `
-                                <div style="font-size: 18px; margin-bottom: 15px;">✅ اكتملت العملية!</div>
-                                <div class="stats">
-                                    <div class="stat">
-                                        <div class="stat-number">${s.sent}</div>
-                                        <div class="stat-label">رسائل مرسلة</div>
-                                    </div>
-                                    <div class="stat">
-                                        <div class="stat-number">${s.failed}</div>
-                                        <div class="stat-label">رسائل فاشلة</div>
-                                    </div>
-                                    <div class="stat">
-                                        <div class="stat-number">${s.total}</div>
-                                        <div class="stat-label">المجموع</div>
-                                    </div>
+                const events = new EventSource(`/queue-events/${batchId}`);
+                events.onmessage = (event) => {
+                    const s = JSON.parse(event.data);
+                    details.push(...s.details);
+                    const done = s.sent + s.failed;
+                    const pct = s.total ? Math.round((done / s.total) * 100) : 0;
+                    progressText.innerHTML =
+                        `📊 التقدم: <b>${done}/${s.total}</b> (${pct}%)<br>` +
+                        `✅ مرسل: ${s.sent} &nbsp;&nbsp; ❌ فشل: ${s.failed} &nbsp;&nbsp; ⏳ متبقي: ${s.pending}`;
+
+                    if (s.status === 'completed' && s.next_cursor >= s.details_count) {
+                        events.close();
+                        progress.classList.remove('active');
+                        result.className = 'result success';
+                        result.innerHTML = `
+                            <div style="font-size: 18px; margin-bottom: 15px;">✅ اكتملت العملية!</div>
+                            <div class="stats">
+                                <div class="stat">
+                                    <div class="stat-number">${s.sent}</div>
+                                    <div class="stat-label">رسائل مرسلة</div>
                                 </div>
-                                <details style="margin-top: 15px;">
-                                    <summary style="cursor: pointer; color: #667eea;">عرض التفاصيل</summary>
-                                    <pre style="margin-top: 10px; font-size: 12px; max-height: 200px; overflow-y: auto;">${JSON.stringify(s.details, null, 2)}</pre>
-                                </details>
-                            `;
-                            result.style.display = 'block';
-                            sendBtn.disabled = false;
-                            return;
-                        }
-                        setTimeout(poll, pollInterval);
-                    } catch (err) {
-                        progressText.textContent = `⚠️ خطأ في الاستعلام: ${err.message}`;
-                        setTimeout(poll, pollInterval);
+                                <div class="stat">
+                                    <div class="stat-number">${s.failed}</div>
+                                    <div class="stat-label">رسائل فاشلة</div>
+                                </div>
+                                <div class="stat">
+                                    <div class="stat-number">${s.total}</div>
+                                    <div class="stat-label">المجموع</div>
+                                </div>
+                            </div>
+                            <details style="margin-top: 15px;">
+                                <summary style="cursor: pointer; color: #667eea;">عرض التفاصيل</summary>
+                                <pre style="margin-top: 10px; font-size: 12px; max-height: 200px; overflow-y: auto;">${JSON.stringify(details, null, 2)}</pre>
+                            </details>
+                        `;
+                        result.style.display = 'block';
+                        sendBtn.disabled = false;
+                    }
+                };
+                events.addEventListener('gone', () => {
+                    events.close();
+                    progressText.textContent = '⚠️ تعذر جلب حالة الطابور';
+                    sendBtn.disabled = false;
+                });
+                // EventSource reconnects on its own and resumes from the last event
+                events.onerror = () => {
+                    if (events.readyState !== EventSource.CLOSED) {
+                        progressText.textContent = '⚠️ انقطع الاتصال، جاري إعادة الاتصال...';
                     }
                 };
-                setTimeout(poll, pollInterval);
 
             } catch (error) {
                 result.className = 'result error';
@@ -534,97 +547,67 @@ async def get_interface():
 
 
 @app.on_event("startup")
-async def start_whatsapp_worker():
-    asyncio.create_task(whatsapp_worker())
+async def start_whatsapp_sender():
+    if whatsapp_sender is not None:
+        await whatsapp_sender.start()
+    logger.info("API started", **fields(role=APP_ROLE, owner=job_store.owner))
+
+
+@app.on_event("shutdown")
+async def stop_whatsapp_sender():
+    if whatsapp_sender is not None:
+        await whatsapp_sender.close()
+    tasks = list(email_tasks)
+    for task in tasks:
+        task.cancel()
+    # Cancelled email batches close their SMTP pool and mark themselves
+    # stopped in the store, so wait for them before closing it
+    await asyncio.gather(*tasks, return_exceptions=True)
+    await fast_sender.aclose()
+    job_store.close()
+
+
+@app.get("/lanes")
+async def lanes_status():
+    """
+    Per-sender lane backlog (api_keys are masked). Without local lanes
+    (APP_ROLE=api) only the pending counts from the store are shown.
+    """
+    if whatsapp_sender is not None:
+        lanes = whatsapp_sender.scheduler.stats()
+    else:
+        pending_by_key = await asyncio.to_thread(job_store.pending_by_key)
+        lanes = {mask_key(key): {"pending": pending}
+                 for key, pending in pending_by_key.items()}
+    return {"pending": sum(l["pending"] for l in lanes.values()), "lanes": lanes}
 
 
-async def whatsapp_worker():
+@app.get("/lanes/rates")
+async def lanes_rates():
     """
-    Background worker that drains whatsapp_queue and sends messages
-    via wasenderapi.com. Sleeps a random 2-3 minutes BEFORE each send
-    to look human. Reuses one httpx.AsyncClient for the worker lifetime.
-
-    Job shape:
-        {
-            "api_key":   str,
-            "phone":     str,
-            "message":   str,
-            "name":      str (optional),
-            "batch_id":  str (optional, for /send-bulk progress tracking),
-        }
+    Adaptive pacing per sender: current interval and recent changes
+    (senders paced by this process only).
     """
-    async with httpx.AsyncClient() as http_client:
-        while True:
-            job = await whatsapp_queue.get()
-            try:
-                api_key = job["api_key"]
-                phone = job["phone"]
-                message = job["message"]
-                name = job.get("name", "")
-                batch_id = job.get("batch_id")
-
-                # ⏳ Random delay BEFORE sending, to look human and avoid rate-limits
-                delay = random.uniform(MIN_DELAY_SECONDS, MAX_DELAY_SECONDS)
-                print(f"⏳ Worker sleeping {delay:.1f}s before sending to {phone}")
-                await asyncio.sleep(delay)
-
-                success, info = await send_whatsapp_via_wasender(
-                    api_key=api_key,
-                    phone=phone,
-                    text=message,
-                    http_client=http_client,
-                )
-
-                if success:
-                    print(f"✅ [QUEUE] Sent to {phone} ({info})")
-                else:
-                    print(f"❌ [QUEUE] Failed to send to {phone}: {info}")
-
-                # Update batch progress if this job belongs to a bulk batch
-                if batch_id and batch_id in batch_results:
-                    b = batch_results[batch_id]
-                    if success:
-                        b["sent"] += 1
-                        b["details"].append({
-                            "phone": phone, "name": name, "status": "✅ sent",
-                        })
-                    else:
-                        b["failed"] += 1
-                        b["details"].append({
-                            "phone": phone, "name": name,
-                            "status": "❌ failed", "error": info,
-                        })
-                    b["pending"] -= 1
-                    if b["pending"] <= 0:
-                        b["status"] = "completed"
-                        b["completed_at"] = datetime.now(timezone.utc).isoformat()
-
-            except Exception as e:
-                print(f"❌ Worker error: {e}")
-                # Still mark the job as resolved on the batch so pending doesn't stick
-                bid = job.get("batch_id") if isinstance(job, dict) else None
-                if bid and bid in batch_results:
-                    b = batch_results[bid]
-                    b["failed"] += 1
-                    b["pending"] -= 1
-                    b["details"].append({
-                        "phone": job.get("phone", "?"),
-                        "name": job.get("name", ""),
-                        "status": "❌ error",
-                        "error": str(e),
-                    })
-                    if b["pending"] <= 0:
-                        b["status"] = "completed"
-                        b["completed_at"] = datetime.now(timezone.utc).isoformat()
-            finally:
-                whatsapp_queue.task_done()
+    if whatsapp_sender is None:
+        return {"senders": {}}
+    return {"senders": whatsapp_sender.scheduler.rates()}
 
 
-import re
+@app.get("/providers")
+async def providers_status():
+    """
+    Delivery providers of this process's sender: circuit breaker state,
+    average response time and send counts.
+    """
+    if whatsapp_sender is None:
+        return {"providers": {}}
+    return {"providers": whatsapp_sender.router.snapshot()}
 
 
-def digits_only(phone: str) -> str:
-    return re.sub(r"\D", "", phone)
+@app.get("/queue-metrics")
+async def queue_metrics():
+    """Queue wait percentiles per priority class, against each class's target."""
+    return {"classes": queue_waits.snapshot()}
 
 
 class WhatsAppMessageRequest(BaseModel):
@@ -636,211 +619,473 @@ class WhatsAppMessageRequest(BaseModel):
 @app.post("/send-whatsApp-message")
 async def send_whatsApp_message(payload: WhatsAppMessageRequest):
 
-    phone = digits_only(payload.phone)
-    if not phone:
-        raise HTTPException(status_code=400, detail="Invalid phone number")
-
-    await whatsapp_queue.put({
+    # Single sends accept any plausible international number, with or
+    # without its +/00 prefix, not only the countries with a rule; national
+    # numbers are read as Saudi.
+    phone, reason = normalize_number(payload.phone, allow_unknown=True)
+    if phone is None:
+        raise HTTPException(status_code=400, detail=f"Invalid phone number ({reason})")
+
+    # Transactional sends go out immediately on the fast path; only a
+    # transient failure falls back to the durable queue, where the lane
+    # retries it.
+    result = await fast_sender.send(payload.api_key, phone, payload.message)
+    if result.success:
+        queue_logger.info("Sent", **fields(phone=phone, path="fast", info=result.info))
+        return {"status": "sent", "phone": phone}
+    if not result.retryable:
+        queue_logger.warning("Send failed", **fields(phone=phone, path="fast", error=result.info))
+        raise HTTPException(status_code=502, detail=f"Send failed: {result.info}")
+
+    queue_logger.warning("Send failed, queued for retry", **fields(
+        phone=phone, path="fast", error=result.info))
+    await asyncio.to_thread(job_store.enqueue, {
         "api_key": payload.api_key,
         "phone": phone,
         "message": payload.message,
+        "priority": Priority.TRANSACTIONAL,
     })
+    _wake_sender(payload.api_key)
 
     return {
         "status": "queued",
         "phone": phone,
+        "error": result.info,
     }
 
 
+class SuppressionRequest(BaseModel):
+    api_key: str
+    phones: List[str]
+    reason: Optional[str] = None
+
+
+def _suppression_numbers(phones: List[str]) -> Tuple[List[str], List[str]]:
+    """(normalized numbers, raw values that aren't numbers)."""
+    numbers, invalid = [], []
+    for raw in phones:
+        phone, _ = normalize_number(raw, allow_unknown=True)
+        if phone is None:
+            invalid.append(raw)
+        else:
+            numbers.append(phone)
+    return numbers, invalid
+
+
+@app.post("/suppressions")
+async def add_suppressions(payload: SuppressionRequest):
+    """
+    Add numbers (opt-outs, complaints) to the suppression list of an
+    api_key; /send-bulk drops them from every later batch of that key.
+    """
+    numbers, invalid = _suppression_numbers(payload.phones)
+    await asyncio.to_thread(job_store.suppress, payload.api_key, numbers, payload.reason)
+    return {"added": len(numbers), "invalid": invalid,
+            "total": await asyncio.to_thread(job_store.suppression_count, payload.api_key)}
+
+
+@app.delete("/suppressions")
+async def remove_suppressions(payload: SuppressionRequest):
+    """Take numbers off the suppression list of an api_key."""
+    numbers, invalid = _suppression_numbers(payload.phones)
+    removed = await asyncio.to_thread(job_store.unsuppress, payload.api_key, numbers)
+    return {"removed": removed, "invalid": invalid,
+            "total": await asyncio.to_thread(job_store.suppression_count, payload.api_key)}
+
+
 @app.post("/send-bulk")
 async def send_bulk_messages(
     api_key: str = Form(...),
     message: str = Form(...),
     file: UploadFile = File(...),
+    country_code: str = Form(DEFAULT_COUNTRY_CODE),
+    priority: str = Form("bulk"),
+    start_at: Optional[str] = Form(None),
+    send_window: Optional[str] = Form(None),
 ):
     """
     Send bulk WhatsApp messages from CSV file via wasenderapi.com
-    CSV should have 'name' and 'phone' columns
+    CSV should have 'name' and 'phone' columns. Numbers without a country
+    code are read as national numbers of `country_code` (default 966).
+    `priority` is "bulk" (default) or "normal"; campaigns can't be
+    transactional.
+
+    Scheduling, both in each recipient's local time (time zone of their
+    country):
+      * `start_at`: ISO-8601 time of the first send. With an offset it is
+        absolute; without one ("2026-10-20T09:00") it is recipient-local.
+      * `send_window`: "HH:MM-HH:MM [days]", e.g. "09:00-21:00" or
+        "09:00-18:00 sun-thu"; messages are only sent inside it.
+
+    The upload is streamed: rows are parsed chunk by chunk and enqueued in
+    bounded batches of ENQUEUE_BATCH_SIZE, so memory stays flat regardless
+    of the file size.
+
+    Each number is queued once: repeats in the file, numbers queued by
+    another batch of the same api_key in the last DEDUPE_WINDOW_SECONDS
+    (or by one still sending) and numbers on its suppression list (/suppressions) are dropped and
+    counted in `ingest` and on the batch (`duplicates`, `recently_sent`,
+    `suppressed`).
     """
+    batch_id = uuid.uuid4().hex
+    batch = None
     try:
         # Validate file type
         if not file.filename.endswith('.csv'):
             raise HTTPException(status_code=400, detail="File must be a CSV file")
-        
-        # Read CSV file
-        contents = await file.read()
-        
-        # Try different encodings
+        if country_code not in COUNTRY_RULES:
+            raise HTTPException(status_code=400, detail=f"Unsupported country_code: {country_code}")
         try:
-            csv_text = contents.decode('utf-8')
-        except UnicodeDecodeError:
-            try:
-                csv_text = contents.decode('utf-8-sig')  # Handle BOM
-            except UnicodeDecodeError:
-                csv_text = contents.decode('latin-1')  # Fallback encoding
-        
-        # Parse CSV
-        csv_reader = csv.DictReader(io.StringIO(csv_text))
-        
+            job_priority = parse_priority(priority)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        if job_priority == Priority.TRANSACTIONAL:
+            raise HTTPException(status_code=400, detail="Bulk sends can't be transactional")
+        start_at = start_at.strip() if start_at and start_at.strip() else None
+        window = None
+        try:
+            if send_window and send_window.strip():
+                window = SendWindow.parse(send_window)
+            if start_at is not None:
+                datetime.fromisoformat(start_at)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=f"Invalid schedule: {e}")
+
+        # Parse CSV incrementally (encoding is detected from the first chunk)
+        csv_stream = CSVUploadStream(file)
+        fieldnames = await csv_stream.read_header()
+
         # Check if required columns exist
-        if csv_reader.fieldnames and 'name' not in csv_reader.fieldnames:
+        if fieldnames and 'name' not in fieldnames:
             raise HTTPException(status_code=400, detail="CSV must have 'name' column")
-        if csv_reader.fieldnames and 'phone' not in csv_reader.fieldnames:
+        if fieldnames and 'phone' not in fieldnames:
             raise HTTPException(status_code=400, detail="CSV must have 'phone' column")
-        
-        recipients = []
-        for row_num, row in enumerate(csv_reader, start=2):  # Start at 2 (header is line 1)
-            try:
-                if 'name' in row and 'phone' in row:
-                    name = row['name'].strip() if row['name'] else " "
-                    phone = row['phone'].strip() if row['phone'] else ""
-
-                    if phone:
-                        # Remove common symbols
-                        phone = phone.replace(" ", "").replace("-", "").replace("+", "")
-
-                        # Remove international prefix 00966 -> replace with nothing
-                        if phone.startswith("00966"):
-                            phone = phone[5:]
-
-                        # Remove leading zero (e.g. 055...)
-                        if phone.startswith("0"):
-                            phone = phone[1:]
-
-                        # If phone does not start with 966, add it
-                        if not phone.startswith("966"):
-                            phone = "966" + phone
-
-                        # Length check (966 + 9 digits = 12)
-                        if len(phone) != 12 or not phone.isdigit():
-                            print(f"❌ Invalid Saudi number: {row['phone']} -> {phone}")
-                            phone = ""  # Clear invalid number
-                        else:
-                            print(f"✅ Valid Saudi number: {phone}")
-                    
-                    if name and phone:
-                        # Replace [الاسم] placeholder with actual name
-                        personalized_message = message.replace('[الاسم]', name)
-                        text_list = [
-                            "حيّاك الله",
-                            "السلام عليكم و رحمة الله و بركاته",
-                            "يسعد أوقاتك",
-                            "تحية طيبة",
-                            "يعطيك العافية",
-                            "يسعد أيامك",
-                            "حيّاك الله",
-                            "يا هلا",
-                            "أهلًا",
-                            "السلام عليكم",
-                        ]
-                        name_list = [
-                            "نور",
-                            "سارة",
-                            "ريم",
-                            "هدى",
-                            "فاطمة",
-                            "مريم",
-                            "جواهر",
-                            "شهد",
-                            "دلال",
-                            "نورة",
-                            "أروى",
-                            "ضحى",
-                            "رغد",
-                            "سمية",
-                            "لمى",
-                            "غادة",
-                            "جنان",
-                            "ليان",
-                            "سلمى",
-                            "زينب"]
-
-                        random_text = random.choice(text_list)
-                        final_personalized_message1 = personalized_message.replace('[التحية]', random_text)
-                        random_text2 = random.choice(name_list)
-                        final_personalized_message = final_personalized_message1.replace('[الفريق]', random_text2)
-                        rtl_message = f"\u202B{final_personalized_message}\u202C"
-                        recipients.append({
-                            'phone': phone,
-                            'message': rtl_message,
-                            'name': name,
-                        })
-                        print(recipients)
-                    else:
-                        print(f"Skipping row {row_num}: missing name or phone")
-            except Exception as e:
-                print(f"Error processing row {row_num}: {str(e)}")
-                continue
-        
-        if not recipients:
-            raise HTTPException(
-                status_code=400,
-                detail="No valid recipients found in CSV. Make sure CSV has 'name' and 'phone' columns with data.",
-            )
-        
+
         # ---------------------------------------------------------------
-        # Enqueue all messages for the worker to drain at 2-3 min intervals.
-        # We DO NOT send synchronously here — the request returns immediately
-        # with a batch_id the UI can poll via /queue-status/{batch_id}.
+        # Enqueue messages for the lanes to drain at 20-30 min intervals.
+        # We DO NOT send synchronously here — the request returns with a
+        # batch_id the UI can poll via /queue-status/{batch_id}. The batch
+        # stays "ingesting" (and can't complete) until the whole file is in.
         # ---------------------------------------------------------------
-        batch_id = uuid.uuid4().hex
-        total = len(recipients)
-
-        batch_results[batch_id] = {
+        batch = {
             "batch_id": batch_id,
-            "status": "queued",
-            "total": total,
+            "status": "ingesting",
+            "total": 0,
             "sent": 0,
             "failed": 0,
-            "pending": total,
-            "details": [],
+            "pending": 0,
+            "retries": 0,
             "started_at": datetime.now(timezone.utc).isoformat(),
             "completed_at": None,
-            # Each message waits 2-3 min, so worst-case ETA ≈ total * 3 min
-            "estimated_minutes_min": round(total * MIN_DELAY_SECONDS / 60),
-            "estimated_minutes_max": round(total * MAX_DELAY_SECONDS / 60),
+            "estimated_minutes_min": 0,
+            "estimated_minutes_max": 0,
+            "start_at": start_at,
+            "send_window": str(window) if window is not None else None,
         }
-        _evict_old_batches()
-
-        for recipient in recipients:
-            await whatsapp_queue.put({
-                "api_key": api_key,
-                "phone": recipient["phone"],
-                "message": recipient["message"],
-                "name": recipient["name"],
-                "batch_id": batch_id,
-            })
-
-        print(
-            f"Queued {total} messages as batch {batch_id} "
-            f"(ETA {batch_results[batch_id]['estimated_minutes_min']}-"
-            f"{batch_results[batch_id]['estimated_minutes_max']} min)"
-        )
+        await asyncio.to_thread(job_store.create_batch, batch)
+
+        # Parse the message once and store it with the batch; jobs only keep
+        # the placeholder values of their row and are rendered at send time.
+        template = MessageTemplate(message, columns=fieldnames or ())
+        extra_fields = [f for f in template.fields if f != "name"]
+        await asyncio.to_thread(job_store.save_template, batch_id, template.source,
+                                template.fields)
+
+        chunk_rows = []      # (row_num, values) of the rows in the current chunk
+        chunk_phones = []    # their raw phone values, normalized per chunk
+        stats = IngestStats()
+        # Per-row details only at DEBUG; checked once, not per row
+        debug = bulk_logger.isEnabledFor(logging.DEBUG)
+        # First allowed send time per recipient time zone (the same for
+        # every number of a country), computed once per upload
+        scheduled = start_at is not None or window is not None
+        first_send: Dict[str, float] = {}
+        enqueued_at = time.time()
+
+        def not_before(phone: str) -> Optional[float]:
+            tz = recipient_zone(phone)
+            key = str(tz)
+            if key not in first_send:
+                first_send[key] = earliest_send(enqueued_at, tz, start_at, window)
+            return first_send[key] if first_send[key] > enqueued_at else None
+
+        async def flush():
+            # Normalize the whole chunk's phone column in one vectorized
+            # pass, then enqueue its valid rows in one transaction together
+            # with the updated batch counters, off the event loop.
+            normalized = normalize_numbers(chunk_phones, default_country=country_code)
+            jobs = []
+            for (row_num, values), raw_phone, phone, reason in zip(
+                    chunk_rows, chunk_phones,
+                    normalized["e164"], normalized["reason"]):
+                if reason == REJECT_EMPTY:
+                    stats.skipped += 1
+                    if debug:
+                        bulk_logger.debug("Skipping row: missing phone",
+                                          **fields(row=row_num))
+                    continue
+                if reason is not None:
+                    stats.invalid += 1
+                    if debug:
+                        bulk_logger.debug("Invalid phone number", **fields(
+                            row=row_num, raw=raw_phone, reason=reason))
+                    continue
+                try:
+                    name = values.pop("name")
+                    jobs.append({
+                        "api_key": api_key,
+                        "phone": phone,
+                        "name": name,
+                        "fields": values,
+                        "batch_id": batch_id,
+                        "priority": job_priority,
+                        "not_before": not_before(phone) if scheduled else None,
+                    })
+                    stats.valid += 1
+                    if debug:
+                        bulk_logger.debug("Valid phone number",
+                                          **fields(row=row_num, phone=phone))
+                except Exception as e:
+                    stats.errors += 1
+                    bulk_logger.warning("Error processing row",
+                                        **fields(row=row_num, error=e))
+            chunk_rows.clear()
+            chunk_phones.clear()
+
+            # Dedupe: numbers already in this batch, queued by another batch
+            # of this sender within DEDUPE_WINDOW_SECONDS or suppressed for
+            # it are dropped (and counted on the batch); the rest are
+            # reserved for this batch, so concurrent uploads can't both
+            # queue them.
+            reasons = await asyncio.to_thread(
+                job_store.reserve_recipients, api_key, batch_id,
+                [job["phone"] for job in jobs], DEDUPE_WINDOW_SECONDS)
+            kept = []
+            for job, reason in zip(jobs, reasons):
+                if reason is None:
+                    kept.append(job)
+                    continue
+                stats.valid -= 1
+                setattr(stats, reason, getattr(stats, reason) + 1)
+                if debug:
+                    bulk_logger.debug("Recipient dropped", **fields(
+                        phone=job["phone"], reason=reason))
+            jobs = kept
+
+            batch["total"] += len(jobs)
+            await asyncio.to_thread(job_store.enqueue_many, jobs, batch_id)
+            if jobs:
+                _wake_sender(api_key)
+                batch_events.publish(batch_id)
+            bulk_logger.info("Enqueued rows", **fields(
+                batch=batch_id, rows=stats.rows, **stats.as_dict()))
+
+        async for row_num, row in csv_stream:
+            if row.get('name') is None and row.get('phone') is None:
+                stats.skipped += 1
+                continue
+            values = {"name": row['name'].strip() if row.get('name') else " "}
+            for column in extra_fields:
+                values[column] = (row.get(column) or "").strip()
+            chunk_rows.append((row_num, values))
+            chunk_phones.append(row.get('phone'))
+            if len(chunk_rows) >= ENQUEUE_BATCH_SIZE:
+                await flush()
+
+        if chunk_rows:
+            await flush()
+
+        total = batch["total"]
+        dropped = stats.duplicates + stats.recently_sent + stats.suppressed
+        if not total and dropped:
+            raise HTTPException(
+                status_code=400,
+                detail=f"No recipients left to send to: {stats.duplicates} duplicate(s), "
+                       f"{stats.recently_sent} recently sent, {stats.suppressed} suppressed.",
+            )
+        if not total:
+            raise HTTPException(
+                status_code=400,
+                detail="No valid recipients found in CSV. Make sure CSV has 'name' and 'phone' columns with data.",
+            )
+
+        # Each message waits 20-30 min, so worst-case ETA ≈ total * 30 min.
+        # Lanes may already have sent every job; the store completes the
+        # batch then, atomically with the status change.
+        batch["estimated_minutes_min"] = round(total * MIN_DELAY_SECONDS / 60)
+        batch["estimated_minutes_max"] = round(total * MAX_DELAY_SECONDS / 60)
+        await asyncio.to_thread(job_store.finish_ingest, batch_id,
+                                datetime.now(timezone.utc).isoformat(),
+                                estimated_minutes_min=batch["estimated_minutes_min"],
+                                estimated_minutes_max=batch["estimated_minutes_max"])
+        batch_events.publish(batch_id)
+
+        bulk_logger.info("Batch queued", **fields(
+            batch=batch_id,
+            total=total,
+            **stats.as_dict(),
+            eta_min=batch["estimated_minutes_min"],
+            eta_max=batch["estimated_minutes_max"],
+            bytes=csv_stream.bytes_read,
+            encoding=csv_stream.encoding,
+        ))
 
         return JSONResponse(content={
             "batch_id": batch_id,
             "status": "queued",
             "queued": total,
             "total": total,
-            "estimated_minutes_min": batch_results[batch_id]["estimated_minutes_min"],
-            "estimated_minutes_max": batch_results[batch_id]["estimated_minutes_max"],
+            "estimated_minutes_min": batch["estimated_minutes_min"],
+            "estimated_minutes_max": batch["estimated_minutes_max"],
+            "ingest": stats.as_dict(),
+            "start_at": start_at,
+            "send_window": batch["send_window"],
             "poll_url": f"/queue-status/{batch_id}",
+            "events_url": f"/queue-events/{batch_id}",
         })
 
     except HTTPException:
+        await _discard_batch(batch_id, batch)
         raise
+    except CSVFormatError as e:
+        await _discard_batch(batch_id, batch)
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
-        print(f"Error in send_bulk_messages: {str(e)}")
+        bulk_logger.exception("Error in send_bulk_messages", **fields(batch=batch_id))
+        await _discard_batch(batch_id, batch)
         raise HTTPException(status_code=500, detail=str(e))
 
 
+async def _discard_batch(batch_id: str, batch: Optional[dict]):
+    """Drop a batch whose upload failed, including any jobs already enqueued."""
+    if batch is None:
+        return
+    if whatsapp_sender is not None:
+        whatsapp_sender.forget_batch(batch_id)
+    batch_events.publish(batch_id)
+    await asyncio.to_thread(job_store.discard_batch, batch_id)
+
+
+# Upper bound on details returned by one /queue-status call
+MAX_STATUS_PAGE = 1000
+
+
 @app.get("/queue-status/{batch_id}")
-async def queue_status(batch_id: str):
-    """Poll progress of a /send-bulk batch."""
-    b = batch_results.get(batch_id)
-    if not b:
+async def queue_status(
+    batch_id: str,
+    since: Optional[int] = Query(None, ge=0),
+    offset: Optional[int] = Query(None, ge=0),
+    limit: int = Query(200, ge=1, le=MAX_STATUS_PAGE),
+):
+    """
+    Poll progress of a /send-bulk batch.
+
+    By default only the counters are returned (plus `details_count`), so a
+    poll costs the same no matter how large the batch is. Per-recipient
+    details are append-only and fetched incrementally:
+      * ?since=<cursor>          details appended after `cursor` (start
+                                 with 0); the response's `next_cursor` is
+                                 the value to send on the next poll
+      * ?offset=<n>&limit=<m>    one page of the full details list
+    """
+    start = since if since is not None else offset
+    status = await asyncio.to_thread(_batch_status, batch_id, start, limit,
+                                     cursor=since is not None)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Unknown batch_id")
+    return JSONResponse(content=status)
+
+
+def _batch_status(batch_id: str,
+                  start: Optional[int] = None,
+                  limit: int = MAX_STATUS_PAGE,
+                  cursor: bool = False) -> Optional[dict]:
+    """
+    Batch counters (with `details_count`), plus up to `limit` details from
+    `start` if given; None for an unknown batch. Read from the shared
+    store, so it doesn't matter which process sends the batch (blocking:
+    call it in a worker thread).
+    """
+    status = job_store.get_batch(batch_id)
+    if status is None:
+        return None
+    if start is not None:
+        page = job_store.batch_details(batch_id, start, limit)
+        status["details"] = [outcome.as_dict() for outcome in page]
+        if cursor:
+            status["next_cursor"] = start + len(page)
+    return status
+
+
+# Seconds between keep-alive comments on an idle /queue-events stream
+EVENTS_KEEPALIVE_SECONDS = 15.0
+# Seconds between store checks for changes made by other processes
+EVENTS_POLL_SECONDS = 2.0
+
+
+@app.get("/queue-events/{batch_id}")
+async def queue_events(batch_id: str, request: Request,
+                       since: int = Query(0, ge=0)):
+    """
+    Server-sent progress of a /send-bulk batch.
+
+    Sends one event right away and then one each time the worker changes
+    the batch; every event carries the counters and the details appended
+    since the previous event (same shape as /queue-status?since=). The
+    event id is the details cursor, so a reconnecting EventSource resumes
+    through Last-Event-ID. The stream ends once the batch is completed.
+
+    Changes made in this process wake the stream at once; changes made by
+    another process (a separate sender, another worker) are picked up by
+    polling the store every EVENTS_POLL_SECONDS.
+    """
+    if await asyncio.to_thread(job_store.get_batch, batch_id) is None:
         raise HTTPException(status_code=404, detail="Unknown batch_id")
-    return JSONResponse(content=b)
+    last_event_id = request.headers.get("last-event-id", "")
+    cursor = int(last_event_id) if last_event_id.isdigit() else since
+
+    async def stream():
+        nonlocal cursor
+        wakeup = batch_events.subscribe(batch_id)
+        try:
+            while True:
+                wakeup.clear()
+                status = await asyncio.to_thread(_batch_status, batch_id, cursor,
+                                                 cursor=True)
+                if status is None:
+                    yield "event: gone\ndata: {}\n\n"
+                    return
+                cursor = status["next_cursor"]
+                yield f"id: {cursor}\ndata: {json.dumps(status, ensure_ascii=False)}\n\n"
+                if cursor < status["details_count"]:
+                    continue  # more details than one event carries
+                if status["status"] in ("completed", "stopped"):
+                    return
+                seen = _progress(status)
+                idle = 0.0
+                while not wakeup.is_set():
+                    try:
+                        await asyncio.wait_for(wakeup.wait(), EVENTS_POLL_SECONDS)
+                    except asyncio.TimeoutError:
+                        latest = await asyncio.to_thread(job_store.get_batch, batch_id)
+                        if latest is None or _progress(latest) != seen:
+                            break
+                        idle += EVENTS_POLL_SECONDS
+                        if idle >= EVENTS_KEEPALIVE_SECONDS:
+                            idle = 0.0
+                            yield ": keepalive\n\n"
+        finally:
+            batch_events.unsubscribe(batch_id, wakeup)
+
+    return StreamingResponse(stream(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache",
+                                      "X-Accel-Buffering": "no"})
+
+
+def _progress(status: dict) -> tuple:
+    """The parts of a batch status that change while it is sent."""
+    return (status["status"], status["sent"], status["failed"], status["pending"],
+            status["retries"], status["details_count"])
 
 
 from fastapi import FastAPI, Body, Form
@@ -853,9 +1098,11 @@ async def send_bulk_messages_debug(
     message: Optional[str] = Body(None),
     number: Optional[str] = Body(None),
 ):
-    print("api_key:", api_key)
-    print("message:", message)
-    print("number:", number)
+    logger.debug("Debug send request", **fields(
+        api_key=mask_key(api_key) if api_key else None,
+        message=message,
+        number=number,
+    ))
 
     return {"status": "ok"}
 
@@ -939,11 +1186,20 @@ async def get_email_interface():
                         body: formData
                     });
                     const data = await response.json();
-                    if (response.ok) {
-                        result.innerHTML = `<b>✅ Sent:</b> ${data.sent} | <b>❌ Failed:</b> ${data.failed} | Total: ${data.total}`;
-                    } else {
+                    if (!response.ok) {
                         result.innerHTML = `❌ Error: ${data.detail}`;
+                        return;
                     }
+                    // Emails are sent in the background; follow the batch live
+                    const events = new EventSource(data.events_url);
+                    events.onmessage = (event) => {
+                        const s = JSON.parse(event.data);
+                        const icon = s.status === 'sending' ? '⏳' : '🏁';
+                        result.innerHTML = `${icon} <b>✅ Sent:</b> ${s.sent} | <b>❌ Failed:</b> ${s.failed} | Total: ${s.total}`;
+                        if (s.status !== 'sending') {
+                            events.close();
+                        }
+                    };
                 });
             </script>
         </div>
@@ -955,6 +1211,17 @@ async def get_email_interface():
 # -------------------------------
 # ✉️ EMAIL ENDPOINT
 # -------------------------------
+SMTP_HOST = os.getenv("SMTP_HOST", "smtp.gmail.com")
+SMTP_PORT = int(os.getenv("SMTP_PORT", "587"))
+# Parallel SMTP connections per email batch, and its overall send rate
+EMAIL_CONCURRENCY = int(os.getenv("EMAIL_CONCURRENCY", "3"))
+EMAIL_RATE_PER_SECOND = float(os.getenv("EMAIL_RATE_PER_SECOND", "1"))
+
+email_logger = get_logger("email")
+
+# Running email batches (kept referenced until they finish)
+email_tasks: set = set()
+
 @app.post("/send-email")
 async def send_bulk_emails(
     sender_email: str = Form(...),
@@ -966,6 +1233,10 @@ async def send_bulk_emails(
     """
     Send personalized bulk emails from a CSV file.
     CSV columns required: name, email
+
+    The SMTP login is checked up front, then the batch is sent in the
+    background and the request returns right away with a batch_id; follow
+    it with /queue-status/{batch_id} or /queue-events/{batch_id}.
     """
     try:
         if not file.filename.endswith('.csv'):
@@ -981,38 +1252,108 @@ async def send_bulk_emails(
         if 'email' not in reader.fieldnames or 'name' not in reader.fieldnames:
             raise HTTPException(status_code=400, detail="CSV must have 'name' and 'email' columns")
 
+        # [name] and any other CSV column can be used in the body
+        template = MessageTemplate(body, columns=reader.fieldnames, pools={}, rtl=False)
         recipients = [r for r in reader if r.get('email')]
+        if not recipients:
+            raise HTTPException(status_code=400, detail="No recipients found in CSV")
+
+        # Log in once before accepting the batch, so bad credentials fail
+        # the request instead of every email of the batch.
+        pool = SMTPPool(SMTP_HOST, SMTP_PORT, sender_email, app_password)
+        try:
+            await asyncio.to_thread(pool.open)
+        except smtplib.SMTPAuthenticationError:
+            raise HTTPException(status_code=400, detail="SMTP login failed: check the email and app password")
+        except (smtplib.SMTPException, OSError) as e:
+            raise HTTPException(status_code=502, detail=f"Could not connect to SMTP server: {e}")
 
-        # Connect to Gmail SMTP
-        server = smtplib.SMTP("smtp.gmail.com", 587)
-        server.starttls()
-        server.login(sender_email, app_password)
+        batch_id = uuid.uuid4().hex
+        batch = {
+            "batch_id": batch_id,
+            "channel": "email",
+            "status": "sending",
+            "total": len(recipients),
+            "sent": 0,
+            "failed": 0,
+            "pending": len(recipients),
+            "started_at": datetime.now(timezone.utc).isoformat(),
+            "completed_at": None,
+        }
+        await asyncio.to_thread(job_store.create_batch, batch)
 
-        results = {"sent": 0, "failed": 0, "total": len(recipients), "details": []}
+        task = asyncio.create_task(
+            _run_email_batch(batch, pool, sender_email, subject, template, recipients))
+        email_tasks.add(task)
+        task.add_done_callback(email_tasks.discard)
 
-        for r in recipients:
-            try:
-                personalized_body = body.replace('[name]', r['name'])
-                msg = MIMEMultipart()
-                msg["From"] = sender_email
-                msg["To"] = r['email']
-                msg["Subject"] = subject
-                msg.attach(MIMEText(personalized_body, "plain"))
-                server.send_message(msg)
-                results["sent"] += 1
-                results["details"].append({"email": r['email'], "name": r['name'], "status": "✅ Sent"})
-                await asyncio.sleep(1)
-            except Exception as e:
-                results["failed"] += 1
-                results["details"].append({"email": r['email'], "error": str(e)})
-
-        server.quit()
-        return JSONResponse(content=results)
+        email_logger.info("Email batch started", **fields(
+            batch=batch_id, total=len(recipients),
+            concurrency=EMAIL_CONCURRENCY, rate=EMAIL_RATE_PER_SECOND))
 
+        return JSONResponse(content={
+            "batch_id": batch_id,
+            "status": "sending",
+            "total": len(recipients),
+            "poll_url": f"/queue-status/{batch_id}",
+            "events_url": f"/queue-events/{batch_id}",
+        })
+
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+async def _run_email_batch(batch: dict,
+                           pool: SMTPPool,
+                           sender_email: str,
+                           subject: str,
+                           template: MessageTemplate,
+                           recipients: List[dict]):
+    """Background task: send every recipient of an email batch through `pool`."""
+    batch_id = batch["batch_id"]
+
+    def messages():
+        for r in recipients:
+            msg = MIMEMultipart()
+            msg["From"] = sender_email
+            msg["To"] = r['email']
+            msg["Subject"] = subject
+            msg.attach(MIMEText(template.render(r), "plain"))
+            yield (r['email'], r.get('name') or ""), msg
+
+    async def on_result(tag, success: bool, error: Optional[str]):
+        email, name = tag
+        if success:
+            batch["sent"] += 1
+            outcome = EmailOutcome(email, name, Status.SENT)
+        else:
+            batch["failed"] += 1
+            outcome = EmailOutcome(email, name, Status.FAILED, error)
+            email_logger.warning("Email failed", **fields(batch=batch_id, to=email, error=error))
+        batch["pending"] -= 1
+        await asyncio.to_thread(job_store.record_outcome, batch_id, outcome)
+        batch_events.publish(batch_id)
+
+    try:
+        await send_all(pool, messages(), on_result,
+                       concurrency=EMAIL_CONCURRENCY, rate=EMAIL_RATE_PER_SECOND)
+    except asyncio.CancelledError:
+        email_logger.warning("Email batch stopped", **fields(batch=batch_id, pending=batch["pending"]))
+        raise
+    except Exception:
+        email_logger.exception("Email batch error", **fields(batch=batch_id))
+    finally:
+        await asyncio.to_thread(pool.close)
+        await asyncio.to_thread(job_store.update_batch, batch_id,
+                                status="completed" if batch["pending"] <= 0 else "stopped",
+                                completed_at=datetime.now(timezone.utc).isoformat())
+        batch_events.publish(batch_id)
+        email_logger.info("Email batch finished", **fields(
+            batch=batch_id, sent=batch["sent"], failed=batch["failed"]))
+
+
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
@@ -1026,7 +1367,20 @@ async def test_endpoint():
 
 
 if __name__ == "__main__":
+    import argparse
     import uvicorn
-    print("Starting WhatsApp Bulk Messaging System...")
-    print("Access the interface at: http://localhost:8002")
-    uvicorn.run(app, host="0.0.0.0", port=8002)
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="WhatsApp Bulk Messaging System API")
+    parser.add_argument("--role", choices=APP_ROLES, default=APP_ROLE,
+                        help="'all': API and sender lanes in this process; "
+                             "'api': web tier only, with `python sender.py` running separately")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8002)
+    args = parser.parse_args()
+    if args.role == "api":
+        whatsapp_sender = None
+    elif whatsapp_sender is None:
+        whatsapp_sender = Sender(job_store, waits=queue_waits, on_progress=batch_events.publish)
+    APP_ROLE = args.role
+    logger.info("Starting WhatsApp Bulk Messaging System...")
+    logger.info(f"Access the interface at: http://localhost:{args.port}")
+    uvicorn.run(app, host=args.host, port=args.port)
\ No newline at end of file
@@ -0,0 +1,26 @@
+"""
+Messaging core for the WhatsApp Bulk Messaging System
+Scheduling and delivery building blocks used by main.py and sender.py
+"""
+
+from .ingest import CSVUploadStream
+from .job_store import JobStore
+from .records import EmailOutcome, Job, Outcome, Priority, Status
+from .scheduler import LaneScheduler, mask_key
+from .store import QueueStore, open_store
+from .template import MessageTemplate
+
+__all__ = [
+    "CSVUploadStream",
+    "EmailOutcome",
+    "Job",
+    "JobStore",
+    "LaneScheduler",
+    "MessageTemplate",
+    "Outcome",
+    "Priority",
+    "QueueStore",
+    "Status",
+    "mask_key",
+    "open_store",
+]
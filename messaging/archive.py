@@ -0,0 +1,89 @@
+"""
+Cold storage for finished batches.
+
+Once a batch is completed (and its watchers had time to read the end of
+it), its counters and per-recipient outcomes move out of the queue store
+into one gzip file per batch: a JSON header line with the batch counters,
+then one compact `[recipient, name, status, error]` line per outcome, in
+the order they were recorded. The queue store then only holds live and
+recently finished batches, however many recipients were sent in total;
+archived batches are still answered from here by /queue-status.
+"""
+
+import gzip
+import json
+import os
+import re
+import uuid
+from itertools import islice
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+# (recipient, name, status, error), as stored in the outcomes table
+OutcomeRow = Tuple[str, str, int, Optional[str]]
+
+# Batch ids are generated hex strings; anything else never names a file
+_BATCH_ID = re.compile(r"^[0-9A-Za-z_-]{1,64}$")
+
+
+class BatchArchive:
+    """Directory of archived batches, `<batch_id>.jsonl.gz` each."""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, batch_id: str) -> Optional[str]:
+        if not _BATCH_ID.match(batch_id):
+            return None
+        return os.path.join(self.directory, f"{batch_id}.jsonl.gz")
+
+    def write(self, batch: Dict[str, Any], outcomes: Iterable[OutcomeRow]) -> int:
+        """
+        Store a batch and its outcomes, replacing any earlier copy
+        atomically (several processes may archive the same batch).
+        Returns the number of outcomes written.
+        """
+        path = self._path(batch["batch_id"])
+        if path is None:
+            raise ValueError(f"Invalid batch_id {batch['batch_id']!r}")
+        tmp = f"{path}.{uuid.uuid4().hex[:8]}.tmp"
+        count = 0
+        try:
+            with gzip.open(tmp, "wt", encoding="utf-8", compresslevel=6) as out:
+                out.write(_dump(batch) + "\n")
+                for row in outcomes:
+                    out.write(_dump(list(row)) + "\n")
+                    count += 1
+            os.replace(tmp, path)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+        return count
+
+    def get_batch(self, batch_id: str) -> Optional[Dict[str, Any]]:
+        """Counters of an archived batch (with `details_count`), or None."""
+        path = self._path(batch_id)
+        if path is None or not os.path.exists(path):
+            return None
+        with gzip.open(path, "rt", encoding="utf-8") as archived:
+            return json.loads(archived.readline())
+
+    def details(self, batch_id: str, start: int, limit: int) -> List[OutcomeRow]:
+        """Up to `limit` outcomes after the first `start`."""
+        path = self._path(batch_id)
+        if path is None or not os.path.exists(path):
+            return []
+        with gzip.open(path, "rt", encoding="utf-8") as archived:
+            # Skip the header and the outcomes before `start` unparsed
+            lines = islice(archived, 1 + start, 1 + start + limit)
+            return [tuple(json.loads(line)) for line in lines]
+
+    def delete(self, batch_id: str):
+        path = self._path(batch_id)
+        if path is not None and os.path.exists(path):
+            os.remove(path)
+
+
+def _dump(value: Any) -> str:
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"))
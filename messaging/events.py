@@ -0,0 +1,40 @@
+"""
+Push notifications for batch progress.
+
+`BatchEventHub` tracks the open /queue-events streams of each batch. The
+worker publishes a batch_id whenever one of its counters changes; every
+subscriber of that batch is woken up and sends one fresh snapshot. Bursts
+of changes between two wakeups collapse into a single event, and batches
+nobody watches cost nothing.
+"""
+
+import asyncio
+from typing import Dict, Set
+
+
+class BatchEventHub:
+    """Per-batch wakeup events for server-sent progress streams."""
+
+    def __init__(self):
+        self._subscribers: Dict[str, Set[asyncio.Event]] = {}
+
+    def subscribe(self, batch_id: str) -> asyncio.Event:
+        event = asyncio.Event()
+        self._subscribers.setdefault(batch_id, set()).add(event)
+        return event
+
+    def unsubscribe(self, batch_id: str, event: asyncio.Event):
+        subscribers = self._subscribers.get(batch_id)
+        if subscribers is None:
+            return
+        subscribers.discard(event)
+        if not subscribers:
+            del self._subscribers[batch_id]
+
+    def publish(self, batch_id: str):
+        """Wake every stream watching `batch_id` (call from the event loop)."""
+        for event in self._subscribers.get(batch_id, ()):
+            event.set()
+
+    def subscriber_count(self) -> int:
+        return sum(len(s) for s in self._subscribers.values())
@@ -0,0 +1,181 @@
+"""
+Streaming CSV ingestion for uploaded files.
+
+Reads an UploadFile in fixed-size chunks, detects the encoding from the
+first chunk and yields parsed rows one at a time, so memory stays flat no
+matter how large the upload is. Quoted fields that span several lines are
+supported: lines are grouped into complete records before they reach the
+csv parser, tracking quotes the way the csv module does (only a quote at
+the start of a field opens a quoted field, so `5'11" tall` is plain text).
+"""
+
+import codecs
+import csv
+from collections import deque
+from typing import AsyncIterator, Deque, Dict, List, Optional, Tuple
+
+CHUNK_SIZE = 64 * 1024
+
+# Quote states of a record, as the csv module (excel dialect) sees them
+_FIELD_START, _IN_FIELD, _IN_QUOTES, _QUOTE_IN_QUOTES = range(4)
+
+
+class CSVFormatError(ValueError):
+    """A record the csv parser rejects; `row` is its record number."""
+
+    def __init__(self, row: int, error: Exception):
+        super().__init__(f"Malformed CSV at row {row}: {error}")
+        self.row = row
+
+
+def _quote_state(line: str, state: int) -> int:
+    """Quote state after `line`, starting in `state`."""
+    for char in line:
+        if state == _IN_QUOTES:
+            if char == '"':
+                state = _QUOTE_IN_QUOTES
+        elif char == ",":
+            state = _FIELD_START
+        elif char == '"' and state != _IN_FIELD:
+            # Opens a quoted field, or is the second half of a doubled quote
+            state = _IN_QUOTES
+        elif state != _IN_FIELD and char not in "\r\n":
+            state = _IN_FIELD
+    return state
+
+
+def detect_encoding(first_chunk: bytes) -> str:
+    """
+    Pick the decoder for an upload from its first chunk: 'utf-8-sig' when a
+    BOM is present, 'utf-8' when the chunk decodes cleanly (a multi-byte
+    character cut at the chunk boundary is fine), otherwise 'latin-1'.
+    """
+    if first_chunk.startswith(codecs.BOM_UTF8):
+        return "utf-8-sig"
+    try:
+        codecs.getincrementaldecoder("utf-8")().decode(first_chunk, final=False)
+        return "utf-8"
+    except UnicodeDecodeError:
+        return "latin-1"
+
+
+class _RecordFeed:
+    """Iterator handed to csv.reader; refilled with complete records."""
+
+    def __init__(self):
+        self.records: Deque[str] = deque()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> str:
+        if self.records:
+            return self.records.popleft()
+        raise StopIteration
+
+
+class CSVUploadStream:
+    """
+    Incremental DictReader over an async file object (e.g. FastAPI's
+    UploadFile).
+
+    Usage:
+        stream = CSVUploadStream(file)
+        fieldnames = await stream.read_header()
+        async for row_num, row in stream:
+            ...
+
+    Rows are dicts keyed by header name, like csv.DictReader; `row_num` is
+    the 1-based record number in the file (the header is record 1).
+    Blank lines are skipped. A record the csv parser rejects raises
+    CSVFormatError.
+    """
+
+    def __init__(self, upload, chunk_size: int = CHUNK_SIZE):
+        self.upload = upload
+        self.chunk_size = chunk_size
+        self.encoding: Optional[str] = None
+        self.fieldnames: Optional[List[str]] = None
+        self.bytes_read = 0
+
+        self._decoder = None
+        self._feed = _RecordFeed()
+        self._reader = csv.reader(self._feed)
+        self._tail = ""             # text after the last newline seen
+        self._record_parts: List[str] = []
+        self._state = _FIELD_START  # quote state of the incomplete record
+        self._rows: Deque[List[str]] = deque()
+        self._eof = False
+        self._row_num = 0
+
+    async def _read_text(self) -> Optional[str]:
+        """Next decoded chunk, or None at end of file."""
+        if self._eof:
+            return None
+        chunk = await self.upload.read(self.chunk_size)
+        if self._decoder is None:
+            self.encoding = detect_encoding(chunk)
+            # An upload that starts as valid UTF-8 is decoded leniently after
+            # that, since we can no longer restart it with another codec.
+            self._decoder = codecs.getincrementaldecoder(self.encoding)(errors="replace")
+        self.bytes_read += len(chunk)
+        if not chunk:
+            self._eof = True
+            return self._decoder.decode(b"", final=True) + "\n"
+        return self._decoder.decode(chunk)
+
+    def _split_records(self, text: str):
+        lines = (self._tail + text).split("\n")
+        self._tail = lines.pop()
+        for line in lines:
+            line += "\n"
+            self._record_parts.append(line)
+            if '"' in line:
+                self._state = _quote_state(line, self._state)
+            if self._state != _IN_QUOTES:
+                self._feed.records.append("".join(self._record_parts))
+                self._record_parts.clear()
+                self._state = _FIELD_START
+        if self._eof and self._record_parts:
+            # Unclosed quote at end of file: hand over what we have
+            self._feed.records.append("".join(self._record_parts))
+            self._record_parts.clear()
+        try:
+            for row in self._reader:
+                if row:
+                    self._rows.append(row)
+        except csv.Error as e:
+            raise CSVFormatError(self._row_num + len(self._rows) + 1, e) from e
+
+    async def _next_row(self) -> Optional[List[str]]:
+        while not self._rows:
+            text = await self._read_text()
+            if text is None:
+                return None
+            self._split_records(text)
+        self._row_num += 1
+        return self._rows.popleft()
+
+    async def read_header(self) -> Optional[List[str]]:
+        """Read and return the header row (None for an empty file)."""
+        if self.fieldnames is None:
+            self.fieldnames = await self._next_row()
+        return self.fieldnames
+
+    def __aiter__(self) -> AsyncIterator[Tuple[int, Dict[str, Optional[str]]]]:
+        return self._iter_rows()
+
+    async def _iter_rows(self) -> AsyncIterator[Tuple[int, Dict[str, Optional[str]]]]:
+        fieldnames = await self.read_header()
+        if not fieldnames:
+            return
+        width = len(fieldnames)
+        while True:
+            values = await self._next_row()
+            if values is None:
+                return
+            row: Dict[str, Optional[str]] = dict(zip(fieldnames, values))
+            if len(values) < width:
+                for name in fieldnames[len(values):]:
+                    row[name] = None
+            yield self._row_num, row
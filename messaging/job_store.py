@@ -0,0 +1,873 @@
+"""
+Durable job queue backed by SQLite (WAL mode).
+
+Queued sends, batch counters and per-recipient outcomes live in a single
+database file under the `./logs` volume, so a container restart resumes
+where it stopped instead of silently dropping days of pending messages.
+Every process that opens the same file (uvicorn workers, a separate
+sender) sees the same queue and batches: counters are updated in SQL,
+never copied into process memory.
+
+Bulk jobs don't store their rendered text: they keep the recipient's
+template fields (JSON) and the batch template is stored once in
+`templates`, so the database grows with recipient data, not message size.
+
+Job rows move pending -> claimed -> sent | failed. Claiming and acking are
+single transactions. A claim is a lease held by one process (`owner`) for
+`job_lease` seconds, renewed (renew_claim) while its send is in flight;
+jobs whose lease expired (the process died mid-send) are released back to
+'pending' by release_expired() (delivery is at-least-once). Acks, retries
+and deferrals only apply while this process still holds the claim, so a
+job re-claimed elsewhere after its lease ran out is counted once. A
+transient failure puts the job back to 'pending' with a `not_before` time;
+it is not claimable before then. Scheduled campaigns use the same column: a
+job enqueued for later (start time, send window) is pending with a future
+`not_before`, and the `jobs_due` index keeps any number of them cheap to
+hold.
+
+Each sender (api_key) is drained by one process at a time: its lane holds
+a lease in `lanes` (see lease_lane). Enqueuing bumps the sender's
+`notify_seq`, which lets other processes notice new work (notified_lanes).
+
+Bulk recipients are reserved per sender in `recipients` before they are
+enqueued (reserve_recipients): a number already in the batch, queued by
+another batch of the same api_key within the dedupe window (or by one that
+is still sending, however long it takes), or on the key's `suppressions`
+list is dropped and counted on the batch.
+
+Completed batches don't stay here: archive_completed() moves their
+counters and outcomes to a BatchArchive (messaging.archive) next to the
+database and deletes their rows, finished jobs included, so the database
+holds live batches only. get_batch / batch_details read archived batches
+from there.
+"""
+
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from .archive import BatchArchive, OutcomeRow
+from .records import EmailOutcome, Job, Outcome, Priority, Status
+from .store import DROP_DUPLICATE, DROP_RECENT, DROP_SUPPRESSED, QueueStore
+
+SCHEMA_VERSION = 7
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id          INTEGER PRIMARY KEY AUTOINCREMENT,
+    api_key     TEXT NOT NULL,
+    batch_id    TEXT,
+    phone       TEXT NOT NULL,
+    name        TEXT NOT NULL DEFAULT '',
+    message     TEXT NOT NULL,
+    fields      TEXT,
+    status      TEXT NOT NULL DEFAULT 'pending',
+    attempts    INTEGER NOT NULL DEFAULT 0,
+    not_before  REAL,
+    priority    INTEGER NOT NULL DEFAULT 1,
+    error       TEXT,
+    created_at  REAL NOT NULL,
+    claimed_at  REAL,
+    claimed_by  TEXT,
+    lease_until REAL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_lane ON jobs (api_key, status, priority, id);
+CREATE INDEX IF NOT EXISTS jobs_batch ON jobs (batch_id, status);
+CREATE INDEX IF NOT EXISTS jobs_due ON jobs (api_key, status, priority, not_before);
+CREATE INDEX IF NOT EXISTS jobs_leases ON jobs (lease_until) WHERE status = 'claimed';
+
+CREATE TABLE IF NOT EXISTS batches (
+    batch_id              TEXT PRIMARY KEY,
+    channel               TEXT NOT NULL DEFAULT 'whatsapp',
+    status                TEXT NOT NULL,
+    total                 INTEGER NOT NULL,
+    sent                  INTEGER NOT NULL DEFAULT 0,
+    failed                INTEGER NOT NULL DEFAULT 0,
+    pending               INTEGER NOT NULL,
+    retries               INTEGER NOT NULL DEFAULT 0,
+    started_at            TEXT,
+    completed_at          TEXT,
+    estimated_minutes_min INTEGER,
+    estimated_minutes_max INTEGER,
+    start_at              TEXT,
+    send_window           TEXT,
+    duplicates            INTEGER NOT NULL DEFAULT 0,
+    recently_sent         INTEGER NOT NULL DEFAULT 0,
+    suppressed            INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS outcomes (
+    batch_id  TEXT NOT NULL,
+    seq       INTEGER NOT NULL,
+    recipient TEXT NOT NULL,
+    name      TEXT NOT NULL,
+    status    INTEGER NOT NULL,
+    error     TEXT,
+    PRIMARY KEY (batch_id, seq)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS templates (
+    batch_id TEXT PRIMARY KEY,
+    source   TEXT NOT NULL,
+    fields   TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS lanes (
+    api_key     TEXT PRIMARY KEY,
+    owner       TEXT,
+    lease_until REAL,
+    notify_seq  INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS recipients (
+    api_key    TEXT NOT NULL,
+    phone      TEXT NOT NULL,
+    batch_id   TEXT NOT NULL,
+    expires_at REAL NOT NULL,
+    PRIMARY KEY (api_key, phone)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS recipients_expiry ON recipients (expires_at);
+
+CREATE TABLE IF NOT EXISTS suppressions (
+    api_key    TEXT NOT NULL,
+    phone      TEXT NOT NULL,
+    reason     TEXT,
+    created_at REAL NOT NULL,
+    PRIMARY KEY (api_key, phone)
+) WITHOUT ROWID;
+"""
+
+# Upgrades from each older user_version to the next one
+_MIGRATIONS = {
+    1: """
+ALTER TABLE jobs ADD COLUMN fields TEXT;
+CREATE TABLE IF NOT EXISTS templates (
+    batch_id TEXT PRIMARY KEY,
+    source   TEXT NOT NULL,
+    fields   TEXT NOT NULL
+);
+""",
+    2: """
+ALTER TABLE jobs ADD COLUMN attempts INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE jobs ADD COLUMN not_before REAL;
+CREATE INDEX IF NOT EXISTS jobs_due ON jobs (api_key, status, not_before);
+ALTER TABLE batches ADD COLUMN retries INTEGER NOT NULL DEFAULT 0;
+""",
+    3: """
+ALTER TABLE jobs ADD COLUMN priority INTEGER NOT NULL DEFAULT 1;
+UPDATE jobs SET priority = 2 WHERE batch_id IS NOT NULL;
+UPDATE jobs SET priority = 0 WHERE batch_id IS NULL;
+DROP INDEX IF EXISTS jobs_lane;
+DROP INDEX IF EXISTS jobs_due;
+CREATE INDEX jobs_lane ON jobs (api_key, status, priority, id);
+CREATE INDEX jobs_due ON jobs (api_key, status, priority, not_before);
+""",
+    4: """
+ALTER TABLE batches ADD COLUMN start_at TEXT;
+ALTER TABLE batches ADD COLUMN send_window TEXT;
+""",
+    5: """
+ALTER TABLE jobs ADD COLUMN claimed_by TEXT;
+ALTER TABLE jobs ADD COLUMN lease_until REAL;
+CREATE INDEX jobs_leases ON jobs (lease_until) WHERE status = 'claimed';
+ALTER TABLE batches ADD COLUMN channel TEXT NOT NULL DEFAULT 'whatsapp';
+CREATE TABLE outcomes (
+    batch_id  TEXT NOT NULL,
+    seq       INTEGER NOT NULL,
+    recipient TEXT NOT NULL,
+    name      TEXT NOT NULL,
+    status    INTEGER NOT NULL,
+    error     TEXT,
+    PRIMARY KEY (batch_id, seq)
+) WITHOUT ROWID;
+INSERT INTO outcomes (batch_id, seq, recipient, name, status, error)
+    SELECT batch_id,
+           ROW_NUMBER() OVER (PARTITION BY batch_id ORDER BY finished_at, id),
+           phone, name, CASE status WHEN 'sent' THEN 2 ELSE 3 END, error
+    FROM jobs WHERE batch_id IS NOT NULL AND status IN ('sent', 'failed');
+CREATE TABLE lanes (
+    api_key     TEXT PRIMARY KEY,
+    owner       TEXT,
+    lease_until REAL,
+    notify_seq  INTEGER NOT NULL DEFAULT 0
+);
+""",
+    6: """
+ALTER TABLE batches ADD COLUMN duplicates INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE batches ADD COLUMN recently_sent INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE batches ADD COLUMN suppressed INTEGER NOT NULL DEFAULT 0;
+CREATE TABLE recipients (
+    api_key    TEXT NOT NULL,
+    phone      TEXT NOT NULL,
+    batch_id   TEXT NOT NULL,
+    expires_at REAL NOT NULL,
+    PRIMARY KEY (api_key, phone)
+) WITHOUT ROWID;
+CREATE INDEX recipients_expiry ON recipients (expires_at);
+INSERT INTO recipients (api_key, phone, batch_id, expires_at)
+    SELECT api_key, phone, batch_id, MAX(created_at) + 86400
+    FROM jobs WHERE batch_id IS NOT NULL AND status IN ('pending', 'claimed')
+    GROUP BY api_key, phone;
+CREATE TABLE suppressions (
+    api_key    TEXT NOT NULL,
+    phone      TEXT NOT NULL,
+    reason     TEXT,
+    created_at REAL NOT NULL,
+    PRIMARY KEY (api_key, phone)
+) WITHOUT ROWID;
+""",
+}
+
+_BATCH_COLUMNS = (
+    "batch_id", "channel", "status", "total", "sent", "failed", "pending", "retries",
+    "started_at", "completed_at",
+    "estimated_minutes_min", "estimated_minutes_max",
+    "start_at", "send_window",
+    "duplicates", "recently_sent", "suppressed",
+)
+
+# Batch columns a caller may change with update_batch (counters are only
+# ever changed by enqueue / ack / retry / record_outcome)
+_BATCH_SETTABLE = frozenset({
+    "status", "completed_at", "estimated_minutes_min", "estimated_minutes_max",
+})
+
+_JOB_COLUMNS = ("id", "api_key", "batch_id", "phone", "name", "message", "fields",
+                "attempts", "priority", "created_at")
+
+# Outcome record class per batch channel, for rebuilding details
+_OUTCOME_TYPES = {"whatsapp": Outcome, "email": EmailOutcome}
+
+# Final batch statuses: such a batch has no pending jobs left
+_FINISHED = ("completed", "stopped")
+
+# Outcomes read per query while archiving a batch
+_ARCHIVE_PAGE = 5000
+
+# Phones per `IN (...)` lookup (SQLite caps bound parameters per statement)
+_LOOKUP_CHUNK = 500
+
+
+def default_owner() -> str:
+    """Identity of this process in job and lane leases."""
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+
+class JobStore(QueueStore):
+    """SQLite-backed queue of WhatsApp jobs plus persisted batch state."""
+
+    def __init__(self,
+                 path: str,
+                 owner: Optional[str] = None,
+                 job_lease: float = 300.0,
+                 archive_dir: Optional[str] = None):
+        self.path = path
+        self.owner = owner or default_owner()
+        self.job_lease = job_lease
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self.archive = BatchArchive(archive_dir or os.path.join(directory, "archive"))
+
+        # One connection shared across the event loop and worker threads
+        # (bulk enqueues run in asyncio.to_thread); the lock serializes use.
+        # Other processes use their own connection; SQLite's file locks
+        # serialize the write transactions between them.
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path,
+                                     isolation_level=None,
+                                     check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA busy_timeout=5000")
+        self._init_schema()
+
+    def _init_schema(self):
+        with self._write():
+            version = self._conn.execute("PRAGMA user_version").fetchone()[0]
+            if version == 0:
+                for statement in _statements(_SCHEMA):
+                    self._conn.execute(statement)
+            else:
+                for v in range(version, SCHEMA_VERSION):
+                    for statement in _statements(_MIGRATIONS[v]):
+                        self._conn.execute(statement)
+            if version < SCHEMA_VERSION:
+                self._conn.execute(f"PRAGMA user_version={SCHEMA_VERSION}")
+
+    @contextmanager
+    def _write(self) -> Iterator[sqlite3.Connection]:
+        """One write transaction, taking the database write lock up front."""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._conn
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    # ------------------------------------------------------------------
+    # Jobs
+    # ------------------------------------------------------------------
+    def enqueue_many(self,
+                     jobs: Iterable[Dict[str, Any]],
+                     batch_id: Optional[str] = None) -> int:
+        """
+        Append jobs in one transaction and, with `batch_id`, add them to
+        that batch's total / pending counters. Returns the number of job
+        rows added.
+
+        A job carries either its final `message`, or `fields` to render with
+        its batch template (see save_template) at send time, and optionally
+        a `priority` (default Priority.NORMAL) and a `not_before` time.
+        """
+        now = time.time()
+        rows = [(
+            job["api_key"],
+            job.get("batch_id"),
+            job["phone"],
+            job.get("name", ""),
+            job.get("message", ""),
+            _dump_fields(job.get("fields")),
+            int(job.get("priority", Priority.NORMAL)),
+            job.get("not_before"),
+            now,
+        ) for job in jobs]
+        if not rows:
+            return 0
+        with self._write() as conn:
+            conn.executemany(
+                "INSERT INTO jobs (api_key, batch_id, phone, name, message, fields, "
+                "priority, not_before, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                rows)
+            if batch_id is not None:
+                conn.execute(
+                    "UPDATE batches SET total = total + ?, pending = pending + ? "
+                    "WHERE batch_id = ?", (len(rows), len(rows), batch_id))
+            # Wake whichever process drains these senders
+            seq = conn.execute("SELECT COALESCE(MAX(notify_seq), 0) FROM lanes").fetchone()[0]
+            for api_key in {row[0] for row in rows}:
+                seq += 1
+                conn.execute(
+                    "INSERT INTO lanes (api_key, notify_seq) VALUES (?, ?) "
+                    "ON CONFLICT (api_key) DO UPDATE SET notify_seq = excluded.notify_seq",
+                    (api_key, seq))
+        return len(rows)
+
+    def enqueue(self, job: Dict[str, Any]) -> int:
+        return self.enqueue_many([job])
+
+    def has_pending(self, api_key: str) -> bool:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT 1 FROM jobs WHERE api_key = ? AND status = 'pending' LIMIT 1",
+                (api_key,)).fetchone()
+        return row is not None
+
+    def next_due_by_class(self, api_key: str) -> Dict[Priority, float]:
+        """
+        For each priority class with pending jobs of `api_key`: when its
+        next job becomes claimable (a time in the past means now).
+        """
+        due: Dict[Priority, float] = {}
+        with self._lock:
+            for priority in Priority:
+                row = self._conn.execute(
+                    "SELECT 1 FROM jobs WHERE api_key = ? AND status = 'pending' "
+                    "AND priority = ? AND not_before IS NULL LIMIT 1",
+                    (api_key, int(priority))).fetchone()
+                if row is not None:
+                    due[priority] = 0.0
+                    continue
+                row = self._conn.execute(
+                    "SELECT MIN(not_before) FROM jobs "
+                    "WHERE api_key = ? AND status = 'pending' AND priority = ?",
+                    (api_key, int(priority))).fetchone()
+                if row[0] is not None:
+                    due[priority] = row[0]
+        return due
+
+    def claim_next(self, api_key: str, priority: Priority) -> Optional[Job]:
+        """
+        Atomically lease the oldest due pending job of `api_key` in class
+        `priority` to this process.
+        """
+        now = time.time()
+        with self._write() as conn:
+            row = conn.execute(
+                f"SELECT {', '.join(_JOB_COLUMNS)} FROM jobs "
+                "WHERE api_key = ? AND status = 'pending' AND priority = ? "
+                "AND (not_before IS NULL OR not_before <= ?) ORDER BY id LIMIT 1",
+                (api_key, int(priority), now)).fetchone()
+            if row is not None:
+                conn.execute(
+                    "UPDATE jobs SET status = 'claimed', claimed_at = ?, claimed_by = ?, "
+                    "lease_until = ? WHERE id = ?",
+                    (now, self.owner, now + self.job_lease, row[0]))
+        if row is None:
+            return None
+        (job_id, key, batch_id, phone, name, message, job_fields,
+         attempts, job_priority, created_at) = row
+        return Job(job_id, key, batch_id, phone, name, message,
+                   json.loads(job_fields) if job_fields is not None else None,
+                   attempts, Priority(job_priority), created_at)
+
+    def renew_claim(self, job: Job) -> bool:
+        """
+        Extend this process's lease on a claimed job by `job_lease` seconds.
+        Returns False if the claim was lost (lease expired and released).
+        """
+        with self._write() as conn:
+            return conn.execute(
+                "UPDATE jobs SET lease_until = ? "
+                "WHERE id = ? AND status = 'claimed' AND claimed_by = ?",
+                (time.time() + self.job_lease, job.id, self.owner)).rowcount == 1
+
+    def ack(self, job: Job, status: Status, error: Optional[str] = None) -> Optional[bool]:
+        """
+        Record the final outcome of a claimed job (Status.SENT, FAILED or
+        ERROR). For a batch job the batch counters and outcome list are
+        updated in the same transaction, and the batch completes with its
+        last job. Returns True if this job completed its batch, and None
+        (recording nothing) if this process no longer holds the claim.
+        """
+        sent = status is Status.SENT
+        with self._write() as conn:
+            if not conn.execute(
+                    "UPDATE jobs SET status = ?, attempts = attempts + 1, error = ?, "
+                    "finished_at = ?, lease_until = NULL "
+                    "WHERE id = ? AND status = 'claimed' AND claimed_by = ?",
+                    ("sent" if sent else "failed", error, time.time(), job.id,
+                     self.owner)).rowcount:
+                return None
+            if job.batch_id is None:
+                return False
+            return self._add_outcome(conn, job.batch_id, job.phone, job.name, status, error)
+
+    def retry(self,
+              job: Job,
+              not_before: float,
+              error: Optional[str] = None) -> bool:
+        """
+        Put a claimed job back to 'pending' after a transient failure,
+        claimable again from `not_before` (epoch seconds). Counts the
+        attempt, and the retry on the job's batch. Returns False (changing
+        nothing) if this process no longer holds the claim.
+        """
+        with self._write() as conn:
+            if not conn.execute(
+                    "UPDATE jobs SET status = 'pending', attempts = attempts + 1, "
+                    "not_before = ?, error = ?, claimed_at = NULL, claimed_by = NULL, "
+                    "lease_until = NULL WHERE id = ? AND status = 'claimed' AND claimed_by = ?",
+                    (not_before, error, job.id, self.owner)).rowcount:
+                return False
+            if job.batch_id is not None:
+                conn.execute("UPDATE batches SET retries = retries + 1 WHERE batch_id = ?",
+                             (job.batch_id,))
+        return True
+
+    def defer(self,
+              job_id: int,
+              not_before: float,
+              batch_id: Optional[str] = None,
+              phone_prefix: Optional[str] = None) -> int:
+        """
+        Put a claimed job back to 'pending' until `not_before` without
+        counting an attempt (e.g. its send window is closed). With
+        `batch_id` and `phone_prefix`, the batch's other pending jobs to
+        numbers with that prefix ("" for all of them) that would be due
+        earlier are deferred in the same transaction. Returns the number
+        of jobs deferred (0 if this process no longer holds the claim).
+        """
+        with self._write() as conn:
+            count = conn.execute(
+                "UPDATE jobs SET status = 'pending', not_before = ?, claimed_at = NULL, "
+                "claimed_by = NULL, lease_until = NULL "
+                "WHERE id = ? AND status = 'claimed' AND claimed_by = ?",
+                (not_before, job_id, self.owner)).rowcount
+            if not count:
+                return 0
+            if batch_id is not None and phone_prefix is not None:
+                count += conn.execute(
+                    "UPDATE jobs SET not_before = ? WHERE batch_id = ? "
+                    "AND status = 'pending' AND substr(phone, 1, ?) = ? "
+                    "AND (not_before IS NULL OR not_before < ?)",
+                    (not_before, batch_id, len(phone_prefix), phone_prefix,
+                     not_before)).rowcount
+        return count
+
+    def release_expired(self) -> Dict[str, int]:
+        """
+        Return claimed jobs whose lease ran out (their process died or
+        hung) to 'pending'. Returns the number released per api_key.
+        """
+        now = time.time()
+        with self._write() as conn:
+            released = dict(conn.execute(
+                "SELECT api_key, COUNT(*) FROM jobs WHERE status = 'claimed' "
+                "AND (lease_until IS NULL OR lease_until < ?) GROUP BY api_key",
+                (now,)).fetchall())
+            if released:
+                conn.execute(
+                    "UPDATE jobs SET status = 'pending', claimed_at = NULL, claimed_by = NULL, "
+                    "lease_until = NULL WHERE status = 'claimed' "
+                    "AND (lease_until IS NULL OR lease_until < ?)", (now,))
+        return released
+
+    def pending_by_key(self) -> Dict[str, int]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT api_key, COUNT(*) FROM jobs WHERE status = 'pending' "
+                "GROUP BY api_key").fetchall()
+        return dict(rows)
+
+    # ------------------------------------------------------------------
+    # Sender lanes
+    # ------------------------------------------------------------------
+    def lease_lane(self, api_key: str, ttl: float) -> Tuple[bool, float]:
+        """
+        Take or renew this process's lease on the lane of `api_key` for
+        `ttl` seconds. Returns (held, lease_until); when another process
+        holds the lane, `lease_until` is when its lease runs out.
+        """
+        now = time.time()
+        with self._write() as conn:
+            conn.execute(
+                "INSERT INTO lanes (api_key, owner, lease_until) VALUES (?, ?, ?) "
+                "ON CONFLICT (api_key) DO UPDATE SET owner = excluded.owner, "
+                "lease_until = excluded.lease_until "
+                "WHERE lanes.owner IS NULL OR lanes.owner = excluded.owner "
+                "OR lanes.lease_until < ?",
+                (api_key, self.owner, now + ttl, now))
+            owner, lease_until = conn.execute(
+                "SELECT owner, lease_until FROM lanes WHERE api_key = ?",
+                (api_key,)).fetchone()
+        return owner == self.owner, lease_until
+
+    def release_lane(self, api_key: str):
+        """Give up this process's lease on the lane of `api_key`, if held."""
+        with self._write() as conn:
+            conn.execute(
+                "UPDATE lanes SET owner = NULL, lease_until = NULL "
+                "WHERE api_key = ? AND owner = ?", (api_key, self.owner))
+
+    def notified_lanes(self, after: Optional[int] = None) -> Tuple[List[str], int]:
+        """
+        Senders that got new jobs since notify sequence `after` (None: just
+        return the current sequence), and the sequence to pass next time.
+        """
+        with self._lock:
+            if after is None:
+                row = self._conn.execute(
+                    "SELECT COALESCE(MAX(notify_seq), 0) FROM lanes").fetchone()
+                return [], row[0]
+            rows = self._conn.execute(
+                "SELECT api_key, notify_seq FROM lanes WHERE notify_seq > ?",
+                (after,)).fetchall()
+        return [key for key, _ in rows], max((seq for _, seq in rows), default=after)
+
+    def orphaned_lanes(self) -> List[str]:
+        """Senders with pending jobs whose lane no process holds."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT api_key FROM lanes WHERE (owner IS NULL OR lease_until < ?) "
+                "AND EXISTS (SELECT 1 FROM jobs WHERE jobs.api_key = lanes.api_key "
+                "AND jobs.status = 'pending')", (time.time(),)).fetchall()
+        return [key for key, in rows]
+
+    # ------------------------------------------------------------------
+    # Batches
+    # ------------------------------------------------------------------
+    def create_batch(self, batch: Dict[str, Any]):
+        """Insert a new batch row (`total` / `pending` usually start at 0)."""
+        columns = [c for c in _BATCH_COLUMNS if c in batch]
+        with self._write() as conn:
+            conn.execute(
+                f"INSERT INTO batches ({', '.join(columns)}) "
+                f"VALUES ({', '.join('?' * len(columns))})",
+                tuple(batch[c] for c in columns))
+
+    def update_batch(self, batch_id: str, **changes: Any):
+        """Set non-counter columns of a batch (status, completed_at, ETA)."""
+        unknown = set(changes) - _BATCH_SETTABLE
+        if unknown:
+            raise ValueError(f"Can't set batch columns {sorted(unknown)}")
+        assignments = ", ".join(f"{column} = ?" for column in changes)
+        with self._write() as conn:
+            conn.execute(f"UPDATE batches SET {assignments} WHERE batch_id = ?",
+                         (*changes.values(), batch_id))
+
+    def finish_ingest(self, batch_id: str, completed_at: str, **changes: Any):
+        """
+        Mark a fully enqueued batch 'queued', or 'completed' if its jobs
+        were all sent already; in one statement, so a concurrent ack can't
+        be missed.
+        """
+        unknown = set(changes) - _BATCH_SETTABLE
+        if unknown:
+            raise ValueError(f"Can't set batch columns {sorted(unknown)}")
+        assignments = "".join(f", {column} = ?" for column in changes)
+        with self._write() as conn:
+            conn.execute(
+                "UPDATE batches SET "
+                "status = CASE WHEN pending <= 0 THEN 'completed' ELSE 'queued' END, "
+                "completed_at = CASE WHEN pending <= 0 THEN ? ELSE completed_at END"
+                f"{assignments} WHERE batch_id = ?",
+                (completed_at, *changes.values(), batch_id))
+
+    def record_outcome(self, batch_id: str, outcome: Outcome):
+        """Count the outcome of a recipient that isn't a queued job (email)."""
+        with self._write() as conn:
+            self._add_outcome(conn, batch_id, outcome.recipient, outcome.name,
+                              outcome.status, outcome.error)
+
+    def _add_outcome(self, conn: sqlite3.Connection, batch_id: str, recipient: str,
+                     name: str, status: Status, error: Optional[str]) -> bool:
+        counter = "sent" if status is Status.SENT else "failed"
+        conn.execute(
+            f"UPDATE batches SET {counter} = {counter} + 1, pending = pending - 1 "
+            "WHERE batch_id = ?", (batch_id,))
+        conn.execute(
+            "INSERT INTO outcomes (batch_id, seq, recipient, name, status, error) "
+            "SELECT ?, COALESCE(MAX(seq), 0) + 1, ?, ?, ?, ? FROM outcomes WHERE batch_id = ?",
+            (batch_id, recipient, name, int(status), error, batch_id))
+        # A batch still ingesting (or an email batch) is completed by its owner
+        return conn.execute(
+            "UPDATE batches SET status = 'completed', completed_at = ? "
+            "WHERE batch_id = ? AND status = 'queued' AND pending <= 0",
+            (datetime.now(timezone.utc).isoformat(), batch_id)).rowcount == 1
+
+    def get_batch(self, batch_id: str) -> Optional[Dict[str, Any]]:
+        """Counters of a batch plus `details_count`, or None if unknown."""
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT {', '.join(_BATCH_COLUMNS)} FROM batches WHERE batch_id = ?",
+                (batch_id,)).fetchone()
+            if row is None:
+                return self.archive.get_batch(batch_id)
+            batch = dict(zip(_BATCH_COLUMNS, row))
+            batch["details_count"] = self._conn.execute(
+                "SELECT COALESCE(MAX(seq), 0) FROM outcomes WHERE batch_id = ?",
+                (batch_id,)).fetchone()[0]
+        return batch
+
+    def batch_details(self, batch_id: str, start: int, limit: int) -> List[Outcome]:
+        """
+        Up to `limit` outcomes of a batch after the first `start`, in the
+        order they were recorded (the list only ever grows at the end).
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT channel FROM batches WHERE batch_id = ?", (batch_id,)).fetchone()
+            if row is not None:
+                channel = row[0]
+                rows = self._outcome_rows(batch_id, start, limit)
+        if row is None:
+            archived = self.archive.get_batch(batch_id)
+            if archived is None:
+                return []
+            channel = archived["channel"]
+            rows = self.archive.details(batch_id, start, limit)
+        record = _OUTCOME_TYPES.get(channel, Outcome)
+        return [record(recipient, name, Status(status), error)
+                for recipient, name, status, error in rows]
+
+    def _outcome_rows(self, batch_id: str, start: int, limit: int) -> List[OutcomeRow]:
+        return self._conn.execute(
+            "SELECT recipient, name, status, error FROM outcomes "
+            "WHERE batch_id = ? AND seq > ? ORDER BY seq LIMIT ?",
+            (batch_id, start, limit)).fetchall()
+
+    def load_send_window(self, batch_id: str) -> Optional[str]:
+        """The `send_window` a batch was created with, or None."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT send_window FROM batches WHERE batch_id = ?", (batch_id,)).fetchone()
+        return row[0] if row is not None else None
+
+    def save_template(self, batch_id: str, source: str, fields: Sequence[str]):
+        """Store a batch's message template and the fields it references."""
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO templates (batch_id, source, fields) VALUES (?, ?, ?)",
+                (batch_id, source, json.dumps(list(fields), ensure_ascii=False)))
+
+    def load_template(self, batch_id: str) -> Optional[Tuple[str, List[str]]]:
+        """(source, fields) of a batch template, or None."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT source, fields FROM templates WHERE batch_id = ?",
+                (batch_id,)).fetchone()
+        return (row[0], json.loads(row[1])) if row is not None else None
+
+    def discard_batch(self, batch_id: str):
+        """
+        Delete a batch and all its jobs (failed upload). A job claimed by a
+        lane meanwhile goes too: its ack then finds no claim and is dropped.
+        """
+        with self._write() as conn:
+            for table in ("jobs", "batches", "outcomes", "templates", "recipients"):
+                conn.execute(f"DELETE FROM {table} WHERE batch_id = ?", (batch_id,))
+
+    # ------------------------------------------------------------------
+    # Recipient dedupe / suppression
+    # ------------------------------------------------------------------
+    def reserve_recipients(self,
+                           api_key: str,
+                           batch_id: str,
+                           phones: Sequence[str],
+                           window: float) -> List[Optional[str]]:
+        """
+        Reserve `phones` (normalized) for `batch_id` of `api_key` for
+        `window` seconds. Returns, per phone, None if it was reserved (to be
+        enqueued) or why it is dropped: DROP_SUPPRESSED (on the key's
+        suppression list), DROP_DUPLICATE (earlier in this batch) or
+        DROP_RECENT (reserved by another batch of the key within its
+        window, or by one not finished yet). Drops are counted on the
+        batch in the same transaction.
+        """
+        now = time.time()
+        reasons: List[Optional[str]] = []
+        reserved = []
+        with self._write() as conn:
+            unique = list(dict.fromkeys(phones))
+            suppressed = set(self._lookup(
+                "SELECT phone FROM suppressions WHERE api_key = ? AND phone IN ({})",
+                api_key, unique))
+            holders = dict(self._lookup(
+                "SELECT phone, batch_id FROM recipients WHERE api_key = ? "
+                "AND phone IN ({}) AND (batch_id = ? OR expires_at > ? OR batch_id IN "
+                "(SELECT batch_id FROM batches WHERE status NOT IN (?, ?)))",
+                api_key, unique, batch_id, now, *_FINISHED))
+            for phone in phones:
+                if phone in suppressed:
+                    reasons.append(DROP_SUPPRESSED)
+                    continue
+                holder = holders.get(phone)
+                if holder is not None:
+                    reasons.append(DROP_DUPLICATE if holder == batch_id else DROP_RECENT)
+                    continue
+                holders[phone] = batch_id
+                reserved.append((api_key, phone, batch_id, now + window))
+                reasons.append(None)
+            conn.executemany(
+                "INSERT INTO recipients (api_key, phone, batch_id, expires_at) "
+                "VALUES (?, ?, ?, ?) ON CONFLICT (api_key, phone) DO UPDATE SET "
+                "batch_id = excluded.batch_id, expires_at = excluded.expires_at",
+                reserved)
+            conn.execute(
+                "UPDATE batches SET duplicates = duplicates + ?, "
+                "recently_sent = recently_sent + ?, suppressed = suppressed + ? "
+                "WHERE batch_id = ?",
+                (reasons.count(DROP_DUPLICATE), reasons.count(DROP_RECENT),
+                 reasons.count(DROP_SUPPRESSED), batch_id))
+        return reasons
+
+    def _lookup(self, query: str, api_key: str, phones: List[str], *params: Any) -> List[Any]:
+        """Run `query` (one `{}` for the phone placeholders) in chunks."""
+        rows = []
+        for i in range(0, len(phones), _LOOKUP_CHUNK):
+            chunk = phones[i:i + _LOOKUP_CHUNK]
+            rows.extend(self._conn.execute(
+                query.format(", ".join("?" * len(chunk))),
+                (api_key, *chunk, *params)).fetchall())
+        return [row[0] if len(row) == 1 else row for row in rows]
+
+    def expire_recipients(self) -> int:
+        """
+        Forget reservations whose dedupe window has passed, except those of
+        batches still ingesting or sending (paused by a send window, a
+        start time or throttling, a batch can outlast its window).
+        """
+        with self._write() as conn:
+            return conn.execute("DELETE FROM recipients WHERE expires_at <= ? "
+                                "AND batch_id NOT IN (SELECT batch_id FROM batches "
+                                "WHERE status NOT IN (?, ?))",
+                                (time.time(), *_FINISHED)).rowcount
+
+    def suppress(self, api_key: str, phones: Iterable[str], reason: Optional[str] = None) -> int:
+        """Add numbers to the suppression list of `api_key`."""
+        now = time.time()
+        with self._write() as conn:
+            return conn.executemany(
+                "INSERT INTO suppressions (api_key, phone, reason, created_at) "
+                "VALUES (?, ?, ?, ?) ON CONFLICT (api_key, phone) DO UPDATE SET "
+                "reason = excluded.reason",
+                [(api_key, phone, reason, now) for phone in phones]).rowcount
+
+    def unsuppress(self, api_key: str, phones: Iterable[str]) -> int:
+        """Remove numbers from the suppression list of `api_key`."""
+        with self._write() as conn:
+            return conn.executemany(
+                "DELETE FROM suppressions WHERE api_key = ? AND phone = ?",
+                [(api_key, phone) for phone in phones]).rowcount
+
+    def suppression_count(self, api_key: str) -> int:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM suppressions WHERE api_key = ?", (api_key,)).fetchone()[0]
+
+    def archive_completed(self, older_than: float) -> int:
+        """
+        Move batches finished more than `older_than` seconds ago to the
+        archive and delete their rows (batch, outcomes, template, finished
+        jobs). Batches still queued or ingesting are never touched.
+        Returns the number of batches archived.
+        """
+        cutoff = datetime.fromtimestamp(time.time() - older_than, timezone.utc).isoformat()
+        with self._lock:
+            batch_ids = [batch_id for batch_id, in self._conn.execute(
+                "SELECT batch_id FROM batches WHERE status IN (?, ?) AND completed_at < ?",
+                (*_FINISHED, cutoff))]
+        archived = 0
+        for batch_id in batch_ids:
+            batch = self.get_batch(batch_id)
+            if batch is None or batch["status"] not in _FINISHED:
+                continue
+            # Outcomes of a finished batch don't change; page through them
+            # so neither memory nor the connection lock scale with its size
+            self.archive.write(batch, self._iter_outcomes(batch_id))
+            with self._write() as conn:
+                if not conn.execute(
+                        "DELETE FROM batches WHERE batch_id = ? AND status IN (?, ?)",
+                        (batch_id, *_FINISHED)).rowcount:
+                    continue  # archived by another process meanwhile
+                for table in ("outcomes", "templates"):
+                    conn.execute(f"DELETE FROM {table} WHERE batch_id = ?", (batch_id,))
+                conn.execute("DELETE FROM jobs WHERE batch_id = ? AND status IN ('sent', 'failed')",
+                             (batch_id,))
+            archived += 1
+        return archived
+
+    def _iter_outcomes(self, batch_id: str) -> Iterator[OutcomeRow]:
+        start = 0
+        while True:
+            with self._lock:
+                rows = self._outcome_rows(batch_id, start, _ARCHIVE_PAGE)
+            yield from rows
+            if len(rows) < _ARCHIVE_PAGE:
+                return
+            start += len(rows)
+
+
+def _statements(script: str) -> List[str]:
+    """Split a schema script into statements, to run inside a transaction."""
+    return [s.strip() for s in script.split(";\n") if s.strip()]
+
+
+def _dump_fields(values: Optional[Dict[str, Any]]) -> Optional[str]:
+    if values is None:
+        return None
+    return json.dumps(values, ensure_ascii=False, separators=(",", ":"))
@@ -0,0 +1,86 @@
+"""
+Structured, leveled logging.
+
+All modules log through `get_logger(name)`; records are printed as a single
+line with key=value fields appended, e.g.
+
+    2026-01-01 12:00:00 INFO whatsapp.bulk Batch queued | batch=ab12 total=300
+
+The level comes from the LOG_LEVEL environment variable (default INFO).
+Per-row details are logged at DEBUG, so hot loops should guard them with
+`logger.isEnabledFor(logging.DEBUG)`.
+"""
+
+import logging
+import os
+import sys
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+LOGGER_PREFIX = "whatsapp"
+
+
+class KeyValueFormatter(logging.Formatter):
+    """Appends the record's `fields` (passed via extra=) as key=value pairs."""
+
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s %(name)s %(message)s",
+                         datefmt="%Y-%m-%d %H:%M:%S")
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        fields: Optional[Dict[str, Any]] = getattr(record, "fields", None)
+        if fields:
+            line += " | " + " ".join(f"{k}={v}" for k, v in fields.items())
+        return line
+
+
+def setup_logging(level: Optional[str] = None):
+    """Configure the `whatsapp.*` loggers once (idempotent)."""
+    root = logging.getLogger(LOGGER_PREFIX)
+    if getattr(root, "_configured", False):
+        return
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(KeyValueFormatter())
+    root.addHandler(handler)
+    root.setLevel((level or os.getenv("LOG_LEVEL", "INFO")).upper())
+    root.propagate = False
+    root._configured = True
+
+
+def get_logger(name: str) -> logging.Logger:
+    return logging.getLogger(f"{LOGGER_PREFIX}.{name}")
+
+
+def fields(**kwargs) -> Dict[str, Any]:
+    """Shorthand for `extra=` so call sites read `logger.info(msg, **fields(...))`."""
+    return {"extra": {"fields": kwargs}}
+
+
+@dataclass
+class IngestStats:
+    """Per-upload row counters, logged as one summary per enqueued batch."""
+    valid: int = 0
+    invalid: int = 0
+    skipped: int = 0
+    errors: int = 0
+    # Valid rows dropped before enqueueing (messaging.store DROP_*)
+    duplicates: int = 0
+    recently_sent: int = 0
+    suppressed: int = 0
+
+    @property
+    def rows(self) -> int:
+        return (self.valid + self.invalid + self.skipped + self.errors
+                + self.duplicates + self.recently_sent + self.suppressed)
+
+    def as_dict(self) -> Dict[str, int]:
+        return {
+            "valid": self.valid,
+            "invalid": self.invalid,
+            "skipped": self.skipped,
+            "errors": self.errors,
+            "duplicates": self.duplicates,
+            "recently_sent": self.recently_sent,
+            "suppressed": self.suppressed,
+        }
@@ -0,0 +1,134 @@
+"""
+Bulk email delivery over a pool of authenticated SMTP connections.
+
+smtplib is blocking, so every SMTP call runs in a worker thread and the
+event loop (WhatsApp lanes, other requests) never waits on the mail server.
+Connections are logged in once and reused for many messages instead of one
+handshake + STARTTLS + login per email.
+
+SMTP credentials only live in the pool object for the duration of the
+batch; they are never written to the job store or to logs.
+"""
+
+import asyncio
+import queue
+import smtplib
+from email.mime.multipart import MIMEMultipart
+from typing import Any, Awaitable, Callable, Iterable, Optional, Tuple
+
+from whatsapp_client_python import RateLimiter
+
+SMTP_TIMEOUT = 30.0  # seconds
+
+# Server-side rejections of one message; the connection is still usable
+_MESSAGE_ERRORS = (
+    smtplib.SMTPRecipientsRefused,
+    smtplib.SMTPSenderRefused,
+    smtplib.SMTPDataError,
+)
+
+
+class SMTPPool:
+    """
+    Reusable STARTTLS + login connections to one SMTP server.
+
+    Connections are opened on demand and handed back after each send, so
+    the pool grows to the number of concurrent senders and no further.
+    All methods block; call them through asyncio.to_thread.
+    """
+
+    def __init__(self,
+                 host: str,
+                 port: int,
+                 username: str,
+                 password: str,
+                 timeout: float = SMTP_TIMEOUT):
+        self.host = host
+        self.port = port
+        self.username = username
+        self._password = password
+        self.timeout = timeout
+        self._idle: "queue.LifoQueue[smtplib.SMTP]" = queue.LifoQueue()
+
+    def _connect(self) -> smtplib.SMTP:
+        server = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        try:
+            server.starttls()
+            server.login(self.username, self._password)
+        except BaseException:
+            server.close()
+            raise
+        return server
+
+    def open(self):
+        """Open and log in one connection up front (raises on bad credentials)."""
+        self._idle.put(self._connect())
+
+    def send(self, message: MIMEMultipart):
+        for attempt in range(2):
+            if attempt == 0:
+                try:
+                    server = self._idle.get_nowait()
+                except queue.Empty:
+                    server = self._connect()
+            else:
+                server = self._connect()
+            try:
+                server.send_message(message)
+            except smtplib.SMTPServerDisconnected:
+                # Idle connection dropped by the server: retry once on a fresh one
+                server.close()
+                if attempt:
+                    raise
+                continue
+            except _MESSAGE_ERRORS:
+                self._idle.put(server)
+                raise
+            except BaseException:
+                server.close()
+                raise
+            self._idle.put(server)
+            return
+
+    def close(self):
+        while True:
+            try:
+                server = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                server.quit()
+            except (smtplib.SMTPException, OSError):
+                server.close()
+
+
+ResultCallback = Callable[[Any, bool, Optional[str]], Awaitable[None]]
+
+
+async def send_all(pool: SMTPPool,
+                   messages: Iterable[Tuple[Any, MIMEMultipart]],
+                   on_result: ResultCallback,
+                   concurrency: int = 3,
+                   rate: float = 1.0):
+    """
+    Send (tag, message) pairs with `concurrency` parallel SMTP connections,
+    at most `rate` messages per second overall (0 = no limit).
+    `on_result(tag, success, error)` is awaited on the event loop after
+    each message (it should hand blocking writes to a worker thread).
+    """
+    limiter = RateLimiter(rate) if rate > 0 else None
+    pending = iter(messages)
+
+    async def worker():
+        # Workers share one iterator; each next() runs on the loop thread
+        for tag, message in pending:
+            if limiter is not None:
+                await limiter.acquire()
+            try:
+                await asyncio.to_thread(pool.send, message)
+            except Exception as e:
+                await on_result(tag, False, str(e))
+            else:
+                await on_result(tag, True, None)
+
+    await asyncio.gather(*(worker() for _ in range(max(1, concurrency))))
@@ -0,0 +1,236 @@
+"""
+Phone number normalization and validation.
+
+One module for every entry point: `normalize_numbers` takes a whole column
+of raw numbers and returns E.164 numbers plus a per-row rejection reason,
+using pandas vectorized string operations; `normalize_number` is the scalar
+wrapper for single sends.
+
+Numbers are matched against CountryRule entries:
+  * "+<cc>..." / "00<cc>..."  -> international, must match a known rule
+  * "<cc>..." with the exact international length -> that rule
+  * anything else -> national number of the default country
+    (trunk prefix such as the leading 0 of "055..." is dropped)
+
+With allow_unknown=True, international numbers of countries without a rule
+("+44...", "0044...", or bare "44..." that isn't a national number) are
+accepted if they have a plausible E.164 length.
+"""
+
+from dataclasses import dataclass
+from typing import Dict, Iterable, Optional, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+# Rejection reasons (None means the number is valid)
+REJECT_EMPTY = "empty"
+REJECT_NON_NUMERIC = "non_numeric"
+REJECT_LENGTH = "invalid_length"
+REJECT_COUNTRY = "unsupported_country"
+
+# Maps Arabic-Indic / Eastern Arabic-Indic digits to ASCII and deletes the
+# separators people type inside numbers, in one str.translate() pass.
+_CLEAN_TABLE = str.maketrans(
+    "٠١٢٣٤٥٦٧٨٩۰۱۲۳۴۵۶۷۸۹",
+    "01234567890123456789",
+    " \t\n\r\u00a0\u200e\u200f-.()/",
+)
+
+# Arrow-backed strings run the .str operations below as compiled kernels
+# over the whole column; without pyarrow pandas falls back to object dtype
+# (same results, per-element Python calls).
+try:
+    import pyarrow
+    import pyarrow.compute
+    _STRING_DTYPE = pd.ArrowDtype(pyarrow.string())
+except ImportError:
+    _STRING_DTYPE = object
+
+
+@dataclass(frozen=True)
+class CountryRule:
+    """Numbering rule for one country."""
+    country_code: str       # e.g. "966"
+    national_length: int    # digits after the country code
+    trunk_prefix: str = "0"  # dropped from national numbers ("055..." -> "55...")
+    name: str = ""
+    timezone: str = "UTC"   # IANA zone of the recipients, for send windows
+
+    @property
+    def international_length(self) -> int:
+        return len(self.country_code) + self.national_length
+
+
+COUNTRY_RULES: Dict[str, CountryRule] = {
+    rule.country_code: rule for rule in (
+        CountryRule("966", 9, "0", "Saudi Arabia", "Asia/Riyadh"),
+        CountryRule("971", 9, "0", "United Arab Emirates", "Asia/Dubai"),
+        CountryRule("965", 8, "", "Kuwait", "Asia/Kuwait"),
+        CountryRule("974", 8, "", "Qatar", "Asia/Qatar"),
+        CountryRule("973", 8, "", "Bahrain", "Asia/Bahrain"),
+        CountryRule("968", 8, "", "Oman", "Asia/Muscat"),
+        CountryRule("20", 10, "0", "Egypt", "Africa/Cairo"),
+        CountryRule("216", 8, "", "Tunisia", "Africa/Tunis"),
+    )
+}
+
+DEFAULT_COUNTRY_CODE = "966"
+
+# E.164 allows at most 15 digits; used for numbers outside COUNTRY_RULES
+# when the caller opts in with allow_unknown=True.
+_E164_MIN_DIGITS = 8
+_E164_MAX_DIGITS = 15
+
+
+def normalize_numbers(
+    raw: Union[pd.Series, Iterable[Optional[str]]],
+    default_country: str = DEFAULT_COUNTRY_CODE,
+    rules: Optional[Dict[str, CountryRule]] = None,
+    allow_unknown: bool = False,
+) -> pd.DataFrame:
+    """
+    Normalize a column of raw phone numbers.
+
+    Args:
+        raw: Raw numbers (None/NaN allowed)
+        default_country: Country code used for national numbers
+        rules: Country rules by country code (defaults to COUNTRY_RULES)
+        allow_unknown: Accept international numbers of countries without a
+            rule if they have a plausible E.164 length, with or without
+            their +/00 prefix
+
+    Returns:
+        DataFrame aligned with the input, with columns
+        `e164` ("+966551234567" or None) and `reason` (None or REJECT_*).
+    """
+    rules = COUNTRY_RULES if rules is None else rules
+    if default_country not in rules:
+        raise ValueError(f"No country rule for default country {default_country!r}")
+
+    s = _as_strings(raw)
+
+    # Spaces and dashes are by far the most common separators: strip them
+    # with literal replaces, then clean the few rows that still contain
+    # something other than digits and '+' (brackets, Arabic-Indic digits).
+    s = s.str.replace(" ", "", regex=False).str.replace("-", "", regex=False)
+    dirty = _needs_cleaning(s)
+    if dirty.any():
+        cleaned = s[dirty].astype(object).str.translate(_CLEAN_TABLE)
+        s = s.where(~dirty, cleaned.astype(s.dtype))
+
+    has_plus = s.str.startswith("+").astype(bool)
+    digits = s.str.lstrip("+")
+    has_00 = digits.str.startswith("00").astype(bool)
+    if has_00.any():
+        digits = digits.where(~has_00, digits.str.slice(2))
+    international = has_plus | has_00
+    length = digits.str.len().astype("int64")
+
+    empty = length == 0
+    numeric = digits.str.isdigit().fillna(False).astype(bool)
+    open_ = numeric.copy()
+    accepted = pd.Series(False, index=s.index)
+
+    reason = np.full(len(s), None, dtype=object)
+    reason[empty.to_numpy()] = REJECT_EMPTY
+    reason[(~empty & ~numeric).to_numpy()] = REJECT_NON_NUMERIC
+
+    # Already in international form (with or without +/00): match the
+    # country code prefix, longest codes first.
+    known_cc = pd.Series(False, index=s.index)
+    for cc_len in sorted({len(cc) for cc in rules}, reverse=True):
+        prefix = digits.str.slice(0, cc_len)
+        for cc, rule in rules.items():
+            if len(cc) != cc_len:
+                continue
+            starts = open_ & (prefix == cc).astype(bool)
+            known_cc |= starts
+            match = starts & (length == rule.international_length)
+            accepted |= match
+            open_ &= ~match
+    e164_digits = digits.where(accepted, None)
+
+    # Explicitly international but no rule matched
+    intl_left = open_ & international
+    if allow_unknown:
+        plausible = intl_left & length.between(_E164_MIN_DIGITS, _E164_MAX_DIGITS)
+        e164_digits = e164_digits.where(~plausible, digits)
+        intl_left &= ~plausible
+    reason[(intl_left & known_cc).to_numpy()] = REJECT_LENGTH
+    reason[(intl_left & ~known_cc).to_numpy()] = REJECT_COUNTRY
+    open_ &= ~international
+
+    # National numbers of the default country
+    default_rule = rules[default_country]
+    trunk = default_rule.trunk_prefix
+    national = digits
+    if trunk:
+        has_trunk = digits.str.startswith(trunk).astype(bool)
+        national = digits.where(~has_trunk, digits.str.slice(len(trunk)))
+    ok = open_ & (national.str.len() == default_rule.national_length).astype(bool)
+    e164_digits = e164_digits.where(~ok, default_rule.country_code + national)
+    open_ &= ~ok
+
+    # Bare international digits ("447911123456") of a country without a
+    # rule; a known country code of the wrong length stays a typo
+    if allow_unknown:
+        bare = (open_ & ~known_cc & ~digits.str.startswith("0").astype(bool)
+                & length.between(_E164_MIN_DIGITS, _E164_MAX_DIGITS))
+        e164_digits = e164_digits.where(~bare, digits)
+        open_ &= ~bare
+    reason[open_.to_numpy()] = REJECT_LENGTH
+
+    e164 = ("+" + e164_digits).to_numpy(dtype=object, na_value=None)
+    return pd.DataFrame({"e164": e164, "reason": reason}, index=s.index)
+
+
+def _needs_cleaning(s: pd.Series) -> pd.Series:
+    """Rows containing anything besides ASCII digits (after a leading '+')."""
+    body = s.str.lstrip("+")
+    ok = body.str.isdigit().fillna(False).astype(bool) | (body.str.len() == 0)
+    if _STRING_DTYPE is not object:
+        # utf8_is_digit also accepts Arabic-Indic digits; those need cleaning too
+        ascii_ = pyarrow.compute.string_is_ascii(s.array.__arrow_array__())
+        ok &= ascii_.to_numpy(zero_copy_only=False)
+        return ~ok
+    return ~ok | s.str.contains(r"[^\x00-\x7f]", regex=True)
+
+
+def _as_strings(raw: Union[pd.Series, Iterable[Optional[str]]]) -> pd.Series:
+    """Raw column as a string Series with missing values as ''."""
+    if isinstance(raw, pd.Series):
+        return raw.fillna("").astype(str).astype(_STRING_DTYPE)
+    values = list(raw)
+    if _STRING_DTYPE is not object:
+        try:
+            array = pyarrow.array(values, type=pyarrow.string(), from_pandas=True)
+            return pd.Series(array, dtype=_STRING_DTYPE).fillna("")
+        except (pyarrow.ArrowInvalid, pyarrow.ArrowTypeError):
+            pass  # non-string values (e.g. ints): go through astype(str)
+    return pd.Series(values, dtype=object).fillna("").astype(str).astype(_STRING_DTYPE)
+
+
+def normalize_number(
+    raw: Optional[str],
+    default_country: str = DEFAULT_COUNTRY_CODE,
+    rules: Optional[Dict[str, CountryRule]] = None,
+    allow_unknown: bool = False,
+) -> Tuple[Optional[str], Optional[str]]:
+    """Scalar wrapper around normalize_numbers: returns (e164, reason)."""
+    row = normalize_numbers([raw], default_country, rules, allow_unknown).iloc[0]
+    return row["e164"], row["reason"]
+
+
+def rule_for_number(
+    e164: str,
+    rules: Optional[Dict[str, CountryRule]] = None,
+) -> Optional[CountryRule]:
+    """Country rule of a normalized "+<cc>..." number, or None if unknown."""
+    rules = COUNTRY_RULES if rules is None else rules
+    digits = e164.lstrip("+")
+    for cc_len in (3, 2, 1):
+        rule = rules.get(digits[:cc_len])
+        if rule is not None and len(digits) == rule.international_length:
+            return rule
+    return None
@@ -0,0 +1,112 @@
+"""
+Priority classes: scheduling policy and queue-wait metrics.
+
+Every job belongs to a Priority class. Within a sender's lane each class
+has its own pacing (a fraction of the sender's adaptive interval, 0 for
+unpaced) and the lane picks among classes that are ready to send by
+weighted-fair (stride) scheduling, so a campaign never holds back an OTP
+while bulk still gets its share when both are ready.
+
+QueueWaitStats keeps a rolling sample of queue waits per class to check
+them against each class's latency target.
+"""
+
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Deque, Dict, Iterable, Mapping
+
+from .records import Priority
+
+
+@dataclass(frozen=True)
+class ClassPolicy:
+    """How one priority class is scheduled."""
+    weight: int             # share of sends when several classes are ready
+    pacing_scale: float     # fraction of the sender's paced interval (0 = unpaced)
+    latency_target: float   # queue-wait target for p95, in seconds
+
+
+DEFAULT_POLICIES: Dict[Priority, ClassPolicy] = {
+    Priority.TRANSACTIONAL: ClassPolicy(weight=8, pacing_scale=0.0, latency_target=5.0),
+    Priority.NORMAL: ClassPolicy(weight=3, pacing_scale=0.25, latency_target=15 * 60.0),
+    Priority.BULK: ClassPolicy(weight=1, pacing_scale=1.0, latency_target=7 * 24 * 3600.0),
+}
+
+
+def parse_priority(value: str) -> Priority:
+    """'bulk' / 'NORMAL' / '0' -> Priority (raises ValueError)."""
+    value = value.strip()
+    if value.isdigit():
+        return Priority(int(value))
+    try:
+        return Priority[value.upper()]
+    except KeyError:
+        raise ValueError(f"Unknown priority {value!r}") from None
+
+
+class StrideSelector:
+    """
+    Weighted-fair choice among ready classes (stride scheduling): the class
+    with the lowest pass value goes next and advances by 1/weight. A class
+    that (re)joins starts at the current minimum pass, so idle time earns
+    no burst credit.
+    """
+
+    def __init__(self, policies: Mapping[Priority, ClassPolicy]):
+        self.policies = policies
+        self._passes: Dict[Priority, float] = {}
+
+    def pick(self, ready: Iterable[Priority]) -> Priority:
+        ready = list(ready)
+        start = min((self._passes[p] for p in ready if p in self._passes), default=0.0)
+        for priority in ready:
+            self._passes.setdefault(priority, start)
+        chosen = min(ready, key=lambda p: (self._passes[p], p))
+        self._passes[chosen] += 1.0 / self.policies[chosen].weight
+        return chosen
+
+    def forget(self, priority: Priority):
+        """Drop a class that has no pending jobs anymore."""
+        self._passes.pop(priority, None)
+
+
+class QueueWaitStats:
+    """Rolling queue-wait samples (enqueue -> dispatch) per priority class."""
+
+    def __init__(self, policies: Mapping[Priority, ClassPolicy], sample_size: int = 1000):
+        self.policies = policies
+        self._samples: Dict[Priority, Deque[float]] = {
+            p: deque(maxlen=sample_size) for p in policies
+        }
+        self._counts: Dict[Priority, int] = {p: 0 for p in policies}
+
+    def record(self, priority: Priority, seconds: float):
+        self._samples[priority].append(max(0.0, seconds))
+        self._counts[priority] += 1
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        result = {}
+        for priority, samples in self._samples.items():
+            target = self.policies[priority].latency_target
+            ordered = sorted(samples)
+            entry: Dict[str, Any] = {
+                "count": self._counts[priority],
+                "target_p95": target,
+                "p50": None,
+                "p95": None,
+                "max": None,
+                "within_target": None,
+            }
+            if ordered:
+                entry.update(
+                    p50=round(_percentile(ordered, 0.50), 3),
+                    p95=round(_percentile(ordered, 0.95), 3),
+                    max=round(ordered[-1], 3),
+                    within_target=round(sum(w <= target for w in ordered) / len(ordered), 4),
+                )
+            result[priority.name.lower()] = entry
+        return result
+
+
+def _percentile(ordered, p: float) -> float:
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p))]
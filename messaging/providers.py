@@ -0,0 +1,299 @@
+"""
+WhatsApp delivery providers and the router that spreads sends over them.
+
+A Provider sends one message and classifies the outcome as a SendResult
+(see messaging.retry). Two are built in:
+
+  * WasenderProvider: wasenderapi.com, authenticated with the job's api_key
+  * SessionProvider: a Siyadah session server through
+    whatsapp_client_python.WhatsAppClient, with one session per api_key it
+    serves; api_keys without a session of their own are never routed to it
+    (a single catch-all session is only for single-tenant setups)
+
+ProviderRouter picks a provider for each send, favouring the fast ones
+(static weight / average response time), and keeps a CircuitBreaker per
+provider: after `failure_threshold` outages in a row (no response, 5xx) the
+provider is skipped for `reset_timeout` seconds, then a single trial send
+decides whether it is back. A send that fails transiently (outage or 429)
+is tried again right away on the next provider, so one provider going down
+or throttling doesn't hold up the queue. Breakers are per process.
+"""
+
+import asyncio
+import random
+import time
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Tuple
+
+import httpx
+
+from .retry import SendResult, is_retryable_status
+from .wasender import WASENDER_TIMEOUT, post_message
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class NoProviderAvailable(Exception):
+    """Every provider's breaker is open; none may be tried before `retry_at`."""
+
+    def __init__(self, retry_at: float):
+        super().__init__("no WhatsApp provider available")
+        self.retry_at = retry_at
+
+
+class Provider(ABC):
+    """One way of sending a WhatsApp message."""
+
+    name: str
+
+    @abstractmethod
+    async def send(self, api_key: str, phone: str, text: str) -> SendResult: ...
+
+    def serves(self, api_key: str) -> bool:
+        """Whether messages of `api_key` may go out through this provider."""
+        return True
+
+    async def aclose(self):
+        """Release the provider's connections."""
+
+
+class WasenderProvider(Provider):
+    """wasenderapi.com, over one long-lived httpx client."""
+
+    def __init__(self, url: str, timeout: float = WASENDER_TIMEOUT, name: str = "wasender"):
+        self.name = name
+        self.url = url
+        self.timeout = timeout
+        self._client: Optional[httpx.AsyncClient] = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient()
+        return self._client
+
+    async def send(self, api_key: str, phone: str, text: str) -> SendResult:
+        return await post_message(self.client, self.url, api_key, phone, text, self.timeout)
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+class SessionProvider(Provider):
+    """
+    A session server, through whatsapp_client_python.WhatsAppClient
+    (pooled connections, cached tokens). Each tenant sends from its own
+    WhatsApp number, so `sessions` maps an api_key to the client of its
+    session; the session has its own credentials, the api_key only picks
+    it. `client`, if given, sends for every other api_key: all tenants'
+    messages then go out from that one number, which is only right when
+    the deployment has a single tenant.
+    """
+
+    def __init__(self,
+                 client=None,
+                 name: str = "session",
+                 sessions: Optional[Mapping[str, Any]] = None):
+        self.name = name
+        self.client = client
+        self.sessions: Dict[str, Any] = dict(sessions or {})
+
+    def serves(self, api_key: str) -> bool:
+        return api_key in self.sessions or self.client is not None
+
+    async def send(self, api_key: str, phone: str, text: str) -> SendResult:
+        client = self.sessions.get(api_key, self.client)
+        if client is None:
+            return SendResult(False, f"no {self.name} session for this api_key")
+        status = await client.send_message_status(phone, text)
+        if status is None:
+            return SendResult(False, "no response from session server", retryable=True)
+        if 200 <= status < 300:
+            return SendResult(True, f"HTTP {status}", status_code=status)
+        return SendResult(False, f"HTTP {status}", retryable=is_retryable_status(status),
+                          status_code=status)
+
+    async def aclose(self):
+        clients = [*self.sessions.values(), *([self.client] if self.client else [])]
+        await asyncio.gather(*(client.close() for client in clients))
+
+
+class CircuitBreaker:
+    """
+    Closed: calls go through. Open (after `failure_threshold` failures in
+    a row): calls are refused for `reset_timeout` seconds. Half-open: one
+    trial call goes through; its success closes the breaker, its failure
+    opens it again.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 60.0):
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._trial = False
+
+    def available(self, now: float) -> bool:
+        """Whether a call could go through now (without claiming it)."""
+        if self.state == CLOSED:
+            return True
+        if self.state == OPEN:
+            return now >= self.opened_at + self.reset_timeout
+        return not self._trial
+
+    def allow(self, now: float) -> bool:
+        """Claim a call; in half-open state only one trial at a time."""
+        if not self.available(now):
+            return False
+        if self.state != CLOSED:
+            self.state = HALF_OPEN
+            self._trial = True
+        return True
+
+    def retry_at(self, now: float) -> float:
+        """Earliest time a call may be allowed again."""
+        if self.state == OPEN:
+            return self.opened_at + self.reset_timeout
+        if self.state == HALF_OPEN and self._trial:
+            return now + self.reset_timeout
+        return now
+
+    def release(self):
+        """Give back a claimed call that ended without a verdict."""
+        self._trial = False
+
+    def record_success(self):
+        self.state = CLOSED
+        self.failures = 0
+        self._trial = False
+
+    def record_failure(self, now: float):
+        self.failures += 1
+        self._trial = False
+        if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+            self.state = OPEN
+            self.opened_at = now
+
+
+class _Route:
+    """A provider with its breaker and response-time average."""
+
+    def __init__(self, provider: Provider, weight: float, breaker: CircuitBreaker):
+        self.provider = provider
+        self.weight = weight
+        self.breaker = breaker
+        self.latency: Optional[float] = None  # seconds, EWMA
+        self.sent = 0
+        self.failed = 0
+        self.failovers = 0  # sends this provider passed on to another one
+
+
+class ProviderRouter:
+    """
+    Sends through `providers`, picking each send's first choice at random
+    with probability proportional to weight / average response time, and
+    failing over to the others (best first) on transient failures.
+    """
+
+    def __init__(self,
+                 providers: Sequence[Provider],
+                 weights: Optional[Dict[str, float]] = None,
+                 failure_threshold: int = 5,
+                 reset_timeout: float = 60.0,
+                 latency_alpha: float = 0.2):
+        if not providers:
+            raise ValueError("ProviderRouter needs at least one provider")
+        weights = weights or {}
+        self.latency_alpha = latency_alpha
+        self._routes: List[_Route] = [
+            _Route(provider, weights.get(provider.name, 1.0),
+                   CircuitBreaker(failure_threshold, reset_timeout))
+            for provider in providers
+        ]
+
+    @property
+    def providers(self) -> List[Provider]:
+        return [route.provider for route in self._routes]
+
+    async def send(self, api_key: str, phone: str, text: str) -> Tuple[SendResult, str]:
+        """
+        Send one message; returns the final SendResult and the name of the
+        provider that produced it. Raises NoProviderAvailable when the
+        breaker of every provider serving `api_key` is open.
+        """
+        serving = [route for route in self._routes if route.provider.serves(api_key)]
+        if not serving:
+            return SendResult(False, "no WhatsApp provider for this api_key"), "none"
+        result, previous = None, None
+        for route in self._order(serving, time.time()):
+            if not route.breaker.allow(time.time()):
+                continue
+            if previous is not None:
+                previous.failovers += 1
+            previous = route
+            started = time.monotonic()
+            try:
+                result = await route.provider.send(api_key, phone, text)
+            except asyncio.CancelledError:
+                route.breaker.release()
+                raise
+            except Exception as e:
+                result = SendResult(False, f"{route.provider.name} error: {e}", retryable=True)
+            self._record(route, result, time.monotonic() - started)
+            if result.success or not result.retryable:
+                break
+        if previous is None:
+            now = time.time()
+            raise NoProviderAvailable(min(route.breaker.retry_at(now) for route in serving))
+        return result, previous.provider.name
+
+    def _order(self, routes: List[_Route], now: float) -> List[_Route]:
+        """Available `routes`: a weighted random first choice, then the rest best first."""
+        routes = [route for route in routes if route.breaker.available(now)]
+        if len(routes) < 2:
+            return routes
+        known = [route.latency for route in routes if route.latency is not None]
+        # Providers without samples yet count as fast as the fastest, so they get tried
+        default = min(known) if known else 1.0
+        scores = [route.weight / max(route.latency or default, 1e-3) for route in routes]
+        first = random.choices(range(len(routes)), weights=scores)[0]
+        rest = sorted((i for i in range(len(routes)) if i != first),
+                      key=lambda i: scores[i], reverse=True)
+        return [routes[first]] + [routes[i] for i in rest]
+
+    def _record(self, route: _Route, result: SendResult, elapsed: float):
+        if result.status_code is not None:
+            route.latency = (elapsed if route.latency is None else
+                             route.latency + self.latency_alpha * (elapsed - route.latency))
+        if result.success:
+            route.sent += 1
+        else:
+            route.failed += 1
+        # Outages count against the breaker; a 429 or a rejected message
+        # still means the provider is up
+        if result.retryable and not result.throttled:
+            route.breaker.record_failure(time.time())
+        else:
+            route.breaker.record_success()
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """Per-provider state: breaker, average response time, counts."""
+        return {
+            route.provider.name: {
+                "state": route.breaker.state,
+                "weight": route.weight,
+                "latency_ms": None if route.latency is None else round(route.latency * 1000, 1),
+                "sent": route.sent,
+                "failed": route.failed,
+                "failovers": route.failovers,
+            }
+            for route in self._routes
+        }
+
+    async def aclose(self):
+        await asyncio.gather(*(route.provider.aclose() for route in self._routes))
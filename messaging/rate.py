@@ -0,0 +1,98 @@
+"""
+Adaptive pacing for outbound sends.
+
+`AIMDPacer` adapts the send interval of one WhatsApp sender to how the
+provider responds. Fixed-rate limiting (SMTP, session sends) uses the
+token bucket of whatsapp_client_python, `RateLimiter`.
+"""
+
+import random
+import time
+from collections import deque
+from typing import Any, Deque, Dict
+
+
+class AIMDPacer:
+    """
+    Send interval of one sender, adapted to provider feedback with AIMD
+    (additive decrease of the interval, multiplicative increase).
+
+      * a 429, or `error_burst` transient failures in a row, multiplies the
+        interval by `increase_factor` (up to `ceiling`)
+      * every `success_window` consecutive successes shorten it by
+        `decrease_step` seconds (down to `floor`)
+
+    Each delay is drawn from [interval, interval * jitter], so sends keep
+    their irregular, human-like spacing at any rate.
+    """
+
+    def __init__(self,
+                 interval: float,
+                 floor: float,
+                 ceiling: float,
+                 jitter: float = 1.5,
+                 increase_factor: float = 2.0,
+                 decrease_step: float = 60.0,
+                 success_window: int = 10,
+                 error_burst: int = 3,
+                 history_size: int = 100):
+        self.floor = floor
+        self.ceiling = max(ceiling, floor)
+        self.interval = min(max(interval, floor), self.ceiling)
+        self.jitter = max(jitter, 1.0)
+        self.increase_factor = increase_factor
+        self.decrease_step = decrease_step
+        self.success_window = success_window
+        self.error_burst = error_burst
+        self._successes = 0
+        self._errors = 0
+        self.history: Deque[Dict[str, Any]] = deque(maxlen=history_size)
+        self._record("start")
+
+    def next_delay(self) -> float:
+        return self.interval * random.uniform(1.0, self.jitter)
+
+    def on_result(self, success: bool, throttled: bool = False, transient: bool = False):
+        """Feed the outcome of one send. Permanent failures carry no signal."""
+        if success:
+            self._errors = 0
+            self._successes += 1
+            if self._successes >= self.success_window:
+                self._successes = 0
+                if self.interval > self.floor:
+                    self.interval = max(self.floor, self.interval - self.decrease_step)
+                    self._record("relaxed")
+            return
+        if throttled:
+            self._successes = 0
+            self._errors = 0
+            self._increase("throttled")
+        elif transient:
+            self._successes = 0
+            self._errors += 1
+            if self._errors >= self.error_burst:
+                self._errors = 0
+                self._increase("errors")
+
+    def _increase(self, reason: str):
+        interval = min(self.ceiling, self.interval * self.increase_factor)
+        if interval != self.interval:
+            self.interval = interval
+            self._record(reason)
+
+    def _record(self, reason: str):
+        self.history.append({"at": time.time(), "interval": round(self.interval, 3),
+                             "reason": reason})
+
+    @property
+    def messages_per_hour(self) -> float:
+        return 3600.0 / (self.interval * (1.0 + self.jitter) / 2)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "interval": round(self.interval, 3),
+            "floor": self.floor,
+            "ceiling": self.ceiling,
+            "messages_per_hour": round(self.messages_per_hour, 2),
+            "history": list(self.history),
+        }
@@ -0,0 +1,119 @@
+"""
+Compact job and outcome records.
+
+Queued jobs and per-recipient outcomes are held by the hundred thousand, so
+they are `__slots__` classes instead of dicts: no per-instance __dict__, the
+api_key / batch_id strings shared through sys.intern, and the outcome
+status stored as a small enum instead of a display string.
+"""
+
+import sys
+from enum import IntEnum
+from typing import Any, Dict, Optional
+
+
+class Status(IntEnum):
+    """Delivery status of a job / recipient."""
+    PENDING = 0
+    CLAIMED = 1
+    SENT = 2
+    FAILED = 3
+    ERROR = 4   # the worker raised while handling the job
+
+    @property
+    def label(self) -> str:
+        """Display string used by /queue-status and the UI."""
+        return _LABELS[self]
+
+
+class Priority(IntEnum):
+    """Scheduling class of a job; lower values are more urgent."""
+    TRANSACTIONAL = 0   # OTPs, order updates: seconds
+    NORMAL = 1
+    BULK = 2            # /send-bulk campaigns: paced over days
+
+
+_LABELS = {
+    Status.PENDING: "⏳ pending",
+    Status.CLAIMED: "📤 sending",
+    Status.SENT: "✅ sent",
+    Status.FAILED: "❌ failed",
+    Status.ERROR: "❌ error",
+}
+
+
+def _intern(value: Optional[str]) -> Optional[str]:
+    return sys.intern(value) if value else value
+
+
+class Job:
+    """
+    One queued send, as claimed from the JobStore.
+
+    Bulk jobs carry `fields` (placeholder values rendered with their batch
+    template at send time); single sends carry the final `message`.
+    """
+
+    __slots__ = ("id", "api_key", "batch_id", "phone", "name", "message", "fields",
+                 "attempts", "priority", "created_at")
+
+    def __init__(self,
+                 id: int,
+                 api_key: str,
+                 batch_id: Optional[str],
+                 phone: str,
+                 name: str = "",
+                 message: str = "",
+                 fields: Optional[Dict[str, str]] = None,
+                 attempts: int = 0,
+                 priority: Priority = Priority.NORMAL,
+                 created_at: float = 0.0):
+        self.id = id
+        self.api_key = sys.intern(api_key)
+        self.batch_id = _intern(batch_id)
+        self.phone = phone
+        self.name = name
+        self.message = message
+        self.fields = fields
+        self.attempts = attempts  # sends already made (failed transiently)
+        self.priority = priority
+        self.created_at = created_at
+
+    def __repr__(self) -> str:
+        return f"Job(id={self.id}, batch_id={self.batch_id!r}, phone={self.phone!r})"
+
+
+class Outcome:
+    """Result of one recipient of a batch (an entry of batch["details"])."""
+
+    __slots__ = ("recipient", "name", "status", "error")
+
+    # Key of `recipient` in the serialized entry
+    recipient_key = "phone"
+
+    def __init__(self,
+                 recipient: str,
+                 name: str,
+                 status: Status,
+                 error: Optional[str] = None):
+        self.recipient = recipient
+        self.name = name
+        self.status = status
+        self.error = error
+
+    def as_dict(self) -> Dict[str, Any]:
+        entry = {self.recipient_key: self.recipient, "name": self.name,
+                 "status": self.status.label}
+        if self.status is not Status.SENT:
+            entry["error"] = self.error
+        return entry
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({self.recipient!r}, {self.status.name})"
+
+
+class EmailOutcome(Outcome):
+    """Outcome of one recipient of an email batch."""
+
+    __slots__ = ()
+    recipient_key = "email"
@@ -0,0 +1,78 @@
+"""
+Retry classification and backoff for provider sends.
+
+A failed send is either permanent (bad number, bad api_key, rejected
+payload) or transient (timeouts, connection errors, 429 and 5xx). Transient
+failures are not retried inline: the job goes back to the store as pending
+with a `not_before` time, and its lane picks it up again once it is due.
+"""
+
+import random
+import time
+from email.utils import parsedate_to_datetime
+from typing import NamedTuple, Optional
+
+# Statuses worth another attempt: the request may succeed later
+RETRYABLE_STATUSES = frozenset({408, 425, 429, 500, 502, 503, 504})
+
+
+class SendResult(NamedTuple):
+    """Outcome of one provider call."""
+    success: bool
+    info: str                           # "HTTP 200", or the error message
+    retryable: bool = False
+    retry_after: Optional[float] = None  # seconds, from the Retry-After header
+    status_code: Optional[int] = None    # None when no response was received
+
+    @property
+    def throttled(self) -> bool:
+        return self.status_code == 429
+
+
+def is_retryable_status(status_code: int) -> bool:
+    return status_code in RETRYABLE_STATUSES
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Retry-After header (delta-seconds or HTTP-date) in seconds from now."""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when is None:
+        return None
+    return max(0.0, when.timestamp() - time.time())
+
+
+class RetryPolicy:
+    """
+    Exponential backoff with jitter.
+
+    Attempt n (1-based) waits a random time in [d/2, d] with
+    d = min(max_delay, base_delay * 2**(n-1)), and never less than the
+    server's Retry-After. After `max_attempts` sends the job fails for good.
+    """
+
+    def __init__(self,
+                 max_attempts: int = 5,
+                 base_delay: float = 60.0,
+                 max_delay: float = 3600.0):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def should_retry(self, result: SendResult, attempts: int) -> bool:
+        """`attempts` is the number of sends already made, this one included."""
+        return result.retryable and attempts < self.max_attempts
+
+    def backoff(self, attempts: int, retry_after: Optional[float] = None) -> float:
+        ceiling = min(self.max_delay, self.base_delay * 2 ** max(0, attempts - 1))
+        delay = random.uniform(ceiling / 2, ceiling)
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        return delay
@@ -0,0 +1,349 @@
+"""
+Per-sender scheduling lanes.
+
+Every api_key (one WhatsApp sender number) gets its own lane: an asyncio
+task with its own pacing clock that claims that key's jobs, oldest first,
+from the durable JobStore. Lanes run concurrently on the event loop, so one
+tenant's campaign never waits behind another's, while each sender still
+keeps its human-like spacing.
+
+Within a lane, jobs are split by priority class (see messaging.priority):
+each class is paced on its own clock and the lane picks among the classes
+that are ready, so a transactional job never queues behind a campaign.
+
+A lane only wakes when something is due: it waits on its wakeup event
+with a timeout at the next ready time, and a sender with nothing due for
+longer than `idle_timeout` parks on a shared TimerQueue instead of
+keeping a task alive.
+
+Several processes may share one store: a lane only sends while it holds
+the sender's lease in the store (see messaging.store), and each scheduler
+polls the store for senders that got jobs from other processes and for
+jobs or lanes left behind by dead ones.
+"""
+
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, Mapping, Optional
+
+from .log import fields, get_logger
+from .priority import DEFAULT_POLICIES, ClassPolicy, QueueWaitStats, StrideSelector
+from .rate import AIMDPacer
+from .records import Job, Priority
+from .retry import SendResult
+from .store import QueueStore
+from .timers import TimerQueue
+
+logger = get_logger("lanes")
+
+# Handlers return the provider's SendResult (None when nothing was sent),
+# which drives the lane's adaptive pacing.
+JobHandler = Callable[[Job], Awaitable[Optional[SendResult]]]
+
+
+def mask_key(api_key: str) -> str:
+    """Short, non-secret label for an api_key (used in logs and stats)."""
+    return f"…{api_key[-4:]}" if len(api_key) > 4 else "…"
+
+
+class Lane:
+    """Pacing state for a single api_key."""
+
+    __slots__ = ("key", "wakeup", "task", "processed", "last_send_at",
+                 "ready_at", "selector")
+
+    def __init__(self, key: str, policies: Mapping[Priority, ClassPolicy]):
+        self.key = key
+        self.wakeup = asyncio.Event()
+        self.task: Optional[asyncio.Task] = None
+        self.processed = 0
+        self.last_send_at: Optional[float] = None
+        # Earliest next send per priority class with pending jobs
+        self.ready_at: Dict[Priority, float] = {}
+        self.selector = StrideSelector(policies)
+
+
+class LaneScheduler:
+    """
+    Runs one lane per api_key. Each lane sleeps BEFORE every send, only
+    relative to its own previous send. The delay comes from the sender's
+    AIMDPacer: it starts as a random [min_delay, max_delay] like the old
+    single worker, grows on 429s / error bursts and shrinks toward
+    `floor_delay` after sustained success (never below it, never above
+    `ceiling_delay`).
+
+    Each priority class waits `pacing_scale` times that delay between its
+    own sends (transactional: not at all); when several classes are ready
+    the lane interleaves them by `weight`. Queue waits (enqueue -> first
+    send) are recorded per class in `waits`.
+
+    Jobs are only claimed after the delay, so a job stays 'pending' in the
+    store (and survives a restart untouched) while its lane is sleeping.
+    Lanes that stay empty for `idle_timeout` seconds are torn down and
+    recreated on the next notify, so the number of tasks tracks the number
+    of active senders; lanes whose next job is further away than that park
+    until it is due (keeping their ready times, so they send when it
+    comes). A handler returning None (nothing was sent, e.g. the
+    job was deferred) doesn't use up the class's pacing delay.
+
+    A claimed job's lease is renewed while its handler runs, so a slow send
+    isn't released to another process mid-flight. A lane with due jobs
+    holds the sender's lease (`idle_timeout` plus a margin, renewed on
+    every pass); if another process holds it, the lane
+    parks until that lease runs out. Every `poll_interval` the scheduler
+    wakes lanes of senders that got jobs from other processes, and every
+    `sweep_interval` it releases expired job leases and takes over
+    orphaned senders.
+
+    Store calls run in worker threads (asyncio.to_thread), like the bulk
+    enqueues of the API: a large enqueue holding the store lock then never
+    stalls the event loop, and the lanes of other senders keep sending.
+    """
+
+    def __init__(self,
+                 store: QueueStore,
+                 min_delay: float,
+                 max_delay: float,
+                 idle_timeout: float = 300.0,
+                 floor_delay: Optional[float] = None,
+                 ceiling_delay: Optional[float] = None,
+                 policies: Optional[Mapping[Priority, ClassPolicy]] = None,
+                 waits: Optional[QueueWaitStats] = None,
+                 poll_interval: float = 1.0,
+                 sweep_interval: float = 60.0):
+        self.store = store
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.idle_timeout = idle_timeout
+        self.floor_delay = min_delay if floor_delay is None else floor_delay
+        self.ceiling_delay = 4 * max_delay if ceiling_delay is None else ceiling_delay
+        self.policies = DEFAULT_POLICIES if policies is None else policies
+        self.waits = QueueWaitStats(self.policies) if waits is None else waits
+        self.poll_interval = poll_interval
+        self.sweep_interval = sweep_interval
+        self.lane_lease = idle_timeout + 60.0
+        self.handler: Optional[JobHandler] = None
+        self._lanes: Dict[str, Lane] = {}
+        # Pacing state outlives idle lanes, so a throttled sender stays slow
+        self._pacers: Dict[str, AIMDPacer] = {}
+        # Lanes parked until their next send is due keep their per-class
+        # ready times here; recomputing them on wake-up would push the
+        # send out by a whole new delay every time
+        self._parked: Dict[str, Lane] = {}
+        self._timers: Optional[TimerQueue] = None
+        self._watcher: Optional[asyncio.Task] = None
+
+    def start(self, handler: JobHandler):
+        """
+        Attach the per-job handler and resume a lane for every api_key that
+        still has pending jobs in the store (e.g. after a restart).
+        """
+        self.handler = handler
+        for api_key in self.store.pending_by_key():
+            self.notify(api_key)
+        for lane in self._lanes.values():
+            self._ensure_task(lane)
+        self._watcher = asyncio.create_task(self._watch())
+
+    async def _watch(self):
+        """Pick up work enqueued or abandoned by other processes."""
+        _, seq = await asyncio.to_thread(self.store.notified_lanes)
+        last_sweep = time.time()
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                keys, seq = await asyncio.to_thread(self.store.notified_lanes, seq)
+                if time.time() - last_sweep >= self.sweep_interval:
+                    last_sweep = time.time()
+                    released = await asyncio.to_thread(self.store.release_expired)
+                    if released:
+                        logger.warning("Released expired job leases", **fields(
+                            jobs=sum(released.values()), lanes=len(released)))
+                    orphaned = await asyncio.to_thread(self.store.orphaned_lanes)
+                    keys = [*keys, *released, *orphaned]
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Queue watch error")
+                continue
+            for key in keys:
+                self.notify(key)
+
+    def notify(self, api_key: str):
+        """Wake (or create) the lane of `api_key` after jobs were enqueued."""
+        lane = self._lanes.get(api_key)
+        if lane is None:
+            lane = self._parked.pop(api_key, None) or Lane(api_key, self.policies)
+            self._lanes[api_key] = lane
+        lane.wakeup.set()
+        self._ensure_task(lane)
+
+    def _ensure_task(self, lane: Lane):
+        if self.handler is None:
+            return
+        if lane.task is None or lane.task.done():
+            lane.task = asyncio.create_task(self._run_lane(lane))
+
+    async def _run_lane(self, lane: Lane):
+        pacer = self.pacer(lane.key)
+        while True:
+            lane.wakeup.clear()
+            due = await asyncio.to_thread(self.store.next_due_by_class, lane.key)
+            for priority in [p for p in lane.ready_at if p not in due]:
+                del lane.ready_at[priority]
+                lane.selector.forget(priority)
+            if not due:
+                await asyncio.to_thread(self.store.release_lane, lane.key)
+                try:
+                    await asyncio.wait_for(lane.wakeup.wait(), self.idle_timeout)
+                except asyncio.TimeoutError:
+                    if not await asyncio.to_thread(self.store.has_pending, lane.key):
+                        self._lanes.pop(lane.key, None)
+                        return
+                continue
+
+            held, lease_until = await asyncio.to_thread(self.store.lease_lane,
+                                                        lane.key, self.lane_lease)
+            if not held:
+                # Another process drains this sender; check again when its
+                # lease runs out (it renews it while it has work)
+                await self._park(lane, lease_until, owned=False)
+                return
+
+            # ⏳ Each class waits its own delay BEFORE sending, to look human
+            # and avoid rate-limits; a class that just got jobs starts its
+            # clock now. Jobs waiting for a retry are not due before not_before.
+            now = time.time()
+            ready_at = {}
+            for priority, due_at in due.items():
+                if priority not in lane.ready_at:
+                    lane.ready_at[priority] = now + self._class_delay(lane, pacer, priority)
+                ready_at[priority] = max(due_at, lane.ready_at[priority])
+            ready = [p for p, at in ready_at.items() if at <= now]
+            if not ready:
+                wake_at = min(ready_at.values())
+                if wake_at - now > self.idle_timeout:
+                    await self._park(lane, wake_at)
+                    return
+                try:
+                    await asyncio.wait_for(lane.wakeup.wait(), wake_at - now)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            priority = lane.selector.pick(ready)
+            job = await asyncio.to_thread(self.store.claim_next, lane.key, priority)
+            if job is None:
+                continue
+            if job.attempts == 0:
+                self.waits.record(priority, now - job.created_at)
+            result = None
+            holder = asyncio.create_task(self._hold_claim(job))
+            try:
+                result = await self.handler(job)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Lane error", **fields(lane=mask_key(lane.key)))
+            finally:
+                holder.cancel()
+                lane.processed += 1
+                lane.last_send_at = time.time()
+            if result is None:
+                continue
+            lane.ready_at[priority] = lane.last_send_at + self._class_delay(lane, pacer, priority)
+            before = pacer.interval
+            pacer.on_result(result.success, result.throttled, result.retryable)
+            if pacer.interval != before:
+                logger.info("Lane pacing changed", **fields(
+                    lane=mask_key(lane.key), interval=f"{pacer.interval:.1f}s",
+                    previous=f"{before:.1f}s", reason=pacer.history[-1]["reason"]))
+
+    async def _hold_claim(self, job: Job):
+        """Renew the job's lease while its send is in flight."""
+        while True:
+            await asyncio.sleep(self.store.job_lease / 3)
+            if not await asyncio.to_thread(self.store.renew_claim, job):
+                logger.warning("Job lease lost mid-send", **fields(
+                    job=job.id, lane=mask_key(job.api_key)))
+                return
+
+    async def _park(self, lane: Lane, wake_at: float, owned: bool = True):
+        """End the lane's task until `wake_at` (or the next notify)."""
+        if owned:
+            await asyncio.to_thread(self.store.release_lane, lane.key)
+        if self._timers is None:
+            self._timers = TimerQueue(self.notify)
+        self._timers.schedule(lane.key, wake_at)
+        self._lanes.pop(lane.key, None)
+        self._parked[lane.key] = lane
+        logger.info("Lane parked until next job is due" if owned
+                    else "Lane held by another process", **fields(
+                        lane=mask_key(lane.key), due_in=f"{wake_at - time.time():.0f}s"))
+
+    def _class_delay(self, lane: Lane, pacer: AIMDPacer, priority: Priority) -> float:
+        scale = self.policies[priority].pacing_scale
+        if not scale:
+            return 0.0
+        delay = pacer.next_delay() * scale
+        logger.info("Lane sleeping before next send",
+                    **fields(lane=mask_key(lane.key), priority=priority.name.lower(),
+                             delay=f"{delay:.1f}s", interval=f"{pacer.interval:.1f}s"))
+        return delay
+
+    def pacer(self, api_key: str) -> AIMDPacer:
+        pacer = self._pacers.get(api_key)
+        if pacer is None:
+            pacer = self._pacers[api_key] = AIMDPacer(
+                interval=self.min_delay,
+                floor=self.floor_delay,
+                ceiling=self.ceiling_delay,
+                jitter=self.max_delay / self.min_delay if self.min_delay else 1.0,
+            )
+        return pacer
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Per-lane snapshot keyed by masked api_key, parked senders included."""
+        pending = self.store.pending_by_key()
+        lanes = {
+            mask_key(key): {
+                "pending": pending.get(key, 0),
+                "processed": lane.processed,
+                "last_send_at": lane.last_send_at,
+                "running": lane.task is not None and not lane.task.done(),
+                "interval": round(self.pacer(key).interval, 3),
+            }
+            for key, lane in self._lanes.items()
+        }
+        parked = self._timers.deadlines() if self._timers is not None else {}
+        for key, wake_at in parked.items():
+            if key not in self._lanes:
+                lanes[mask_key(key)] = {
+                    "pending": pending.get(key, 0),
+                    "processed": self._parked[key].processed if key in self._parked else 0,
+                    "running": False,
+                    "parked_until": wake_at,
+                    "interval": round(self.pacer(key).interval, 3),
+                }
+        return lanes
+
+    def rates(self) -> Dict[str, Dict[str, Any]]:
+        """Current and recent pacing of every sender, keyed by masked api_key."""
+        return {mask_key(key): pacer.snapshot() for key, pacer in self._pacers.items()}
+
+    async def close(self):
+        """
+        Cancel all lane tasks and give up their leases. Pending jobs stay
+        in the store for the next process.
+        """
+        if self._watcher is not None:
+            self._watcher.cancel()
+            await asyncio.gather(self._watcher, return_exceptions=True)
+        if self._timers is not None:
+            await self._timers.close()
+        tasks = [lane.task for lane in self._lanes.values() if lane.task]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        for key in list(self._lanes):
+            self.store.release_lane(key)
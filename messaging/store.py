@@ -0,0 +1,175 @@
+"""
+Queue / batch state backend interface.
+
+Every process of a deployment (uvicorn workers, API nodes, senders) opens
+the same backend, so batches and queued jobs are visible everywhere and
+each job is sent by exactly one process:
+
+  * jobs are leased by claim_next (renewed with renew_claim while their
+    send is in flight) and released after `job_lease` if their process
+    dies (release_expired); only the claim holder can ack them
+  * each sender's lane is leased by one process at a time (lease_lane), so
+    its pacing isn't split across processes
+  * enqueue bumps a per-sender notify sequence that other processes poll
+    (notified_lanes) to pick up new work
+  * finished batches move to cold storage (archive_completed) and stay
+    readable through get_batch / batch_details
+
+JobStore (SQLite, one file on a shared volume) is the bundled backend and
+the stand-in for tests. Other backends register a URL scheme with
+register_backend and are opened through open_store.
+"""
+
+from abc import ABC, abstractmethod
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from .records import Job, Outcome, Priority, Status
+
+# Why reserve_recipients dropped a recipient (also the batch counter names)
+DROP_DUPLICATE = "duplicates"       # earlier row of the same batch
+DROP_RECENT = "recently_sent"       # queued by another batch of the key lately
+DROP_SUPPRESSED = "suppressed"      # on the key's suppression list
+
+
+class QueueStore(ABC):
+    """Shared queue of jobs plus batch state (counters, outcomes, templates)."""
+
+    owner: str        # identity of this process in leases
+    job_lease: float  # seconds a claim lasts unless renewed
+
+    # Jobs
+    @abstractmethod
+    def enqueue_many(self, jobs: Iterable[Dict[str, Any]],
+                     batch_id: Optional[str] = None) -> int: ...
+
+    def enqueue(self, job: Dict[str, Any]) -> int:
+        return self.enqueue_many([job])
+
+    @abstractmethod
+    def has_pending(self, api_key: str) -> bool: ...
+
+    @abstractmethod
+    def next_due_by_class(self, api_key: str) -> Dict[Priority, float]: ...
+
+    @abstractmethod
+    def claim_next(self, api_key: str, priority: Priority) -> Optional[Job]: ...
+
+    @abstractmethod
+    def renew_claim(self, job: Job) -> bool: ...
+
+    @abstractmethod
+    def ack(self, job: Job, status: Status, error: Optional[str] = None) -> Optional[bool]: ...
+
+    @abstractmethod
+    def retry(self, job: Job, not_before: float, error: Optional[str] = None) -> bool: ...
+
+    @abstractmethod
+    def defer(self, job_id: int, not_before: float, batch_id: Optional[str] = None,
+              phone_prefix: Optional[str] = None) -> int: ...
+
+    @abstractmethod
+    def release_expired(self) -> Dict[str, int]: ...
+
+    @abstractmethod
+    def pending_by_key(self) -> Dict[str, int]: ...
+
+    # Sender lanes
+    @abstractmethod
+    def lease_lane(self, api_key: str, ttl: float) -> Tuple[bool, float]: ...
+
+    @abstractmethod
+    def release_lane(self, api_key: str): ...
+
+    @abstractmethod
+    def notified_lanes(self, after: Optional[int] = None) -> Tuple[List[str], int]: ...
+
+    @abstractmethod
+    def orphaned_lanes(self) -> List[str]: ...
+
+    # Batches
+    @abstractmethod
+    def create_batch(self, batch: Dict[str, Any]): ...
+
+    @abstractmethod
+    def update_batch(self, batch_id: str, **changes: Any): ...
+
+    @abstractmethod
+    def finish_ingest(self, batch_id: str, completed_at: str, **changes: Any): ...
+
+    @abstractmethod
+    def record_outcome(self, batch_id: str, outcome: Outcome): ...
+
+    @abstractmethod
+    def get_batch(self, batch_id: str) -> Optional[Dict[str, Any]]: ...
+
+    @abstractmethod
+    def batch_details(self, batch_id: str, start: int, limit: int) -> List[Outcome]: ...
+
+    @abstractmethod
+    def load_send_window(self, batch_id: str) -> Optional[str]: ...
+
+    @abstractmethod
+    def save_template(self, batch_id: str, source: str, fields: Sequence[str]): ...
+
+    @abstractmethod
+    def load_template(self, batch_id: str) -> Optional[Tuple[str, List[str]]]: ...
+
+    @abstractmethod
+    def discard_batch(self, batch_id: str): ...
+
+    @abstractmethod
+    def archive_completed(self, older_than: float) -> int: ...
+
+    # Recipient dedupe / suppression
+    @abstractmethod
+    def reserve_recipients(self, api_key: str, batch_id: str, phones: Sequence[str],
+                           window: float) -> List[Optional[str]]: ...
+
+    @abstractmethod
+    def expire_recipients(self) -> int: ...
+
+    @abstractmethod
+    def suppress(self, api_key: str, phones: Iterable[str],
+                 reason: Optional[str] = None) -> int: ...
+
+    @abstractmethod
+    def unsuppress(self, api_key: str, phones: Iterable[str]) -> int: ...
+
+    @abstractmethod
+    def suppression_count(self, api_key: str) -> int: ...
+
+    @abstractmethod
+    def close(self): ...
+
+
+# URL scheme -> factory(location, **options)
+_BACKENDS: Dict[str, Callable[..., QueueStore]] = {}
+
+
+def register_backend(scheme: str, factory: Callable[..., QueueStore]):
+    """Make `open_store("<scheme>://...")` use `factory`."""
+    _BACKENDS[scheme] = factory
+
+
+def open_store(url: str, **options: Any) -> QueueStore:
+    """
+    Open the queue backend at `url`: "sqlite:///abs/path/queue.db",
+    "sqlite://relative/queue.db", or a plain file path (SQLite).
+    """
+    scheme, sep, location = url.partition("://")
+    if not sep:
+        scheme, location = "sqlite", url
+    if scheme == "sqlite" and location.startswith("//"):
+        location = location[1:]
+    factory = _BACKENDS.get(scheme)
+    if factory is None:
+        raise ValueError(f"No queue backend for {scheme!r} (known: {sorted(_BACKENDS)})")
+    return factory(location, **options)
+
+
+def _open_sqlite(path: str, **options: Any) -> QueueStore:
+    from .job_store import JobStore
+    return JobStore(path, **options)
+
+
+register_backend("sqlite", _open_sqlite)
@@ -0,0 +1,136 @@
+"""
+Precompiled message templates for personalization.
+
+A message is parsed once into literal text and placeholders and compiled
+into a single format string, so rendering a recipient is one str.format()
+call: O(message length), no repeated full-string scans.
+
+Placeholders are written in square brackets:
+  * [الاسم]            -> the recipient's name (CSV column 'name')
+  * [التحية]           -> a random greeting from GREETINGS
+  * [الفريق]           -> a random team member name from TEAM_NAMES
+  * [<column>]         -> any other CSV column of the recipient's row
+Bracketed text that matches none of these is kept literally.
+"""
+
+import random
+import re
+from typing import Dict, Iterable, List, Mapping, Optional, Sequence, Tuple
+
+NAME_PLACEHOLDER = "الاسم"
+GREETING_PLACEHOLDER = "التحية"
+TEAM_PLACEHOLDER = "الفريق"
+
+GREETINGS: Tuple[str, ...] = (
+    "حيّاك الله",
+    "السلام عليكم و رحمة الله و بركاته",
+    "يسعد أوقاتك",
+    "تحية طيبة",
+    "يعطيك العافية",
+    "يسعد أيامك",
+    "حيّاك الله",
+    "يا هلا",
+    "أهلًا",
+    "السلام عليكم",
+)
+
+TEAM_NAMES: Tuple[str, ...] = (
+    "نور",
+    "سارة",
+    "ريم",
+    "هدى",
+    "فاطمة",
+    "مريم",
+    "جواهر",
+    "شهد",
+    "دلال",
+    "نورة",
+    "أروى",
+    "ضحى",
+    "رغد",
+    "سمية",
+    "لمى",
+    "غادة",
+    "جنان",
+    "ليان",
+    "سلمى",
+    "زينب",
+)
+
+# Random-choice pools shared by every recipient of every batch
+DEFAULT_POOLS: Dict[str, Sequence[str]] = {
+    GREETING_PLACEHOLDER: GREETINGS,
+    TEAM_PLACEHOLDER: TEAM_NAMES,
+}
+
+# Right-to-left embedding so Arabic text renders correctly in WhatsApp
+RTL_START = "\u202B"
+RTL_END = "\u202C"
+
+_PLACEHOLDER = re.compile(r"\[([^\[\]\n]+)\]")
+
+
+class MessageTemplate:
+    """
+    A message parsed once, rendered many times.
+
+    Args:
+        source: Raw message text with [placeholders]
+        columns: CSV column names that may be used as placeholders
+        pools: Random-choice pools by placeholder (defaults to DEFAULT_POOLS)
+        rtl: Wrap rendered messages in RTL embedding marks
+    """
+
+    __slots__ = ("source", "fields", "_format", "_slots")
+
+    def __init__(self,
+                 source: str,
+                 columns: Iterable[str] = (),
+                 pools: Optional[Mapping[str, Sequence[str]]] = None,
+                 rtl: bool = True):
+        self.source = source
+        pools = DEFAULT_POOLS if pools is None else pools
+        columns = set(columns) | {"name"}
+
+        # Each slot is (field_name, None) or (None, pool)
+        slots: List[Tuple[Optional[str], Optional[Sequence[str]]]] = []
+        parts: List[str] = [RTL_START] if rtl else []
+        fields: List[str] = []
+        pos = 0
+        for match in _PLACEHOLDER.finditer(source):
+            key = match.group(1).strip()
+            field = "name" if key == NAME_PLACEHOLDER else key
+            if key in pools:
+                slots.append((None, tuple(pools[key])))
+            elif field in columns:
+                slots.append((field, None))
+                if field not in fields:
+                    fields.append(field)
+            else:
+                continue  # not a placeholder: stays part of the literal text
+            parts.append(_escape(source[pos:match.start()]))
+            parts.append("{}")
+            pos = match.end()
+        parts.append(_escape(source[pos:]))
+        if rtl:
+            parts.append(RTL_END)
+
+        self._format = "".join(parts)
+        self._slots = tuple(slots)
+        self.fields: Tuple[str, ...] = tuple(fields)
+
+    def render(self,
+               values: Mapping[str, Optional[str]],
+               rng: random.Random = random) -> str:
+        """Render for one recipient; missing fields render as ''."""
+        return self._format.format(*[
+            (values.get(field) or "") if pool is None else rng.choice(pool)
+            for field, pool in self._slots
+        ])
+
+    def __repr__(self) -> str:
+        return f"MessageTemplate({self.source!r}, fields={self.fields!r})"
+
+
+def _escape(literal: str) -> str:
+    return literal.replace("{", "{{").replace("}", "}}")
@@ -0,0 +1,69 @@
+"""
+Deadline heap for parked lanes.
+
+A sender whose next job is hours or days away (a scheduled campaign, a
+closed send window) doesn't keep a lane task sleeping: the lane exits and
+leaves one (when, api_key) entry here. A single task sleeps until the
+earliest deadline and hands the key back to the scheduler. The jobs
+themselves stay in the store, ordered by the `jobs_due` index.
+"""
+
+import asyncio
+import heapq
+import itertools
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+
+class TimerQueue:
+    """
+    Calls `callback(key)` once each scheduled time has passed. A key that
+    already has an earlier (or equal) deadline isn't scheduled again.
+    """
+
+    def __init__(self, callback: Callable[[str], None]):
+        self.callback = callback
+        self._heap: List[Tuple[float, int, str]] = []
+        self._earliest: Dict[str, float] = {}
+        self._seq = itertools.count()
+        self._changed = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def schedule(self, key: str, when: float):
+        if self._earliest.get(key, float("inf")) <= when:
+            return
+        self._earliest[key] = when
+        heapq.heappush(self._heap, (when, next(self._seq), key))
+        if self._heap[0][2] == key:
+            self._changed.set()
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    def deadlines(self) -> Dict[str, float]:
+        """Earliest scheduled time per key."""
+        return dict(self._earliest)
+
+    async def _run(self):
+        while self._heap:
+            self._changed.clear()
+            when = self._heap[0][0]
+            delay = when - time.time()
+            if delay > 0:
+                try:
+                    await asyncio.wait_for(self._changed.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            when, _, key = heapq.heappop(self._heap)
+            if self._earliest.get(key) == when:
+                del self._earliest[key]
+            self.callback(key)
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
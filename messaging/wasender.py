@@ -0,0 +1,139 @@
+"""
+wasenderapi.com send endpoint.
+
+`post_message` makes one send call and classifies the result (see
+messaging.retry). `FastSender` is the high-throughput path for
+transactional single sends that skip lane pacing: one long-lived client
+with HTTP/2 (when the `h2` package is installed), a tuned connection pool,
+cached per-key headers and bounded concurrency.
+"""
+
+import asyncio
+import time
+from functools import lru_cache
+from typing import Callable, Dict, Optional
+
+import httpx
+
+from .retry import SendResult, is_retryable_status, parse_retry_after
+
+WASENDER_TIMEOUT = 30.0  # seconds
+
+try:
+    import h2  # noqa: F401  (enables httpx's HTTP/2 support)
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+
+@lru_cache(maxsize=1024)
+def auth_headers(api_key: str) -> Dict[str, str]:
+    """Request headers for `api_key`, built once per key (do not mutate)."""
+    return {
+        "Authorization": f"Bearer {api_key}",
+        "Content-Type": "application/json",
+    }
+
+
+async def post_message(http_client: httpx.AsyncClient,
+                       url: str,
+                       api_key: str,
+                       phone: str,
+                       text: str,
+                       timeout: float = WASENDER_TIMEOUT) -> SendResult:
+    """
+    Send a single WhatsApp message. On failure, `info` contains the error
+    message (HTTP status + body, or exception message) and `retryable`
+    tells a transient failure (timeout, connection error, 429, 5xx) from a
+    permanent one.
+    """
+    # The API expects E.164 format with a leading '+'. messaging.phone
+    # already produces it; jobs queued before that change may lack it.
+    to = phone if phone.startswith("+") else f"+{phone}"
+
+    try:
+        response = await http_client.post(
+            url,
+            headers=auth_headers(api_key),
+            json={"to": to, "text": text},
+            timeout=timeout,
+        )
+    except httpx.TimeoutException:
+        return SendResult(False, "request timed out", retryable=True)
+    except httpx.RequestError as e:
+        return SendResult(False, f"request error: {e}", retryable=True)
+
+    if 200 <= response.status_code < 300:
+        return SendResult(True, f"HTTP {response.status_code}", status_code=response.status_code)
+
+    # Try to extract a useful error message from the response body
+    try:
+        body = response.json()
+        err_msg = body.get("message") or body.get("error") or str(body)
+    except Exception:
+        err_msg = response.text or "<empty body>"
+
+    return SendResult(
+        False,
+        f"HTTP {response.status_code}: {err_msg}",
+        retryable=is_retryable_status(response.status_code),
+        retry_after=parse_retry_after(response.headers.get("Retry-After")),
+        status_code=response.status_code,
+    )
+
+
+class FastSender:
+    """
+    Unpaced sender for transactional messages.
+
+    Up to `concurrency` sends are in flight at once (further callers wait
+    for a slot); they share one client whose pool keeps `keepalive`
+    connections warm. Over HTTP/2 the in-flight requests are multiplexed
+    on a few connections instead of one connection each.
+
+    `on_wait`, if given, is called with the seconds each send spent
+    waiting for a slot.
+    """
+
+    def __init__(self,
+                 url: str,
+                 concurrency: int = 64,
+                 max_connections: int = 100,
+                 keepalive: int = 20,
+                 http2: bool = True,
+                 timeout: float = WASENDER_TIMEOUT,
+                 on_wait: Optional[Callable[[float], None]] = None):
+        self.url = url
+        self.timeout = timeout
+        self.http2 = http2 and HTTP2_AVAILABLE
+        self.concurrency = concurrency
+        self._slots = asyncio.Semaphore(concurrency)
+        self._client: Optional[httpx.AsyncClient] = None
+        self._limits = httpx.Limits(max_connections=max_connections,
+                                    max_keepalive_connections=keepalive,
+                                    keepalive_expiry=60.0)
+        self.on_wait = on_wait
+        self.in_flight = 0
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(http2=self.http2, limits=self._limits)
+        return self._client
+
+    async def send(self, api_key: str, phone: str, text: str) -> SendResult:
+        queued_at = time.time()
+        async with self._slots:
+            if self.on_wait is not None:
+                self.on_wait(time.time() - queued_at)
+            self.in_flight += 1
+            try:
+                return await post_message(self.client, self.url, api_key, phone, text,
+                                          self.timeout)
+            finally:
+                self.in_flight -= 1
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
@@ -0,0 +1,113 @@
+"""
+Recipient-local send windows and start times for bulk campaigns.
+
+A SendWindow is a daily time range plus the weekdays it applies to, read
+in each recipient's own time zone (from their country rule in
+messaging.phone). Jobs get a `not_before` at the next moment the window
+is open, so they wait in the store instead of going out at 3 AM.
+
+    "09:00-21:00"             every day, 9 AM to 9 PM
+    "09:00-18:00 sun-thu"     Sunday to Thursday only
+    "20:00-02:00 fri,sat"     overnight: starts Friday/Saturday evening
+"""
+
+from dataclasses import dataclass
+from datetime import datetime, time as dtime, timedelta, tzinfo
+from functools import lru_cache
+from typing import FrozenSet, Optional
+from zoneinfo import ZoneInfo
+
+from .phone import rule_for_number
+
+DAY_NAMES = ("mon", "tue", "wed", "thu", "fri", "sat", "sun")
+ALL_DAYS = frozenset(range(7))
+
+
+@dataclass(frozen=True)
+class SendWindow:
+    """Daily [start, end) local time range on the given weekdays (0 = Monday)."""
+    start: dtime
+    end: dtime
+    days: FrozenSet[int] = ALL_DAYS
+
+    @classmethod
+    def parse(cls, text: str) -> "SendWindow":
+        """'HH:MM-HH:MM [days]' -> SendWindow (raises ValueError)."""
+        hours, _, days = text.strip().partition(" ")
+        try:
+            start, end = (dtime.fromisoformat(part.strip()) for part in hours.split("-"))
+        except ValueError:
+            raise ValueError(f"Invalid send window {text!r}, expected HH:MM-HH:MM") from None
+        if start == end:
+            raise ValueError(f"Empty send window {text!r}")
+        return cls(start, end, _parse_days(days) if days.strip() else ALL_DAYS)
+
+    def __str__(self) -> str:
+        hours = f"{self.start:%H:%M}-{self.end:%H:%M}"
+        if self.days == ALL_DAYS:
+            return hours
+        return f"{hours} {','.join(DAY_NAMES[d] for d in sorted(self.days))}"
+
+    def next_open(self, ts: float, tz: tzinfo) -> float:
+        """Epoch seconds of the first moment >= `ts` inside the window in `tz`."""
+        local = datetime.fromtimestamp(ts, tz)
+        # Start one day back: an overnight window opened yesterday may still be open
+        for offset in range(-1, 8):
+            day = local.date() + timedelta(days=offset)
+            if day.weekday() not in self.days:
+                continue
+            opens = datetime.combine(day, self.start, tz)
+            closes = datetime.combine(day if self.end > self.start else day + timedelta(days=1),
+                                      self.end, tz)
+            if local < opens:
+                return opens.timestamp()
+            if local < closes:
+                return ts
+        raise ValueError(f"Send window {self} has no open time")
+
+
+def _parse_days(text: str) -> FrozenSet[int]:
+    days = set()
+    for part in text.lower().replace(" ", "").split(","):
+        first, _, last = part.partition("-")
+        if first not in DAY_NAMES or (last and last not in DAY_NAMES):
+            raise ValueError(f"Invalid days {text!r}, expected e.g. 'sun-thu' or 'fri,sat'")
+        i, j = DAY_NAMES.index(first), DAY_NAMES.index(last or first)
+        while True:
+            days.add(i)
+            if i == j:
+                break
+            i = (i + 1) % 7
+    return frozenset(days)
+
+
+@lru_cache(maxsize=64)
+def zone(name: str) -> ZoneInfo:
+    return ZoneInfo(name)
+
+
+def recipient_zone(phone: str) -> tzinfo:
+    """Time zone of a normalized number's country (UTC when unknown)."""
+    rule = rule_for_number(phone)
+    return zone(rule.timezone if rule is not None else "UTC")
+
+
+def parse_start(text: str, tz: tzinfo) -> float:
+    """
+    ISO-8601 start time -> epoch seconds. A time with an offset is absolute;
+    a naive one ("2026-10-20T09:00") is read as wall time in `tz`, so each
+    recipient starts at that local time.
+    """
+    when = datetime.fromisoformat(text.strip())
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=tz)
+    return when.timestamp()
+
+
+def earliest_send(now: float,
+                  tz: tzinfo,
+                  start_at: Optional[str] = None,
+                  window: Optional[SendWindow] = None) -> float:
+    """First time a recipient in `tz` may be messaged (>= now)."""
+    ts = now if start_at is None else max(now, parse_start(start_at, tz))
+    return window.next_open(ts, tz) if window is not None else ts
@@ -1,35 +1,327 @@
+"""
+Offline WhatsApp campaign sender (cron-friendly CLI).
+
+Streams recipients from a CSV or JSONL file through WhatsAppClient with
+bounded concurrency and optional pacing, and appends every number that was
+sent to a checkpoint file. A rerun with the same checkpoint (e.g. after a
+crash) skips those numbers: the checkpoint is read once at start-up, and
+the results of the previous run are never rescanned.
+
+    python send_whatsapp_campaign.py recipients.csv --session my_session \\
+        --message "[التحية] [الاسم]، عرض خاص لك" --concurrency 16 --rate 5
+
+Recipients need a `phone` column (national or international format); a
+`message` column, if present, is sent as is, otherwise --message is
+rendered for the row ([الاسم] and any other [column] placeholder, as for
+/send-bulk). Exit status is 0 when every send went out, 1 if any failed
+or the run was interrupted.
+
+Ctrl-C or SIGTERM stops taking new recipients and lets the sends in
+flight finish and reach the checkpoint, so the rerun sends nobody twice;
+a second signal stops at once.
+"""
+
+import argparse
 import asyncio
-from whatsapp_client_python.whatsapp_client import WhatsAppClient
-
-# --- بيانات الجلسة (ثابتة أو محملة من قاعدة بياناتك)
-SESSION_NAME = "your_session_name"
-API_KEY = "your_whatsapp_api_key"
-
-# --- قائمة الأرقام بصيغة دولية
-recipients = [
-    "+966500000001",
-    "+966500000002",
-    "+966500000003"
-]
-
-# --- الرسالة التي سيتم إرسالها
-message = "🌟 مرحبًا! هذه رسالة تجريبية من نظامك. شكرًا لتجربتك!"
-
-# --- الدالة الرئيسية للإرسال
-async def send_bulk_whatsapp(session_name, api_key, numbers, msg):
-    async with WhatsAppClient(session_name=session_name, api_key=api_key) as client:
-        for number in numbers:
-            try:
-                print(f"📤 إرسال إلى {number} ...")
-                result = client.send_message(number, msg)
-                success = await result if asyncio.iscoroutine(result) else result
-                if success:
-                    print(f"✅ تم الإرسال إلى {number}")
-                else:
-                    print(f"❌ فشل الإرسال إلى {number}")
-            except Exception as e:
-                print(f"⚠️ خطأ أثناء الإرسال إلى {number}: {e}")
-
-# --- تنفيذ
+import contextlib
+import csv
+import json
+import os
+import random
+import signal
+import sys
+import time
+from typing import Dict, Iterable, Iterator, List, Optional, Set
+
+from messaging.phone import DEFAULT_COUNTRY_CODE, normalize_numbers
+from messaging.template import MessageTemplate
+from whatsapp_client_python import RateLimiter, WhatsAppClient
+from whatsapp_client_python.bulk import run_bulk
+
+# Rows normalized per vectorized normalize_numbers call
+NORMALIZE_CHUNK = 1000
+
+# Send latencies kept (uniform sample of the whole run) for percentiles
+LATENCY_SAMPLES = 10000
+
+# Print a progress line every this many results
+PROGRESS_EVERY = 1000
+
+
+class Checkpoint:
+    """
+    Append-only file of the numbers already sent, one per line. Each line
+    is flushed as soon as its send succeeds, so after a crash only the
+    sends that were in flight can go out twice; a torn last line is
+    ignored on load.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = None
+
+    def load(self) -> Set[str]:
+        sent: Set[str] = set()
+        if not os.path.exists(self.path):
+            return sent
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                if line.endswith("\n") and line.strip():
+                    sent.add(line.strip())
+        return sent
+
+    def open(self):
+        torn = False
+        if os.path.exists(self.path) and os.path.getsize(self.path):
+            with open(self.path, "rb") as f:
+                f.seek(-1, os.SEEK_END)
+                torn = f.read(1) != b"\n"
+        self._file = open(self.path, "a", encoding="utf-8")
+        if torn:
+            self._file.write("\n")  # end the torn line; load() skips it
+
+    def record(self, phone: str):
+        self._file.write(phone + "\n")
+        self._file.flush()
+
+    def close(self):
+        if self._file is not None:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._file.close()
+            self._file = None
+
+
+class CampaignStats:
+    """Counters and a latency sample of one run."""
+
+    def __init__(self):
+        self.sent = 0
+        self.failed = 0
+        self.invalid = 0
+        self.already_sent = 0
+        self.duplicates = 0
+        self.started = time.perf_counter()
+        self.latency_count = 0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+        self._samples: List[float] = []
+        self._rng = random.Random()
+
+    def record_latency(self, seconds: float):
+        # Reservoir sampling: every send is equally likely to be kept
+        self.latency_count += 1
+        self.latency_total += seconds
+        self.latency_max = max(self.latency_max, seconds)
+        if len(self._samples) < LATENCY_SAMPLES:
+            self._samples.append(seconds)
+        else:
+            slot = self._rng.randrange(self.latency_count)
+            if slot < LATENCY_SAMPLES:
+                self._samples[slot] = seconds
+
+    def percentile(self, p: float) -> Optional[float]:
+        if not self._samples:
+            return None
+        ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * p))]
+
+    def summary(self) -> str:
+        elapsed = time.perf_counter() - self.started
+        done = self.sent + self.failed
+        lines = [
+            "📊 ملخص الحملة",
+            f"   sent={self.sent} failed={self.failed} invalid={self.invalid} "
+            f"already_sent={self.already_sent} duplicates={self.duplicates}",
+            f"   {done} sends in {elapsed:.1f}s = {done / elapsed if elapsed else 0:.1f} msg/s",
+        ]
+        if self.latency_count:
+            lines.append(
+                f"   latency ms: mean={_ms(self.latency_total / self.latency_count)} "
+                f"p50={_ms(self.percentile(0.50))} p95={_ms(self.percentile(0.95))} "
+                f"p99={_ms(self.percentile(0.99))} max={_ms(self.latency_max)}")
+        return "\n".join(lines)
+
+
+def _ms(seconds: float) -> str:
+    return f"{seconds * 1000:.0f}"
+
+
+def read_recipients(path: str, fmt: str) -> Iterator[Dict[str, str]]:
+    """Rows of a CSV (with header) or JSONL file, read lazily ('-': stdin)."""
+    with (contextlib.nullcontext(sys.stdin) if path == "-"
+          else open(path, newline="", encoding="utf-8-sig")) as f:
+        if fmt == "csv":
+            for row in csv.DictReader(f):
+                yield {key.strip(): (value or "").strip()
+                       for key, value in row.items() if key is not None}
+        else:
+            for line in f:
+                if line.strip():
+                    yield {key: "" if value is None else str(value)
+                           for key, value in json.loads(line).items()}
+
+
+def _chunks(rows: Iterable[Dict[str, str]], size: int) -> Iterator[List[Dict[str, str]]]:
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def prepare(rows: Iterable[Dict[str, str]],
+            message: Optional[str],
+            done: Set[str],
+            stats: CampaignStats,
+            country: str = DEFAULT_COUNTRY_CODE) -> Iterator[Dict[str, str]]:
+    """
+    Normalized {"phone", "message"} sends for `rows`, skipping invalid
+    numbers, numbers in `done` (sent by an earlier run) and numbers this
+    run already queued.
+    """
+    queued: Set[str] = set()
+    template = None
+    for chunk in _chunks(rows, NORMALIZE_CHUNK):
+        if template is None and message:
+            template = MessageTemplate(message, columns=chunk[0].keys())
+        normalized = normalize_numbers([row.get("phone") for row in chunk],
+                                       default_country=country)
+        for row, phone, reason in zip(chunk, normalized["e164"], normalized["reason"]):
+            if reason is not None:
+                stats.invalid += 1
+                continue
+            if phone in queued:
+                stats.duplicates += 1
+                continue
+            if phone in done:
+                stats.already_sent += 1
+                continue
+            queued.add(phone)
+            text = row.get("message") or (template.render(row) if template else "")
+            yield {"phone": phone, "message": text}
+
+
+async def run_campaign(args: argparse.Namespace, stats: CampaignStats, out) -> bool:
+    """Send the campaign; True if a signal stopped it before the end."""
+    checkpoint = Checkpoint(args.checkpoint)
+    done = checkpoint.load()
+    if done:
+        print(f"↩️  استئناف: {len(done)} رقم أُرسل سابقًا ({args.checkpoint})", file=out)
+    rows = read_recipients(args.recipients, args.format)
+    sends = prepare(rows, args.message, done, stats, args.country)
+
+    client = WhatsAppClient(session_name=args.session, server_url=args.server,
+                            api_key=args.api_key,
+                            max_connections_per_host=args.concurrency)
+
+    async def timed_send(phone: str, text: str) -> bool:
+        started = time.perf_counter()
+        try:
+            return await client.send_message(phone, text)
+        finally:
+            stats.record_latency(time.perf_counter() - started)
+
+    # SIGTERM (cron timeout, docker stop) stops like Ctrl-C: no new sends
+    # start, and the ones in flight are checkpointed before the summary.
+    # A second signal cancels them.
+    stopping = False
+    task = asyncio.current_task()
+
+    def stop():
+        nonlocal stopping
+        if stopping:
+            task.cancel()
+        stopping = True
+
+    def until_stopped(items: Iterable[Dict[str, str]]) -> Iterator[Dict[str, str]]:
+        for item in items:
+            if stopping:
+                return
+            yield item
+
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, stop)
+    limiter = RateLimiter(args.rate) if args.rate else None
+    checkpoint.open()
+    try:
+        async for result in run_bulk(timed_send, until_stopped(sends),
+                                     args.concurrency, limiter):
+            if result.sent:
+                stats.sent += 1
+                checkpoint.record(result.phone)
+            else:
+                stats.failed += 1
+                print(f"❌ فشل الإرسال إلى {result.phone}"
+                      + (f": {result.error}" if result.error else ""), file=out)
+            if (stats.sent + stats.failed) % PROGRESS_EVERY == 0:
+                print(f"📤 {stats.sent} sent, {stats.failed} failed", file=out)
+    finally:
+        checkpoint.close()
+        await client.close()
+    return stopping
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Send a WhatsApp campaign from a CSV or JSONL file")
+    parser.add_argument("recipients", help="CSV (with a header) or JSONL file; '-' for stdin")
+    parser.add_argument("--format", choices=("csv", "jsonl"),
+                        help="Input format (default: from the file extension)")
+    parser.add_argument("--session", required=True, help="WhatsApp session name")
+    parser.add_argument("--server", help="Session server URL (default: the client's)")
+    parser.add_argument("--api-key", help="Master API key (identification only)")
+    message = parser.add_mutually_exclusive_group()
+    message.add_argument("--message", help="Message template ([الاسم], [<column>], ...)")
+    message.add_argument("--message-file", help="Read the message template from this file")
+    parser.add_argument("--concurrency", type=int, default=8, help="Sends in flight at once")
+    parser.add_argument("--rate", type=float, default=0,
+                        help="Most messages per second (default: unpaced)")
+    parser.add_argument("--checkpoint",
+                        help="Checkpoint file of sent numbers (default: <recipients>.sent)")
+    parser.add_argument("--country", default=DEFAULT_COUNTRY_CODE,
+                        help="Country code for national numbers")
+    parser.add_argument("--quiet", action="store_true",
+                        help="Only print failures, progress and the summary")
+    args = parser.parse_args(argv)
+
+    if args.message_file:
+        with open(args.message_file, encoding="utf-8") as f:
+            args.message = f.read().strip()
+    if args.format is None:
+        args.format = "jsonl" if args.recipients.endswith((".jsonl", ".ndjson")) else "csv"
+    if args.checkpoint is None:
+        if args.recipients == "-":
+            parser.error("--checkpoint is required when reading from stdin")
+        args.checkpoint = args.recipients + ".sent"
+    if args.concurrency < 1:
+        parser.error("--concurrency must be at least 1")
+    return args
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    stats = CampaignStats()
+    interrupted = False
+    out = sys.stdout
+    # The client prints a line per message; --quiet drops them
+    quiet = open(os.devnull, "w") if args.quiet else None
+    try:
+        with contextlib.redirect_stdout(quiet) if quiet else contextlib.nullcontext():
+            interrupted = asyncio.run(run_campaign(args, stats, out))
+    except (KeyboardInterrupt, asyncio.CancelledError):
+        interrupted = True
+    finally:
+        if interrupted:
+            print("⏹️  توقف — أعد التشغيل بنفس ملف الاستئناف للمتابعة", file=out)
+        if quiet:
+            quiet.close()
+        print(stats.summary(), file=out)
+    return 0 if stats.failed == 0 and not interrupted else 1
+
+
 if __name__ == "__main__":
-    asyncio.run(send_bulk_whatsapp(SESSION_NAME, API_KEY, recipients, message))
+    sys.exit(main())
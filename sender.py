@@ -0,0 +1,365 @@
+# sender.py
+"""
+Delivery tier of the WhatsApp Bulk Messaging System.
+
+Drains the shared queue store through one paced lane per sender
+(messaging.scheduler) and records each outcome on its batch. It runs
+either inside the API process (APP_ROLE=all, the default for small
+deployments) or on its own, so the web tier and the senders can be scaled
+and restarted independently:
+
+    APP_ROLE=api uvicorn main:app --workers 4      # web tier only
+    python sender.py                                # delivery tier only
+
+Both sides only meet in the store (QUEUE_STORE_URL / QUEUE_DB_PATH): the
+API enqueues jobs and bumps the sender's notify sequence, sender
+processes poll it, lease jobs and lanes, and write batch progress back
+for /queue-status and /queue-events.
+"""
+
+import asyncio
+import os
+import signal
+import time
+from datetime import datetime, timezone
+from typing import Callable, Dict, Optional
+
+from messaging import Job, LaneScheduler, MessageTemplate, Status, open_store
+from messaging.log import fields, get_logger, setup_logging
+from messaging.phone import rule_for_number
+from messaging.priority import QueueWaitStats
+from messaging.providers import (NoProviderAvailable, ProviderRouter, SessionProvider,
+                                 WasenderProvider)
+from messaging.retry import RetryPolicy, SendResult
+from messaging.store import QueueStore
+from messaging.window import SendWindow, recipient_zone
+from whatsapp_client_python import WhatsAppClient
+
+logger = get_logger("sender")
+queue_logger = get_logger("queue")
+
+# Random per-message delay window (seconds) — 20 to 30 minutes
+MIN_DELAY_SECONDS = 1200
+MAX_DELAY_SECONDS = 1800
+
+# Adaptive pacing bounds: a sender speeds up toward the floor after
+# sustained success and slows down (up to the ceiling) on 429s / errors.
+# The default floor keeps today's 20-30 min spacing as the fastest pace.
+PACING_FLOOR_SECONDS = float(os.getenv("PACING_FLOOR_SECONDS", MIN_DELAY_SECONDS))
+PACING_CEILING_SECONDS = float(os.getenv("PACING_CEILING_SECONDS", 4 * MAX_DELAY_SECONDS))
+
+# Durable queue: jobs, batch counters and per-recipient outcomes are stored
+# in SQLite (WAL) under the ./logs volume so queued campaigns survive
+# container restarts. Every process (API workers, senders, replicas on the
+# same volume) opens the same store. QUEUE_STORE_URL selects another
+# registered backend (messaging.store).
+QUEUE_DB_PATH = os.getenv(
+    "QUEUE_DB_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "logs", "queue.db"),
+)
+QUEUE_STORE_URL = os.getenv("QUEUE_STORE_URL") or QUEUE_DB_PATH
+
+# Finished batches move from the store to compressed per-batch files
+# (messaging.archive) this long after completing, so the store only holds
+# live batches; /queue-status keeps answering for them from the archive.
+# Default directory: "archive" next to the queue database.
+BATCH_ARCHIVE_DIR = os.getenv("BATCH_ARCHIVE_DIR") or None
+BATCH_ARCHIVE_AFTER_SECONDS = float(os.getenv("BATCH_ARCHIVE_AFTER_SECONDS", "3600"))
+BATCH_ARCHIVE_INTERVAL_SECONDS = float(os.getenv("BATCH_ARCHIVE_INTERVAL_SECONDS", "600"))
+
+# -----------------------------------------------------------------------------
+# Providers: wasenderapi.com, and optionally a Siyadah session server
+# -----------------------------------------------------------------------------
+WASENDER_API_URL = os.getenv("WASENDER_API_URL", "https://wasenderapi.com/api/send-message")
+
+# Providers the lanes send through, comma-separated, each optionally with a
+# weight ("wasender,session:0.5"): "wasender" sends with each job's own
+# api_key; "session" sends through the server at SESSION_SERVER_URL, from
+# the session of each api_key in SESSION_NAMES ("<api_key>=<session>,...");
+# jobs of other api_keys never go through it. SESSION_NAME, if set, is a
+# catch-all session for every other api_key: single-tenant setups only,
+# since all their messages then go out from that one number. Each send
+# prefers the faster providers (weight / average response time) and fails
+# over to the others while one is down or throttling (messaging.providers).
+WHATSAPP_PROVIDERS = os.getenv("WHATSAPP_PROVIDERS", "wasender")
+SESSION_SERVER_URL = os.getenv("SESSION_SERVER_URL") or None
+SESSION_NAMES = os.getenv("SESSION_NAMES", "")
+SESSION_NAME = os.getenv("SESSION_NAME") or None
+
+# A provider with this many outages in a row is skipped for
+# PROVIDER_RESET_SECONDS, then one trial send decides if it is back
+PROVIDER_FAILURE_THRESHOLD = int(os.getenv("PROVIDER_FAILURE_THRESHOLD", "5"))
+PROVIDER_RESET_SECONDS = float(os.getenv("PROVIDER_RESET_SECONDS", "60"))
+
+# Transient failures (timeouts, 429, 5xx) are retried with jittered
+# exponential backoff on the job's lane, honoring Retry-After.
+retry_policy = RetryPolicy(
+    max_attempts=int(os.getenv("RETRY_MAX_ATTEMPTS", "5")),
+    base_delay=float(os.getenv("RETRY_BASE_DELAY_SECONDS", "60")),
+    max_delay=float(os.getenv("RETRY_MAX_DELAY_SECONDS", "3600")),
+)
+
+
+def build_session_provider() -> SessionProvider:
+    """The SessionProvider configured by SESSION_NAMES / SESSION_NAME."""
+    sessions = {}
+    for entry in SESSION_NAMES.split(","):
+        api_key, _, session = entry.strip().partition("=")
+        if not api_key:
+            continue
+        if not session:
+            raise ValueError("SESSION_NAMES entries must be <api_key>=<session>")
+        sessions[api_key] = WhatsAppClient(session_name=session, server_url=SESSION_SERVER_URL)
+    if not sessions and SESSION_NAME is None:
+        raise ValueError("The session provider needs SESSION_NAMES (or SESSION_NAME)")
+    catch_all = (WhatsAppClient(session_name=SESSION_NAME, server_url=SESSION_SERVER_URL)
+                 if SESSION_NAME else None)
+    return SessionProvider(catch_all, sessions=sessions)
+
+
+def build_router() -> ProviderRouter:
+    """The ProviderRouter configured by WHATSAPP_PROVIDERS."""
+    providers, weights = [], {}
+    for entry in WHATSAPP_PROVIDERS.split(","):
+        name, _, weight = entry.strip().partition(":")
+        if not name:
+            continue
+        if name == "wasender":
+            providers.append(WasenderProvider(WASENDER_API_URL))
+        elif name == "session":
+            providers.append(build_session_provider())
+        else:
+            raise ValueError(f"Unknown WhatsApp provider {name!r} in WHATSAPP_PROVIDERS")
+        weights[name] = float(weight) if weight else 1.0
+    return ProviderRouter(providers, weights,
+                          failure_threshold=PROVIDER_FAILURE_THRESHOLD,
+                          reset_timeout=PROVIDER_RESET_SECONDS)
+
+
+class Sender:
+    """
+    Sends the queued WhatsApp jobs of `store`: one LaneScheduler lane per
+    api_key, one ProviderRouter (built from WHATSAPP_PROVIDERS unless
+    given) shared by every lane, compiled batch templates and send windows
+    cached per batch.
+
+    `on_progress(batch_id)` is called whenever a batch's counters change
+    (the API process passes its /queue-events hub, so its streams update
+    at once instead of on their next store poll).
+    """
+
+    def __init__(self,
+                 store: QueueStore,
+                 waits: Optional[QueueWaitStats] = None,
+                 on_progress: Optional[Callable[[str], None]] = None,
+                 router: Optional[ProviderRouter] = None):
+        self.store = store
+        self.on_progress = on_progress
+        self.scheduler = LaneScheduler(store, MIN_DELAY_SECONDS, MAX_DELAY_SECONDS,
+                                       floor_delay=PACING_FLOOR_SECONDS,
+                                       ceiling_delay=PACING_CEILING_SECONDS,
+                                       waits=waits)
+        self.router = router if router is not None else build_router()
+        self._housekeeper: Optional[asyncio.Task] = None
+        # Compiled bulk templates and send windows (None: no window) by
+        # batch_id, loaded from the store on first use
+        self._templates: Dict[str, MessageTemplate] = {}
+        self._windows: Dict[str, Optional[SendWindow]] = {}
+
+    async def start(self):
+        """Resume the queue and start the lanes (call from the event loop)."""
+        # Resume from where a previous process stopped: jobs whose lease ran
+        # out (claimed by a process that died) go back to pending. Jobs leased
+        # by other live processes are left alone.
+        released = await asyncio.to_thread(self.store.release_expired)
+        logger.info("Resumed queue", **fields(released_jobs=sum(released.values()),
+                                              owner=self.store.owner))
+
+        self.scheduler.start(self.send_job)
+        self._housekeeper = asyncio.create_task(self._housekeeping())
+
+    async def close(self):
+        if self._housekeeper is not None:
+            self._housekeeper.cancel()
+            await asyncio.gather(self._housekeeper, return_exceptions=True)
+        await self.scheduler.close()
+        await self.router.aclose()
+
+    def notify(self, api_key: str):
+        """Wake the lane of `api_key` right away (jobs enqueued in this process)."""
+        self.scheduler.notify(api_key)
+
+    def forget_batch(self, batch_id: str):
+        """Drop the cached template / window of a finished batch."""
+        self._templates.pop(batch_id, None)
+        self._windows.pop(batch_id, None)
+
+    async def _template(self, batch_id: str) -> MessageTemplate:
+        template = self._templates.get(batch_id)
+        if template is None:
+            stored = await asyncio.to_thread(self.store.load_template, batch_id)
+            if stored is None:
+                raise LookupError(f"No template stored for batch {batch_id}")
+            source, template_fields = stored
+            template = MessageTemplate(source, columns=template_fields)
+            self._templates[batch_id] = template
+        return template
+
+    async def _window(self, batch_id: str) -> Optional[SendWindow]:
+        if batch_id not in self._windows:
+            stored = await asyncio.to_thread(self.store.load_send_window, batch_id)
+            self._windows[batch_id] = SendWindow.parse(stored) if stored else None
+        return self._windows[batch_id]
+
+    async def _housekeeping(self):
+        """
+        Periodically move finished batches to cold storage and forget
+        expired dedupe reservations.
+        """
+        while True:
+            try:
+                archived = await asyncio.to_thread(self.store.archive_completed,
+                                                   BATCH_ARCHIVE_AFTER_SECONDS)
+                if archived:
+                    logger.info("Archived finished batches", **fields(batches=archived))
+                expired = await asyncio.to_thread(self.store.expire_recipients)
+                if expired:
+                    logger.info("Expired recipient reservations", **fields(recipients=expired))
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Housekeeping error")
+            await asyncio.sleep(BATCH_ARCHIVE_INTERVAL_SECONDS)
+
+    def _publish(self, batch_id: str):
+        if self.on_progress is not None:
+            self.on_progress(batch_id)
+
+    async def send_job(self, job: Job) -> Optional[SendResult]:
+        """
+        Send one queued job through the provider router and record the
+        outcome on its batch. Called by the job's api_key lane, after that
+        lane's pacing delay; the returned SendResult adapts the lane's pace.
+
+        `job` is the Job record claimed from the store: single sends carry
+        their final `message`, bulk sends their `fields`, rendered here
+        with the batch template.
+
+        A job of a batch with a send window is only sent while the window
+        is open for its recipient; otherwise it is deferred (with the
+        batch's other pending jobs for that country) until the window
+        opens, and None is returned so the lane's pacing isn't spent. The
+        same goes for every job of the batch while no provider is available
+        (all circuit breakers open).
+        """
+        try:
+            window = await self._window(job.batch_id) if job.batch_id else None
+            if window is not None:
+                now = time.time()
+                opens_at = window.next_open(now, recipient_zone(job.phone))
+                if opens_at > now:
+                    rule = rule_for_number(job.phone)
+                    deferred = await asyncio.to_thread(
+                        self.store.defer, job.id, opens_at, job.batch_id,
+                        f"+{rule.country_code}" if rule else None)
+                    queue_logger.info("Outside send window, deferred", **fields(
+                        phone=job.phone, batch=job.batch_id, jobs=deferred,
+                        until=datetime.fromtimestamp(opens_at, timezone.utc).isoformat()))
+                    return None
+
+            if job.fields is not None:
+                # Bulk jobs are rendered just before sending, so the queue only
+                # holds recipient data, never a copy of the message per job.
+                template = await self._template(job.batch_id)
+                message = template.render({"name": job.name, **job.fields})
+            else:
+                message = job.message
+
+            try:
+                result, provider = await self.router.send(job.api_key, job.phone, message)
+            except NoProviderAvailable as e:
+                deferred = await asyncio.to_thread(self.store.defer, job.id, e.retry_at,
+                                                   job.batch_id, "" if job.batch_id else None)
+                queue_logger.warning("No provider available, deferred", **fields(
+                    phone=job.phone, batch=job.batch_id, jobs=deferred,
+                    until=datetime.fromtimestamp(e.retry_at, timezone.utc).isoformat()))
+                return None
+            success, info = result.success, result.info
+
+            if not success and retry_policy.should_retry(result, job.attempts + 1):
+                # Transient failure: back to the lane as pending, due after the
+                # backoff; the batch keeps it as pending and counts the retry.
+                delay = retry_policy.backoff(job.attempts + 1, result.retry_after)
+                queue_logger.warning("Send failed, will retry", **fields(
+                    phone=job.phone, batch=job.batch_id, attempt=job.attempts + 1,
+                    retry_in=f"{delay:.0f}s", provider=provider, error=info))
+                if not await asyncio.to_thread(self.store.retry, job,
+                                               time.time() + delay, info):
+                    queue_logger.warning("Job lease lost, retry dropped", **fields(
+                        job=job.id, phone=job.phone, batch=job.batch_id))
+                elif job.batch_id:
+                    self._publish(job.batch_id)
+                return result
+
+            if success:
+                queue_logger.info("Sent", **fields(phone=job.phone, batch=job.batch_id,
+                                                   provider=provider, info=info))
+            else:
+                queue_logger.warning("Send failed", **fields(phone=job.phone, batch=job.batch_id,
+                                                             provider=provider, error=info))
+
+            # Job outcome and batch progress are persisted in one transaction
+            await self._record_outcome(job, Status.SENT if success else Status.FAILED,
+                                       None if success else info)
+            return result
+
+        except Exception as e:
+            queue_logger.exception("Worker error", **fields(phone=job.phone))
+            # Still mark the job as resolved on the batch so pending doesn't stick
+            try:
+                await self._record_outcome(job, Status.ERROR, str(e))
+            except Exception as ack_error:
+                queue_logger.error("Could not record job outcome",
+                                   **fields(job=job.id, error=ack_error))
+            return None
+
+    async def _record_outcome(self, job: Job, status: Status, error: Optional[str]):
+        """
+        Ack a finished job; a batch job also counts on its batch. If the job's
+        lease ran out and another process re-claimed it, that process owns
+        the outcome and this one is dropped.
+        """
+        completed = await asyncio.to_thread(self.store.ack, job, status, error)
+        if completed is None:
+            queue_logger.warning("Job lease lost, outcome dropped", **fields(
+                job=job.id, phone=job.phone, batch=job.batch_id, status=status.name))
+            return
+        if job.batch_id:
+            if completed:
+                self.forget_batch(job.batch_id)
+            self._publish(job.batch_id)
+
+
+async def serve():
+    """Run a standalone sender until SIGINT / SIGTERM."""
+    store = open_store(QUEUE_STORE_URL, archive_dir=BATCH_ARCHIVE_DIR)
+    sender = Sender(store)
+    await sender.start()
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    logger.info("Sender running", **fields(store=QUEUE_STORE_URL, owner=store.owner))
+    await stop.wait()
+
+    # Lanes give up their leases, so another sender takes over right away;
+    # jobs in flight are released by their lease running out.
+    logger.info("Sender stopping", **fields(owner=store.owner))
+    await sender.close()
+    store.close()
+
+
+if __name__ == "__main__":
+    setup_logging()
+    asyncio.run(serve())
@@ -0,0 +1,70 @@
+import asyncio
+
+import pytest
+
+from whatsapp_client_python.bulk import run_bulk
+
+
+def recipients(n):
+    for i in range(n):
+        yield {"phone": f"+9665{i:08d}", "message": "hi"}
+
+
+async def instant_send(phone, message):
+    return True
+
+
+def test_every_recipient_reported_once():
+    async def run():
+        return [result.index async for result in run_bulk(instant_send, recipients(100), 4)]
+
+    assert sorted(asyncio.run(run())) == list(range(100))
+
+
+def test_break_and_aclose_with_full_queue():
+    sent = 0
+
+    async def send(phone, message):
+        nonlocal sent
+        sent += 1
+        return True
+
+    async def run():
+        stream = run_bulk(send, recipients(1000), concurrency=4)
+        async for result in stream:
+            await asyncio.sleep(0.01)  # slow consumer: the result queue fills up
+            if result.index >= 10:
+                break
+        await asyncio.wait_for(stream.aclose(), 2)
+
+    asyncio.run(run())
+    assert sent < 100
+
+
+def test_cancel_while_consuming():
+    async def consume(stream):
+        async for _ in stream:
+            await asyncio.sleep(0.01)
+
+    async def run():
+        stream = run_bulk(instant_send, recipients(1000), concurrency=4)
+        task = asyncio.create_task(consume(stream))
+        await asyncio.sleep(0.05)
+        task.cancel()
+        await asyncio.wait_for(asyncio.gather(task, return_exceptions=True), 2)
+        return task.cancelled()
+
+    assert asyncio.run(run())
+
+
+def test_source_error_is_raised():
+    def broken():
+        yield {"phone": "+966500000000", "message": "hi"}
+        raise RuntimeError("bad row")
+
+    async def run():
+        async for _ in run_bulk(instant_send, broken(), 2):
+            pass
+
+    with pytest.raises(RuntimeError, match="bad row"):
+        asyncio.run(run())
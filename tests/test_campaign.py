@@ -0,0 +1,75 @@
+import asyncio
+import collections
+import os
+import signal
+
+import send_whatsapp_campaign as campaign
+
+
+class FakeClient:
+    """Stands in for WhatsAppClient; raises SIGTERM on the send number `stop_at`."""
+
+    delivered = collections.Counter()
+    calls = 0
+    stop_at = None
+    signals = 1
+
+    def __init__(self, **options):
+        pass
+
+    async def send_message(self, phone, message):
+        FakeClient.calls += 1
+        if FakeClient.calls == FakeClient.stop_at:
+            for _ in range(FakeClient.signals):
+                os.kill(os.getpid(), signal.SIGTERM)
+        await asyncio.sleep(0.005)
+        FakeClient.delivered[phone] += 1
+        return True
+
+    async def close(self):
+        pass
+
+
+def _campaign(tmp_path, monkeypatch, rows=200):
+    path = tmp_path / "recipients.csv"
+    path.write_text("phone,name\n" + "".join(f"05{i:08d},user{i}\n" for i in range(rows)),
+                    encoding="utf-8")
+    monkeypatch.setattr(campaign, "WhatsAppClient", FakeClient)
+    FakeClient.delivered = collections.Counter()
+    FakeClient.calls = 0
+    return [str(path), "--session", "test", "--message", "hi [name]",
+            "--concurrency", "8", "--quiet"]
+
+
+def _main(capsys, argv, stop_at=None, signals=1):
+    FakeClient.stop_at = stop_at
+    FakeClient.signals = signals
+    FakeClient.calls = 0
+    status = campaign.main(argv)
+    return status, capsys.readouterr().out
+
+
+def test_interrupted_campaign_resumes_without_double_sends(tmp_path, monkeypatch, capsys):
+    argv = _campaign(tmp_path, monkeypatch)
+
+    status, output = _main(capsys, argv, stop_at=50)
+    first = sum(FakeClient.delivered.values())
+    assert status == 1 and "⏹️" in output
+    assert 50 <= first < 200
+
+    status, output = _main(capsys, argv)
+    assert status == 0
+    assert f"already_sent={first}" in output
+    assert len(FakeClient.delivered) == 200
+    assert max(FakeClient.delivered.values()) == 1
+
+
+def test_second_signal_stops_at_once(tmp_path, monkeypatch, capsys):
+    argv = _campaign(tmp_path, monkeypatch)
+
+    status, output = _main(capsys, argv, stop_at=50, signals=2)
+    assert status == 1 and "📊" in output
+    assert sum(FakeClient.delivered.values()) < 200
+    # Everything checkpointed was delivered
+    with open(argv[0] + ".sent", encoding="utf-8") as f:
+        assert set(f.read().split()) <= set(FakeClient.delivered)
@@ -0,0 +1,106 @@
+import asyncio
+import smtplib
+import time
+from email.mime.multipart import MIMEMultipart
+
+import pytest
+
+from messaging.mailer import SMTPPool, send_all
+
+
+class FakeSMTP:
+    """Stands in for smtplib.SMTP; records every connection and message."""
+
+    connections = []
+    drop_next = 0  # sends that fail as if the server closed the connection
+
+    def __init__(self, host, port, timeout=None):
+        self.sent = []
+        self.closed = False
+        FakeSMTP.connections.append(self)
+
+    def starttls(self):
+        pass
+
+    def login(self, username, password):
+        if password != "secret":
+            raise smtplib.SMTPAuthenticationError(535, b"bad credentials")
+
+    def send_message(self, message):
+        if FakeSMTP.drop_next:
+            FakeSMTP.drop_next -= 1
+            raise smtplib.SMTPServerDisconnected("Connection unexpectedly closed")
+        self.sent.append(message["To"])
+
+    def quit(self):
+        self.closed = True
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def fake_smtp(monkeypatch):
+    FakeSMTP.connections = []
+    FakeSMTP.drop_next = 0
+    monkeypatch.setattr(smtplib, "SMTP", FakeSMTP)
+    return FakeSMTP
+
+
+def email(to):
+    message = MIMEMultipart()
+    message["To"] = to
+    return message
+
+
+def test_pool_reuses_its_connection(fake_smtp):
+    pool = SMTPPool("smtp.example.com", 587, "me@example.com", "secret")
+    pool.open()
+    for i in range(5):
+        pool.send(email(f"user{i}@example.com"))
+    [server] = fake_smtp.connections
+    assert len(server.sent) == 5
+    pool.close()
+    assert server.closed
+
+
+def test_bad_login_fails_open(fake_smtp):
+    pool = SMTPPool("smtp.example.com", 587, "me@example.com", "wrong")
+    with pytest.raises(smtplib.SMTPAuthenticationError):
+        pool.open()
+    assert fake_smtp.connections[0].closed
+
+
+def test_pool_reconnects_after_drop(fake_smtp):
+    pool = SMTPPool("smtp.example.com", 587, "me@example.com", "secret")
+    pool.open()
+    pool.send(email("a@example.com"))
+    # The server dropped the idle connection: one fresh connection, no loss
+    fake_smtp.drop_next = 1
+    pool.send(email("b@example.com"))
+    stale, fresh = fake_smtp.connections
+    assert stale.closed and stale.sent == ["a@example.com"]
+    assert fresh.sent == ["b@example.com"]
+    # Still dropped on the fresh connection: the send fails
+    fake_smtp.drop_next = 2
+    with pytest.raises(smtplib.SMTPServerDisconnected):
+        pool.send(email("c@example.com"))
+
+
+def test_send_all_is_rate_limited(fake_smtp):
+    pool = SMTPPool("smtp.example.com", 587, "me@example.com", "secret")
+    results = []
+
+    async def on_result(tag, success, error):
+        results.append((tag, success))
+
+    messages = [(i, email(f"user{i}@example.com")) for i in range(6)]
+    started = time.monotonic()
+    asyncio.run(send_all(pool, messages, on_result, concurrency=3, rate=20))
+    elapsed = time.monotonic() - started
+    # 6 sends at 20/s: the first goes right away, the rest 50 ms apart
+    assert elapsed >= 0.24
+    assert sorted(results) == [(i, True) for i in range(6)]
+    # Never more connections than concurrent senders
+    assert 1 <= len(fake_smtp.connections) <= 3
+    assert sum(len(c.sent) for c in fake_smtp.connections) == 6
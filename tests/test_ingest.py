@@ -0,0 +1,101 @@
+import asyncio
+import codecs
+import io
+
+import pytest
+
+from messaging.ingest import CSVFormatError, CSVUploadStream
+
+
+class Upload:
+    """Async file object, like FastAPI's UploadFile."""
+
+    def __init__(self, data: bytes):
+        self._file = io.BytesIO(data)
+
+    async def read(self, size: int) -> bytes:
+        return self._file.read(size)
+
+
+def parse(data, chunk_size=64 * 1024):
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+
+    async def run():
+        stream = CSVUploadStream(Upload(data), chunk_size=chunk_size)
+        header = await stream.read_header()
+        return header, [(num, row) async for num, row in stream]
+
+    return asyncio.run(run())
+
+
+def test_rows_and_record_numbers():
+    header, rows = parse("name,phone\nAli,0551234567\n\nSara,0557654321\n")
+    assert header == ["name", "phone"]
+    assert rows == [(2, {"name": "Ali", "phone": "0551234567"}),
+                    (3, {"name": "Sara", "phone": "0557654321"})]
+
+
+def test_short_row_fills_missing_columns():
+    _, rows = parse("name,phone,city\nAli,0551234567\n")
+    assert rows[0][1] == {"name": "Ali", "phone": "0551234567", "city": None}
+
+
+def test_quoted_field_with_embedded_newlines():
+    _, rows = parse('name,phone\n"Ali\nBin Saad\n",0551234567\nSara,0557654321\n')
+    assert [row for _, row in rows] == [
+        {"name": "Ali\nBin Saad\n", "phone": "0551234567"},
+        {"name": "Sara", "phone": "0557654321"},
+    ]
+
+
+def test_doubled_quotes_inside_quoted_field():
+    _, rows = parse('name,phone\n"Ali ""the boss""\nSaad",0551234567\n')
+    assert rows[0][1]["name"] == 'Ali "the boss"\nSaad'
+
+
+def test_stray_quote_in_unquoted_field():
+    _, rows = parse("name,phone\nAli 5'11\" tall,0551234567\nSara,0557654321\n")
+    assert [row for _, row in rows] == [
+        {"name": "Ali 5'11\" tall", "phone": "0551234567"},
+        {"name": "Sara", "phone": "0557654321"},
+    ]
+
+
+def test_crlf_line_endings():
+    _, rows = parse('name,phone\r\nAli,0551234567\r\n"Sa\r\nra",0557654321\r\n')
+    assert [row for _, row in rows] == [
+        {"name": "Ali", "phone": "0551234567"},
+        {"name": "Sa\r\nra", "phone": "0557654321"},
+    ]
+
+
+def test_utf8_bom():
+    header, rows = parse(codecs.BOM_UTF8 + "name,phone\nعلي,0551234567\n".encode("utf-8"))
+    assert header == ["name", "phone"]
+    assert rows[0][1]["name"] == "علي"
+
+
+def test_latin1_upload():
+    header, rows = parse("name,phone\nJosé,0551234567\n".encode("latin-1"))
+    assert rows[0][1]["name"] == "José"
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 7, 16])
+def test_chunk_boundaries_inside_quoted_fields(chunk_size):
+    data = 'name,phone\n"Ali\nBin, Saad",0551234567\n"علي ""x""",0557654321\n'
+    assert parse(data, chunk_size) == parse(data)
+    assert [row["name"] for _, row in parse(data, chunk_size)[1]] == [
+        "Ali\nBin, Saad", 'علي "x"']
+
+
+def test_unclosed_quote_at_end_of_file():
+    _, rows = parse('name,phone\nAli,0551234567\n"Sara,0557654321\n')
+    assert rows[0][1] == {"name": "Ali", "phone": "0551234567"}
+    assert rows[1][1]["name"].startswith("Sara,0557654321")
+
+
+def test_malformed_record_reports_row():
+    with pytest.raises(CSVFormatError) as info:
+        parse("name,phone\nAli,0551234567\nSa\rra,0557654321\n")
+    assert info.value.row == 3
@@ -0,0 +1,335 @@
+import asyncio
+import multiprocessing
+import os
+import time
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from messaging import EmailOutcome, JobStore, LaneScheduler, Priority, Status, job_store
+from messaging.retry import SendResult
+from messaging.store import DROP_DUPLICATE, DROP_RECENT, DROP_SUPPRESSED
+
+KEY = "test-key-0001"
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = JobStore(os.path.join(str(tmp_path), "queue.db"))
+    yield store
+    store.close()
+
+
+def new_batch(store, batch_id, status="ingesting"):
+    store.create_batch({"batch_id": batch_id, "status": status, "total": 0, "pending": 0})
+
+
+def test_reserve_dedupes_within_a_batch(store):
+    new_batch(store, "a")
+    assert store.reserve_recipients(KEY, "a", ["+1", "+2", "+1"], 60) == [None, None, DROP_DUPLICATE]
+    # A later chunk of the same upload
+    assert store.reserve_recipients(KEY, "a", ["+2", "+3"], 60) == [DROP_DUPLICATE, None]
+    assert store.get_batch("a")["duplicates"] == 2
+
+
+def test_reserve_across_batches_and_keys(store):
+    new_batch(store, "a")
+    new_batch(store, "b")
+    store.reserve_recipients(KEY, "a", ["+1", "+2"], 60)
+    assert store.reserve_recipients(KEY, "b", ["+1", "+3"], 60) == [DROP_RECENT, None]
+    assert store.reserve_recipients("other-key", "b", ["+1"], 60) == [None]
+    assert store.get_batch("b")["recently_sent"] == 1
+
+
+def test_reservation_expires(store):
+    new_batch(store, "a")
+    new_batch(store, "b")
+    store.reserve_recipients(KEY, "a", ["+1"], 0.05)
+    store.finish_ingest("a", "now")
+    time.sleep(0.1)
+    assert store.reserve_recipients(KEY, "b", ["+1"], 60) == [None]
+    # ...and now belongs to "b"
+    assert store.reserve_recipients(KEY, "a", ["+1"], 60) == [DROP_RECENT]
+
+
+def test_expire_keeps_batches_still_ingesting(store):
+    new_batch(store, "a")
+    store.reserve_recipients(KEY, "a", ["+1", "+2"], 0)
+    assert store.expire_recipients() == 0
+    # Still a duplicate within the upload, whatever the window
+    assert store.reserve_recipients(KEY, "a", ["+1"], 0) == [DROP_DUPLICATE]
+    store.finish_ingest("a", "now")
+    assert store.expire_recipients() == 2
+
+
+def test_reservation_lasts_while_batch_sends(store):
+    # A batch still sending after its window (paused, throttled) keeps its
+    # numbers: another batch must not queue them again
+    new_batch(store, "slow")
+    store.enqueue_many([{"api_key": KEY, "phone": "+1", "message": "hi",
+                         "batch_id": "slow"}], "slow")
+    store.reserve_recipients(KEY, "slow", ["+1"], 0.05)
+    store.finish_ingest("slow", "now")
+    time.sleep(0.1)
+    assert store.expire_recipients() == 0
+    new_batch(store, "b")
+    assert store.reserve_recipients(KEY, "b", ["+1"], 60) == [DROP_RECENT]
+    store.ack(store.claim_next(KEY, Priority.NORMAL), Status.SENT)
+    assert store.get_batch("slow")["status"] == "completed"
+    assert store.expire_recipients() == 1
+    assert store.reserve_recipients(KEY, "b", ["+1"], 60) == [None]
+
+
+def test_suppressed_numbers_are_dropped(store):
+    new_batch(store, "a")
+    store.suppress(KEY, ["+1"], "opt-out")
+    assert store.reserve_recipients(KEY, "a", ["+1", "+2"], 60) == [DROP_SUPPRESSED, None]
+    store.unsuppress(KEY, ["+1"])
+    assert store.reserve_recipients(KEY, "a", ["+1"], 60) == [None]
+    assert store.get_batch("a")["suppressed"] == 1
+
+
+def test_reserve_many_phones(store):
+    # More phones than one IN (...) lookup takes
+    new_batch(store, "a")
+    phones = [f"+9665{i:08d}" for i in range(1200)]
+    assert store.reserve_recipients(KEY, "a", phones, 60) == [None] * 1200
+    assert set(store.reserve_recipients(KEY, "a", phones, 60)) == {DROP_DUPLICATE}
+
+
+def finished_email_batch(store, batch_id, recipients, age):
+    store.create_batch({"batch_id": batch_id, "channel": "email", "status": "sending",
+                        "total": len(recipients), "pending": len(recipients)})
+    for i, email in enumerate(recipients):
+        store.record_outcome(batch_id, EmailOutcome(
+            email, f"user{i}", Status.SENT if i % 2 == 0 else Status.FAILED,
+            None if i % 2 == 0 else "550 rejected"))
+    completed_at = datetime.now(timezone.utc) - timedelta(seconds=age)
+    store.update_batch(batch_id, status="completed", completed_at=completed_at.isoformat())
+
+
+def test_archive_moves_finished_batches(store, monkeypatch):
+    monkeypatch.setattr(job_store, "_ARCHIVE_PAGE", 2)  # page through the outcomes
+    emails = [f"user{i}@example.com" for i in range(5)]
+    finished_email_batch(store, "old", emails, age=3600)
+    finished_email_batch(store, "recent", emails[:1], age=1)
+    before = store.get_batch("old")
+    details = store.batch_details("old", 0, 100)
+
+    assert store.archive_completed(older_than=60) == 1
+    assert os.path.exists(os.path.join(store.archive.directory, "old.jsonl.gz"))
+    assert store.get_batch("old") == before
+    assert before["sent"] == 3 and before["failed"] == 2 and before["details_count"] == 5
+    archived = store.batch_details("old", 0, 100)
+    assert [d.as_dict() for d in archived] == [d.as_dict() for d in details]
+    assert all(isinstance(d, EmailOutcome) for d in archived)
+    assert [d.recipient for d in store.batch_details("old", 3, 1)] == [emails[3]]
+    # Only the old batch left the store; a second run finds nothing
+    assert store.get_batch("recent")["details_count"] == 1
+    assert store.archive_completed(older_than=60) == 0
+
+
+def test_archive_skips_live_batches(store):
+    new_batch(store, "ingesting")
+    store.create_batch({"batch_id": "queued", "status": "queued", "total": 1, "pending": 1,
+                        "completed_at": "2000-01-01T00:00:00+00:00"})
+    assert store.archive_completed(older_than=0) == 0
+    assert store.get_batch("ingesting")["status"] == "ingesting"
+    assert store.get_batch("queued")["status"] == "queued"
+
+
+def test_archived_whatsapp_batch_keeps_outcomes(store):
+    new_batch(store, "wa")
+    store.enqueue_many([{"api_key": KEY, "phone": "+1", "name": "Ali", "message": "hi",
+                         "batch_id": "wa", "priority": Priority.BULK}], "wa")
+    store.finish_ingest("wa", "now")
+    job = store.claim_next(KEY, Priority.BULK)
+    assert store.ack(job, Status.SENT)
+    assert store.archive_completed(older_than=0) == 1
+    assert not store.has_pending(KEY)
+    batch = store.get_batch("wa")
+    assert batch["status"] == "completed" and batch["sent"] == 1
+    [outcome] = store.batch_details("wa", 0, 10)
+    assert (outcome.recipient, outcome.name, outcome.status) == ("+1", "Ali", Status.SENT)
+
+
+def test_unknown_or_unsafe_batch_ids(store):
+    assert store.get_batch("missing") is None
+    assert store.batch_details("../../etc/passwd", 0, 10) == []
+
+
+def queue_batch_job(store, batch_id="wa", phone="+1"):
+    new_batch(store, batch_id)
+    store.enqueue_many([{"api_key": KEY, "phone": phone, "name": "Ali", "message": "hi",
+                         "batch_id": batch_id, "priority": Priority.BULK}], batch_id)
+    store.finish_ingest(batch_id, "now")
+
+
+def test_ack_after_lease_lost_is_dropped(tmp_path):
+    path = os.path.join(str(tmp_path), "queue.db")
+    slow, other = JobStore(path, owner="slow", job_lease=0.05), JobStore(path, owner="other")
+    try:
+        queue_batch_job(slow)
+        stale = slow.claim_next(KEY, Priority.BULK)
+        time.sleep(0.1)
+        assert other.release_expired() == {KEY: 1}
+        job = other.claim_next(KEY, Priority.BULK)
+        assert job.id == stale.id
+        assert not slow.renew_claim(stale)
+        assert other.ack(job, Status.SENT) is True
+        # The first claimant finishes late: nothing is counted twice
+        assert slow.ack(stale, Status.SENT) is None
+        assert slow.retry(stale, time.time()) is False
+        assert slow.defer(stale.id, time.time()) == 0
+        batch = other.get_batch("wa")
+        assert (batch["sent"], batch["pending"], batch["details_count"]) == (1, 0, 1)
+        assert batch["retries"] == 0
+    finally:
+        slow.close()
+        other.close()
+
+
+def test_renewed_claim_is_not_released(tmp_path):
+    store = JobStore(os.path.join(str(tmp_path), "queue.db"), job_lease=0.1)
+    try:
+        queue_batch_job(store)
+        job = store.claim_next(KEY, Priority.BULK)
+        time.sleep(0.06)
+        assert store.renew_claim(job)
+        time.sleep(0.06)
+        assert store.release_expired() == {}
+        assert store.ack(job, Status.SENT) is True
+    finally:
+        store.close()
+
+
+def test_lane_lease_is_held_by_one_process(tmp_path):
+    path = os.path.join(str(tmp_path), "queue.db")
+    a, b = JobStore(path, owner="a"), JobStore(path, owner="b")
+    try:
+        held, until = a.lease_lane(KEY, 60)
+        assert held
+        assert b.lease_lane(KEY, 60) == (False, until)
+        assert a.lease_lane(KEY, 60)[0]  # renewal
+        a.release_lane(KEY)
+        assert b.lease_lane(KEY, 0.05)[0]
+        # b stops renewing (died): its lease runs out and a takes over
+        b.enqueue({"api_key": KEY, "phone": "+1", "message": "hi"})
+        time.sleep(0.1)
+        assert a.orphaned_lanes() == [KEY]
+        assert a.lease_lane(KEY, 60)[0]
+        b.release_lane(KEY)  # not b's anymore: no effect
+        assert not b.lease_lane(KEY, 60)[0]
+    finally:
+        a.close()
+        b.close()
+
+
+def _sender_process(path, log_path, stop_at):
+    store = JobStore(path)
+
+    async def run():
+        scheduler = LaneScheduler(store, 0.005, 0.01, floor_delay=0.005, ceiling_delay=0.05,
+                                  poll_interval=0.1)
+
+        async def handler(job):
+            with open(log_path, "a") as log:
+                log.write(f"{job.id} {job.api_key} {os.getpid()}\n")
+            await asyncio.to_thread(store.ack, job, Status.SENT)
+            return SendResult(True, "HTTP 200", status_code=200)
+
+        scheduler.start(handler)
+        while time.time() < stop_at:
+            await asyncio.sleep(0.1)
+        await scheduler.close()
+
+    asyncio.run(run())
+    store.close()
+
+
+def test_processes_share_one_store(tmp_path):
+    # Several sender processes on one file (like uvicorn --workers): every
+    # job is sent once, and each sender by a single process
+    path = os.path.join(str(tmp_path), "queue.db")
+    log_path = os.path.join(str(tmp_path), "sends.log")
+    senders, per_sender = ["sender-key-0001", "sender-key-0002", "sender-key-0003"], 30
+    workers = [multiprocessing.Process(target=_sender_process,
+                                       args=(path, log_path, time.time() + 4))
+               for _ in range(3)]
+    for worker in workers:
+        worker.start()
+    store = JobStore(path)
+    try:
+        time.sleep(1)
+        new_batch(store, "shared")
+        for key in senders:
+            store.enqueue_many([{"api_key": key, "phone": f"+9665{i:08d}", "message": "hi",
+                                 "batch_id": "shared", "priority": Priority.BULK}
+                                for i in range(per_sender)], "shared")
+        store.finish_ingest("shared", "now")
+        for worker in workers:
+            worker.join()
+        batch = store.get_batch("shared")
+    finally:
+        store.close()
+
+    with open(log_path) as log:
+        sends = [line.split() for line in log]
+    assert sorted(Counter(job_id for job_id, _, _ in sends).values()) == [1] * 90
+    pids = defaultdict(set)
+    for _, key, pid in sends:
+        pids[key].add(pid)
+    assert all(len(pids[key]) == 1 for key in senders)
+    assert (batch["status"], batch["sent"], batch["details_count"]) == ("completed", 90, 90)
+
+
+def test_claim_then_ack(store):
+    store.enqueue({"api_key": KEY, "phone": "+1", "message": "hi"})
+    assert store.has_pending(KEY)
+    job = store.claim_next(KEY, Priority.NORMAL)
+    assert (job.phone, job.message, job.attempts) == ("+1", "hi", 0)
+    assert store.claim_next(KEY, Priority.NORMAL) is None  # claimed once
+    assert store.ack(job, Status.SENT) is False  # no batch to complete
+    assert not store.has_pending(KEY)
+    assert store.pending_by_key() == {}
+
+
+def test_restart_resumes_claimed_jobs(tmp_path):
+    # The process died mid-send: after its lease, the next start puts the
+    # job back to pending and it is sent again (at-least-once)
+    path = os.path.join(str(tmp_path), "queue.db")
+    crashed = JobStore(path, owner="crashed", job_lease=0.5)
+    queue_batch_job(crashed)
+    crashed.claim_next(KEY, Priority.BULK)
+    crashed.close()
+
+    store = JobStore(path, owner="restarted")
+    try:
+        assert store.release_expired() == {}  # reopened before the lease ran out
+        time.sleep(0.6)
+        assert store.release_expired() == {KEY: 1}
+        job = store.claim_next(KEY, Priority.BULK)
+        assert job.phone == "+1"
+        assert store.ack(job, Status.SENT) is True
+        assert store.get_batch("wa")["status"] == "completed"
+    finally:
+        store.close()
+
+
+def test_discard_batch_drops_claimed_jobs(store):
+    new_batch(store, "upload")
+    store.enqueue_many([{"api_key": KEY, "phone": f"+{i}", "message": "hi",
+                         "batch_id": "upload"} for i in range(3)], "upload")
+    store.reserve_recipients(KEY, "upload", ["+0", "+1", "+2"], 60)
+    in_flight = store.claim_next(KEY, Priority.NORMAL)
+    store.discard_batch("upload")
+    assert store.get_batch("upload") is None
+    assert not store.has_pending(KEY)
+    # The lane finishes its send: nothing is recorded, nothing re-queued
+    assert store.ack(in_flight, Status.SENT) is None
+    assert store.retry(in_flight, time.time()) is False
+    assert store.release_expired() == {}
+    assert store.batch_details("upload", 0, 10) == []
+    new_batch(store, "retry")
+    assert store.reserve_recipients(KEY, "retry", ["+0"], 60) == [None]
@@ -0,0 +1,55 @@
+import pandas as pd
+import pytest
+
+from messaging.phone import (REJECT_COUNTRY, REJECT_EMPTY, REJECT_LENGTH, REJECT_NON_NUMERIC,
+                             normalize_number, normalize_numbers)
+
+# (raw, expected without allow_unknown, expected with allow_unknown)
+CASES = [
+    # National numbers of the default country (Saudi)
+    ("0551234567", ("+966551234567", None), ("+966551234567", None)),
+    ("055 123-4567", ("+966551234567", None), ("+966551234567", None)),
+    ("551234567", ("+966551234567", None), ("+966551234567", None)),
+    ("٠٥٥١٢٣٤٥٦٧", ("+966551234567", None), ("+966551234567", None)),
+    # 00 and + prefixes
+    ("00966551234567", ("+966551234567", None), ("+966551234567", None)),
+    ("+971501234567", ("+971501234567", None), ("+971501234567", None)),
+    ("+447911123456", (None, REJECT_COUNTRY), ("+447911123456", None)),
+    ("00447911123456", (None, REJECT_COUNTRY), ("+447911123456", None)),
+    # Bare international digits
+    ("966551234567", ("+966551234567", None), ("+966551234567", None)),
+    ("20 100 123 4567", ("+201001234567", None), ("+201001234567", None)),
+    ("447911123456", (None, REJECT_LENGTH), ("+447911123456", None)),
+    # Too short / too long
+    ("05512", (None, REJECT_LENGTH), (None, REJECT_LENGTH)),
+    ("1234567", (None, REJECT_LENGTH), (None, REJECT_LENGTH)),
+    ("96655123456", (None, REJECT_LENGTH), (None, REJECT_LENGTH)),
+    ("+1234567890123456", (None, REJECT_COUNTRY), (None, REJECT_COUNTRY)),
+    # Not numbers
+    ("phone", (None, REJECT_NON_NUMERIC), (None, REJECT_NON_NUMERIC)),
+    ("+9665512x4567", (None, REJECT_NON_NUMERIC), (None, REJECT_NON_NUMERIC)),
+    ("", (None, REJECT_EMPTY), (None, REJECT_EMPTY)),
+    (None, (None, REJECT_EMPTY), (None, REJECT_EMPTY)),
+]
+
+
+@pytest.mark.parametrize("allow_unknown", [False, True])
+def test_vectorized_matches_scalar(allow_unknown):
+    raw = [case[0] for case in CASES]
+    expected = [case[2] if allow_unknown else case[1] for case in CASES]
+    column = normalize_numbers(raw, allow_unknown=allow_unknown)
+    assert list(zip(column["e164"], column["reason"])) == expected
+    assert [normalize_number(r, allow_unknown=allow_unknown) for r in raw] == expected
+
+
+def test_series_keeps_its_index():
+    raw = pd.Series(["0551234567", None, "abc"], index=[10, 20, 30])
+    column = normalize_numbers(raw)
+    assert list(column.index) == [10, 20, 30]
+    assert list(column["reason"]) == [None, REJECT_EMPTY, REJECT_NON_NUMERIC]
+
+
+def test_default_country():
+    assert normalize_number("0501234567", default_country="971") == ("+971501234567", None)
+    with pytest.raises(ValueError):
+        normalize_number("0501234567", default_country="44")
@@ -0,0 +1,79 @@
+import asyncio
+
+import pytest
+
+from messaging.providers import NoProviderAvailable, Provider, ProviderRouter, SessionProvider
+from messaging.retry import SendResult
+
+
+class FakeClient:
+    """WhatsAppClient stand-in recording the numbers it sent to."""
+
+    def __init__(self, status=201):
+        self.status = status
+        self.sent = []
+        self.closed = False
+
+    async def send_message_status(self, phone, text):
+        self.sent.append(phone)
+        return self.status
+
+    async def close(self):
+        self.closed = True
+
+
+class DownProvider(Provider):
+    name = "wasender"
+
+    async def send(self, api_key, phone, text):
+        return SendResult(False, "no response", retryable=True)
+
+
+def route(router, api_key, phone="+966500000000"):
+    return asyncio.run(router.send(api_key, phone, "hi"))
+
+
+def test_session_provider_sends_from_each_keys_session():
+    alice, bob = FakeClient(), FakeClient()
+    router = ProviderRouter([DownProvider(), SessionProvider(sessions={"alice": alice,
+                                                                       "bob": bob})])
+    assert route(router, "alice", "+1")[0].success
+    assert route(router, "bob", "+2")[0].success
+    assert (alice.sent, bob.sent) == (["+1"], ["+2"])
+
+
+def test_other_tenants_never_fail_over_to_a_session():
+    alice = FakeClient()
+    router = ProviderRouter([DownProvider(), SessionProvider(sessions={"alice": alice})],
+                            failure_threshold=2)
+    result, name = route(router, "carol")
+    assert not result.success and name == "wasender"
+    route(router, "carol")  # wasender's breaker opens
+    with pytest.raises(NoProviderAvailable):
+        route(router, "carol")
+    assert alice.sent == []
+    # alice still fails over to her own session
+    assert route(router, "alice") == (SendResult(True, "HTTP 201", status_code=201), "session")
+
+
+def test_catch_all_session_serves_every_key():
+    shared, alice = FakeClient(), FakeClient()
+    provider = SessionProvider(shared, sessions={"alice": alice})
+    router = ProviderRouter([provider])
+    route(router, "alice", "+1")
+    route(router, "carol", "+2")
+    assert (alice.sent, shared.sent) == (["+1"], ["+2"])
+    asyncio.run(router.aclose())
+    assert shared.closed and alice.closed
+
+
+def test_key_without_any_provider_fails_without_retry():
+    router = ProviderRouter([SessionProvider(sessions={"alice": FakeClient()})])
+    result, name = route(router, "carol")
+    assert not result.success and not result.retryable and name == "none"
+
+
+def test_session_status_classification():
+    router = ProviderRouter([SessionProvider(sessions={"alice": FakeClient(status=503)})])
+    result, _ = route(router, "alice")
+    assert not result.success and result.retryable and result.status_code == 503
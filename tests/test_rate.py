@@ -0,0 +1,72 @@
+from messaging.rate import AIMDPacer
+
+
+def pacer(**options):
+    settings = dict(interval=100, floor=20, ceiling=400, decrease_step=10,
+                    success_window=5, error_burst=3)
+    settings.update(options)
+    return AIMDPacer(**settings)
+
+
+def test_successes_shorten_the_interval_additively():
+    p = pacer()
+    for _ in range(4):
+        p.on_result(True)
+    assert p.interval == 100  # not a full window yet
+    p.on_result(True)
+    assert p.interval == 90
+    for _ in range(10):
+        p.on_result(True)
+    assert p.interval == 70
+    assert [h["reason"] for h in p.history] == ["start", "relaxed", "relaxed", "relaxed"]
+
+
+def test_throttle_multiplies_the_interval():
+    p = pacer()
+    for _ in range(4):
+        p.on_result(True)
+    p.on_result(False, throttled=True)
+    assert p.interval == 200
+    # The throttle reset the success streak
+    p.on_result(True)
+    assert p.interval == 200
+    p.on_result(False, throttled=True)
+    assert p.interval == 400
+    assert p.history[-1]["reason"] == "throttled"
+
+
+def test_transient_errors_back_off_in_bursts():
+    p = pacer()
+    p.on_result(False, transient=True)
+    p.on_result(False, transient=True)
+    p.on_result(True)  # breaks the burst
+    p.on_result(False, transient=True)
+    p.on_result(False, transient=True)
+    assert p.interval == 100
+    p.on_result(False, transient=True)
+    assert p.interval == 200
+    assert p.history[-1]["reason"] == "errors"
+    # Permanent failures carry no signal
+    for _ in range(10):
+        p.on_result(False)
+    assert p.interval == 200
+
+
+def test_floor_and_ceiling():
+    p = pacer(interval=25)
+    for _ in range(20):
+        p.on_result(True)
+    assert p.interval == 20
+    for _ in range(10):
+        p.on_result(False, throttled=True)
+    assert p.interval == 400
+    # Clamped on construction too
+    assert pacer(interval=5).interval == 20
+    assert pacer(interval=1000).interval == 400
+
+
+def test_delay_jitter():
+    p = pacer(jitter=1.5)
+    delays = [p.next_delay() for _ in range(200)]
+    assert all(100 <= d <= 150 for d in delays)
+    assert p.snapshot()["messages_per_hour"] == round(3600 / 125, 2)
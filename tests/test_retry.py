@@ -0,0 +1,94 @@
+import asyncio
+import time
+from email.utils import formatdate
+
+import httpx
+import pytest
+
+from messaging.retry import RetryPolicy, SendResult, parse_retry_after
+from messaging.wasender import post_message
+
+URL = "https://wasender.test/api/send-message"
+
+
+def test_backoff_doubles_up_to_the_cap():
+    policy = RetryPolicy(max_attempts=5, base_delay=10, max_delay=60)
+    for attempts, ceiling in [(1, 10), (2, 20), (3, 40), (4, 60), (9, 60)]:
+        for _ in range(20):
+            assert ceiling / 2 <= policy.backoff(attempts) <= ceiling
+
+
+def test_backoff_honours_retry_after():
+    policy = RetryPolicy(base_delay=1, max_delay=2)
+    assert policy.backoff(1, retry_after=30) == 30
+
+
+def test_should_retry_until_max_attempts():
+    policy = RetryPolicy(max_attempts=3)
+    transient = SendResult(False, "HTTP 503", retryable=True, status_code=503)
+    assert policy.should_retry(transient, 2)
+    assert not policy.should_retry(transient, 3)
+    assert not policy.should_retry(SendResult(False, "HTTP 400", status_code=400), 1)
+
+
+def test_parse_retry_after():
+    assert parse_retry_after("120") == 120.0
+    assert parse_retry_after(" 5 ") == 5.0
+    in_a_minute = parse_retry_after(formatdate(time.time() + 60, usegmt=True))
+    assert 55 <= in_a_minute <= 60
+    assert parse_retry_after(formatdate(time.time() - 60, usegmt=True)) == 0.0
+    assert parse_retry_after("soon") is None
+    assert parse_retry_after("") is None
+    assert parse_retry_after(None) is None
+
+
+def post(handler):
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            return await post_message(client, URL, "key-0001", "966551234567", "hi")
+    return asyncio.run(run())
+
+
+def test_post_message_success():
+    seen = []
+
+    def handler(request):
+        seen.append(request)
+        return httpx.Response(200, json={"success": True})
+
+    result = post(handler)
+    assert result.success and result.status_code == 200 and not result.retryable
+    assert seen[0].headers["Authorization"] == "Bearer key-0001"
+    assert b'"to":"+966551234567"' in seen[0].content.replace(b" ", b"")
+
+
+@pytest.mark.parametrize("status, retryable", [(400, False), (401, False), (404, False),
+                                               (500, True), (502, True), (503, True)])
+def test_post_message_classifies_errors(status, retryable):
+    result = post(lambda request: httpx.Response(status, json={"message": "nope"}))
+    assert not result.success
+    assert result.retryable is retryable
+    assert result.status_code == status
+    assert result.info == f"HTTP {status}: nope"
+
+
+def test_post_message_throttled():
+    result = post(lambda request: httpx.Response(429, headers={"Retry-After": "7"},
+                                                 text="slow down"))
+    assert result.throttled and result.retryable
+    assert result.retry_after == 7.0
+    assert result.info == "HTTP 429: slow down"
+
+
+def test_post_message_timeout_and_connection_error():
+    def timeout(request):
+        raise httpx.ReadTimeout("timed out", request=request)
+
+    def refused(request):
+        raise httpx.ConnectError("connection refused", request=request)
+
+    result = post(timeout)
+    assert not result.success and result.retryable and result.status_code is None
+    assert result.info == "request timed out"
+    result = post(refused)
+    assert not result.success and result.retryable and result.status_code is None
@@ -0,0 +1,197 @@
+import asyncio
+import os
+import time
+from collections import Counter
+
+from messaging import JobStore, LaneScheduler, Priority, Status
+from messaging.priority import DEFAULT_POLICIES, StrideSelector
+from messaging.retry import SendResult
+
+KEY = "test-key-0001"
+
+
+def _run_lane(tmp_path, jobs, delay, idle_timeout, timeout):
+    store = JobStore(os.path.join(str(tmp_path), "queue.db"))
+    sent = []
+
+    async def run():
+        scheduler = LaneScheduler(store, delay, delay * 1.2, idle_timeout=idle_timeout,
+                                  floor_delay=delay, ceiling_delay=4 * delay)
+
+        async def handler(job):
+            sent.append(time.monotonic())
+            store.ack(job, Status.SENT)
+            return SendResult(True, "HTTP 200", status_code=200)
+
+        store.enqueue_many([{"api_key": KEY, "phone": f"+9665{i:08d}", "message": "hi",
+                             "batch_id": "campaign", "priority": Priority.BULK}
+                            for i in range(jobs)])
+        scheduler.start(handler)
+        deadline = time.monotonic() + timeout
+        while len(sent) < jobs and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        await scheduler.close()
+
+    try:
+        asyncio.run(run())
+    finally:
+        store.close()
+    return sent
+
+
+def test_lane_sends_after_parking(tmp_path):
+    # Every send is further away than idle_timeout, so the lane parks before
+    # each one; it must still send once the wait is over
+    sent = _run_lane(tmp_path, jobs=3, delay=0.8, idle_timeout=0.2, timeout=8)
+    assert len(sent) == 3
+
+
+def test_lane_without_parking(tmp_path):
+    sent = _run_lane(tmp_path, jobs=5, delay=0.05, idle_timeout=5, timeout=5)
+    assert len(sent) == 5
+    assert all(b - a >= 0.04 for a, b in zip(sent, sent[1:]))
+
+
+def test_store_lock_does_not_block_event_loop(tmp_path):
+    # A long write in a worker thread (a large bulk enqueue) holds the store
+    # lock; the lanes' store calls must wait for it off the event loop
+    store = JobStore(os.path.join(str(tmp_path), "queue.db"))
+    sent = []
+
+    async def run():
+        scheduler = LaneScheduler(store, 0.01, 0.02, floor_delay=0.01, ceiling_delay=0.1,
+                                  poll_interval=0.01)
+
+        async def handler(job):
+            sent.append(job.id)
+            await asyncio.to_thread(store.ack, job, Status.SENT)
+            return SendResult(True, "HTTP 200", status_code=200)
+
+        store.enqueue_many([{"api_key": KEY, "phone": f"+9665{i:08d}", "message": "hi",
+                             "priority": Priority.BULK} for i in range(50)])
+        scheduler.start(handler)
+
+        def hold_lock():
+            with store._lock:
+                time.sleep(0.5)
+
+        holder = asyncio.ensure_future(asyncio.to_thread(hold_lock))
+        lag = 0.0
+        while not holder.done():
+            before = time.monotonic()
+            await asyncio.sleep(0.01)
+            lag = max(lag, time.monotonic() - before - 0.01)
+        while len(sent) < 50:
+            await asyncio.sleep(0.05)
+        await scheduler.close()
+        return lag
+
+    try:
+        lag = asyncio.run(run())
+    finally:
+        store.close()
+    assert lag < 0.2
+    assert len(sent) == 50
+
+
+def test_slow_send_keeps_its_claim(tmp_path):
+    # The send outlasts the job lease; the lane renews it, so the sweep
+    # doesn't hand the job to another process mid-send
+    store = JobStore(os.path.join(str(tmp_path), "queue.db"), job_lease=0.15)
+    acked = []
+
+    async def run():
+        scheduler = LaneScheduler(store, 0.01, 0.02, floor_delay=0.01, ceiling_delay=0.1,
+                                  poll_interval=0.05, sweep_interval=0.05)
+
+        async def handler(job):
+            await asyncio.sleep(0.5)
+            acked.append(await asyncio.to_thread(store.ack, job, Status.SENT))
+            return SendResult(True, "HTTP 200", status_code=200)
+
+        store.enqueue_many([{"api_key": KEY, "phone": "+966500000000", "message": "hi",
+                             "priority": Priority.BULK}])
+        scheduler.start(handler)
+        deadline = time.monotonic() + 3
+        while not acked and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        await scheduler.close()
+
+    try:
+        asyncio.run(run())
+    finally:
+        store.close()
+    assert acked == [False]  # acked by its claimant (no batch to complete)
+
+
+def test_stride_shares_sends_by_weight():
+    selector = StrideSelector(DEFAULT_POLICIES)
+    picks = Counter(selector.pick(list(Priority)) for _ in range(12 * 10))
+    # Weights 8 : 3 : 1
+    assert picks == {Priority.TRANSACTIONAL: 80, Priority.NORMAL: 30, Priority.BULK: 10}
+
+
+def test_stride_gives_no_credit_for_idle_time():
+    selector = StrideSelector(DEFAULT_POLICIES)
+    for _ in range(50):
+        assert selector.pick([Priority.BULK]) is Priority.BULK
+    # Normal joins late: it doesn't get 50 sends in a row to catch up
+    picks = [selector.pick([Priority.NORMAL, Priority.BULK]) for _ in range(8)]
+    assert picks.count(Priority.BULK) == 2
+
+
+def _run_priorities(tmp_path, bulk, transactional, delay, idle_timeout, arrive_every,
+                    drain):
+    store = JobStore(os.path.join(str(tmp_path), "queue.db"))
+    sent = []
+
+    async def run():
+        scheduler = LaneScheduler(store, delay, delay * 1.2, idle_timeout=idle_timeout,
+                                  floor_delay=delay, ceiling_delay=4 * delay)
+
+        async def handler(job):
+            sent.append(job.priority)
+            await asyncio.to_thread(store.ack, job, Status.SENT)
+            return SendResult(True, "HTTP 200", status_code=200)
+
+        store.enqueue_many([{"api_key": KEY, "phone": f"+9665{i:08d}", "message": "campaign",
+                             "batch_id": "campaign", "priority": Priority.BULK}
+                            for i in range(bulk)])
+        scheduler.start(handler)
+        for i in range(transactional):
+            await asyncio.sleep(arrive_every)
+            store.enqueue({"api_key": KEY, "phone": f"+9665{i:08d}", "message": "code 1234",
+                           "priority": Priority.TRANSACTIONAL})
+            scheduler.notify(KEY)
+        # Without `drain`, the rest of the campaign doesn't matter
+        expected = bulk + transactional if drain else transactional
+        deadline = time.monotonic() + 10
+        while time.monotonic() < deadline and expected > (
+                len(sent) if drain else sent.count(Priority.TRANSACTIONAL)):
+            await asyncio.sleep(0.02)
+        await scheduler.close()
+        return scheduler.waits.snapshot()["transactional"]
+
+    try:
+        waits = asyncio.run(run())
+    finally:
+        store.close()
+    return waits, sent
+
+
+def test_transactional_jobs_skip_the_campaign(tmp_path):
+    waits, sent = _run_priorities(tmp_path, bulk=200, transactional=5, delay=0.05,
+                                  idle_timeout=300, arrive_every=0.1, drain=False)
+    assert sent.count(Priority.TRANSACTIONAL) == 5
+    assert sent.count(Priority.BULK) < 200
+    assert waits["count"] == 5 and waits["p95"] < 0.5
+
+
+def test_transactional_jobs_wake_a_parked_lane(tmp_path):
+    # Bulk pacing is longer than idle_timeout: the lane parks before every
+    # campaign send, and OTPs arriving meanwhile must still go out at once
+    waits, sent = _run_priorities(tmp_path, bulk=3, transactional=3, delay=0.5,
+                                  idle_timeout=0.2, arrive_every=0.3, drain=True)
+    assert sent.count(Priority.BULK) == 3
+    assert sent.count(Priority.TRANSACTIONAL) == 3
+    assert waits["p95"] < 0.5
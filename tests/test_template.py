@@ -0,0 +1,52 @@
+import random
+
+from messaging.template import GREETINGS, RTL_END, RTL_START, MessageTemplate
+
+
+def test_name_and_column_placeholders():
+    template = MessageTemplate("مرحبا [الاسم]، طلبك [order] جاهز", columns=["name", "order"],
+                               rtl=False)
+    assert template.fields == ("name", "order")
+    assert template.render({"name": "علي", "order": "A-17"}) == "مرحبا علي، طلبك A-17 جاهز"
+
+
+def test_missing_and_empty_fields_render_empty():
+    template = MessageTemplate("[الاسم]|[city]|", columns=["city"], rtl=False)
+    assert template.render({}) == "||"
+    assert template.render({"name": None, "city": ""}) == "||"
+
+
+def test_unknown_brackets_stay_literal():
+    template = MessageTemplate("[الاسم] [unknown] [ ] [a\nb]", rtl=False)
+    assert template.fields == ("name",)
+    assert template.render({"name": "Ali"}) == "Ali [unknown] [ ] [a\nb]"
+
+
+def test_braces_and_format_syntax_are_escaped():
+    template = MessageTemplate("{0} {name} {{x}} %s [الاسم] {", rtl=False)
+    assert template.render({"name": "{evil}"}) == "{0} {name} {{x}} %s {evil} {"
+
+
+def test_values_are_not_reinterpreted():
+    template = MessageTemplate("[a] [b]", columns=["a", "b"], rtl=False)
+    assert template.render({"a": "[b]", "b": "{a}"}) == "[b] {a}"
+
+
+def test_repeated_field_listed_once():
+    template = MessageTemplate("[الاسم] [الاسم]", rtl=False)
+    assert template.fields == ("name",)
+    assert template.render({"name": "Ali"}) == "Ali Ali"
+
+
+def test_pools_and_rtl_marks():
+    template = MessageTemplate("[التحية] [الاسم]")
+    rendered = template.render({"name": "Ali"}, rng=random.Random(1))
+    assert rendered.startswith(RTL_START) and rendered.endswith(RTL_END)
+    greeting = rendered[len(RTL_START):-len(" Ali" + RTL_END)]
+    assert greeting in GREETINGS
+
+
+def test_custom_pool_overrides_column():
+    template = MessageTemplate("[x]", columns=["x"], pools={"x": ["pooled"]}, rtl=False)
+    assert template.fields == ()
+    assert template.render({"x": "column"}) == "pooled"
@@ -0,0 +1,80 @@
+import asyncio
+from collections import Counter
+
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from benchmarks import mock_whatsapp_server
+from whatsapp_client_python import WhatsAppClient
+
+
+def run_against(app, scenario):
+    async def run():
+        server = TestServer(app, host="127.0.0.1")
+        await server.start_server()
+        url = str(server.make_url("")).rstrip("/")
+        client = WhatsAppClient(session_name="test", server_url=url)
+        try:
+            return await scenario(client)
+        finally:
+            await client.close()
+            await server.close()
+    return asyncio.run(run())
+
+
+async def burst(client, n):
+    return await asyncio.gather(*(client.send_message(f"+9665{i:08d}", "hi")
+                                  for i in range(n)))
+
+
+def test_concurrent_sends_share_one_token_fetch():
+    app = mock_whatsapp_server.make_app()
+
+    async def scenario(client):
+        assert all(await burst(client, 50))
+        assert all(await burst(client, 50))
+
+    run_against(app, scenario)
+    assert app["stats"]["tokens"] == 1
+    assert app["stats"]["sent"] == 100
+
+
+def test_revoked_token_is_refreshed_once():
+    app = mock_whatsapp_server.make_app()
+
+    async def scenario(client):
+        assert await client.send_message("+966500000000", "hi")
+        async with client._ensure_session().post(f"{client.server_url}/revoke-tokens"):
+            pass
+        # Every send gets a 401; they share one refresh and each retries once
+        return await burst(client, 30)
+
+    assert all(run_against(app, scenario))
+    stats = app["stats"]
+    assert (stats["tokens"], stats["unauthorized"], stats["sent"]) == (2, 30, 31)
+
+
+def test_401_is_retried_only_once():
+    stats = Counter()
+
+    async def secret_key(request):
+        return web.json_response({"secretKey": "s"})
+
+    async def generate_token(request):
+        stats["tokens"] += 1
+        return web.json_response({"full": f"token-{stats['tokens']}"}, status=201)
+
+    async def send_message(request):
+        stats["sends"] += 1
+        return web.json_response({"error": "unauthorized"}, status=401)
+
+    app = web.Application()
+    app.router.add_get("/api/secret-key", secret_key)
+    app.router.add_post("/api/{session}/{secret}/generate-token", generate_token)
+    app.router.add_post("/api/{session}/send-message", send_message)
+
+    async def scenario(client):
+        return await client.send_message_status("+966500000000", "hi")
+
+    assert run_against(app, scenario) == 401
+    assert (stats["tokens"], stats["sends"]) == (2, 2)
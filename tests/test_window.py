@@ -0,0 +1,86 @@
+from datetime import datetime, timezone
+
+import pytest
+
+from messaging.window import SendWindow, earliest_send, recipient_zone, zone
+
+RIYADH = zone("Asia/Riyadh")
+NEW_YORK = zone("America/New_York")
+
+
+def ts(text, tz):
+    return datetime.fromisoformat(text).replace(tzinfo=tz).timestamp()
+
+
+def local(epoch, tz):
+    return datetime.fromtimestamp(epoch, tz).strftime("%a %Y-%m-%d %H:%M")
+
+
+def test_parse_round_trip():
+    assert str(SendWindow.parse("09:00-21:00")) == "09:00-21:00"
+    assert str(SendWindow.parse("09:00-18:00 sun-thu")) == "09:00-18:00 mon,tue,wed,thu,sun"
+    assert SendWindow.parse("20:00-02:00 fri,sat").days == {4, 5}
+    assert SendWindow.parse("09:00-18:00 fri-mon").days == {4, 5, 6, 0}
+
+
+@pytest.mark.parametrize("text", ["", "9-21", "09:00-09:00", "09:00-18:00 someday"])
+def test_parse_rejects(text):
+    with pytest.raises(ValueError):
+        SendWindow.parse(text)
+
+
+def test_open_window_sends_now():
+    now = ts("2026-10-20T12:30", RIYADH)
+    assert SendWindow.parse("09:00-21:00").next_open(now, RIYADH) == now
+
+
+def test_before_and_after_window():
+    window = SendWindow.parse("09:00-21:00")
+    before = ts("2026-10-20T03:00", RIYADH)
+    after = ts("2026-10-20T21:00", RIYADH)   # the end is exclusive
+    assert local(window.next_open(before, RIYADH), RIYADH) == "Tue 2026-10-20 09:00"
+    assert local(window.next_open(after, RIYADH), RIYADH) == "Wed 2026-10-21 09:00"
+
+
+def test_weekdays_skip_to_next_allowed_day():
+    window = SendWindow.parse("09:00-18:00 sun-thu")
+    friday = ts("2026-10-23T10:00", RIYADH)
+    assert local(window.next_open(friday, RIYADH), RIYADH) == "Sun 2026-10-25 09:00"
+
+
+def test_overnight_window_open_from_previous_day():
+    window = SendWindow.parse("20:00-02:00 fri,sat")
+    assert window.next_open(ts("2026-10-24T01:00", RIYADH), RIYADH) == ts("2026-10-24T01:00", RIYADH)
+    assert local(window.next_open(ts("2026-10-24T03:00", RIYADH), RIYADH),
+                 RIYADH) == "Sat 2026-10-24 20:00"
+    # Sunday 01:00 is still Saturday night's window
+    sunday = ts("2026-10-25T01:00", RIYADH)
+    assert window.next_open(sunday, RIYADH) == sunday
+    assert local(window.next_open(ts("2026-10-25T02:00", RIYADH), RIYADH),
+                 RIYADH) == "Fri 2026-10-30 20:00"
+
+
+def test_same_instant_in_different_zones():
+    window = SendWindow.parse("09:00-21:00")
+    now = datetime(2026, 10, 20, 12, 0, tzinfo=timezone.utc).timestamp()  # 15:00 Riyadh, 08:00 NY
+    assert window.next_open(now, RIYADH) == now
+    assert local(window.next_open(now, NEW_YORK), NEW_YORK) == "Tue 2026-10-20 09:00"
+
+
+def test_daylight_saving_change():
+    # US clocks go forward on 2026-03-08; 09:00 that day is 13:00 UTC, not 14:00
+    window = SendWindow.parse("09:00-17:00")
+    opens = window.next_open(ts("2026-03-07T22:00", NEW_YORK), NEW_YORK)
+    assert opens == datetime(2026, 3, 8, 13, 0, tzinfo=timezone.utc).timestamp()
+
+
+def test_recipient_zone_and_earliest_send():
+    assert recipient_zone("+966551234567") is RIYADH
+    assert str(recipient_zone("+4915112345678")) == "UTC"
+    now = ts("2026-10-20T03:00", RIYADH)
+    window = SendWindow.parse("09:00-21:00")
+    assert earliest_send(now, RIYADH) == now
+    assert local(earliest_send(now, RIYADH, window=window), RIYADH) == "Tue 2026-10-20 09:00"
+    # A naive start time is local to the recipient, then the window applies
+    start = earliest_send(now, RIYADH, "2026-10-22T22:00", window)
+    assert local(start, RIYADH) == "Fri 2026-10-23 09:00"
@@ -4,6 +4,9 @@ Python implementation of WhatsApp client based on Node.js architecture
 """
 
 from .whatsapp_client import WhatsAppClient, MessageInfo
+from .auth import Token, TokenManager
+from .bulk import BulkResult, RateLimiter
 
 __version__ = "1.0.0"
-__all__ = ["WhatsAppClient", "MessageInfo"]
\ No newline at end of file
+__all__ = ["WhatsAppClient", "MessageInfo", "Token", "TokenManager",
+           "BulkResult", "RateLimiter"]
\ No newline at end of file
@@ -0,0 +1,158 @@
+"""
+Token cache for WhatsApp session authentication.
+
+Getting a token costs two round trips (secret key, then generate-token),
+so tokens are cached per session with their expiry and reused by every
+send. Concurrent callers share one in-flight fetch (single-flight), a
+background task refreshes each token shortly before it expires, and a
+send rejected with 401 asks for a new token only if nobody replaced the
+rejected one already.
+"""
+
+import asyncio
+import base64
+import json
+import time
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, Optional
+
+
+@dataclass
+class Token:
+    """An auth token and when it stops being accepted (epoch seconds)."""
+    value: str
+    expires_at: float
+
+    def expires_in(self) -> float:
+        return self.expires_at - time.time()
+
+
+# Fetches a new token for a session; None (or an exception) on failure
+TokenFetcher = Callable[[], Awaitable[Optional[Token]]]
+
+
+def token_expiry(value: str) -> Optional[float]:
+    """The `exp` claim of a JWT-shaped token, or None if it has none."""
+    parts = value.split(".")
+    if len(parts) != 3:
+        return None
+    try:
+        payload = parts[1] + "=" * (-len(parts[1]) % 4)
+        exp = json.loads(base64.urlsafe_b64decode(payload)).get("exp")
+    except (ValueError, AttributeError):
+        return None
+    return float(exp) if isinstance(exp, (int, float)) else None
+
+
+class TokenManager:
+    """
+    Cached tokens keyed by session. Tokens without an `exp` claim are
+    assumed to last `default_ttl` seconds; each one is refreshed in the
+    background `refresh_margin` seconds before it expires (a failed
+    refresh is retried every `retry_delay` seconds until it does). One
+    manager can be shared by several clients of the same sessions.
+    """
+
+    def __init__(self,
+                 default_ttl: float = 3600.0,
+                 refresh_margin: float = 300.0,
+                 retry_delay: float = 30.0):
+        self.default_ttl = default_ttl
+        self.refresh_margin = refresh_margin
+        self.retry_delay = retry_delay
+        self._tokens: Dict[str, Token] = {}
+        self._fetchers: Dict[str, TokenFetcher] = {}
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._refreshers: Dict[str, asyncio.Task] = {}
+
+    def peek(self, key: str) -> Optional[Token]:
+        """The cached token of `key` if it is still valid, without fetching."""
+        token = self._tokens.get(key)
+        if token is not None and token.expires_in() > 0:
+            return token
+        return None
+
+    async def get(self, key: str, fetch: TokenFetcher) -> Optional[Token]:
+        """A valid token for `key`: the cached one, or a freshly fetched one."""
+        token = self.peek(key)
+        if token is not None:
+            return token
+        return await self.refresh(key, fetch)
+
+    async def refresh_stale(self, key: str, stale: Optional[Token],
+                            fetch: TokenFetcher) -> Optional[Token]:
+        """
+        Replace `stale` (rejected by the server). Callers that saw the same
+        rejected token share one refresh; if it was replaced meanwhile,
+        the replacement is returned without another fetch.
+        """
+        current = self._tokens.get(key)
+        if current is not None and current is not stale and current.expires_in() > 0:
+            return current
+        if current is stale:
+            del self._tokens[key]
+        return await self.refresh(key, fetch)
+
+    async def refresh(self, key: str, fetch: Optional[TokenFetcher] = None) -> Optional[Token]:
+        """Fetch a new token for `key`, joining a fetch already in flight."""
+        if fetch is not None:
+            self._fetchers[key] = fetch
+        inflight = self._inflight.get(key)
+        if inflight is None:
+            inflight = self._inflight[key] = asyncio.ensure_future(self._fetch(key))
+        # A caller giving up doesn't cancel the fetch the others wait on
+        return await asyncio.shield(inflight)
+
+    async def _fetch(self, key: str) -> Optional[Token]:
+        try:
+            try:
+                token = await self._fetchers[key]()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"❌ Token refresh error for {key}: {e}")
+                token = None
+            if token is not None:
+                self._tokens[key] = token
+                self._schedule_refresh(key, token.expires_at - self.refresh_margin)
+            return token
+        finally:
+            self._inflight.pop(key, None)
+
+    def make_token(self, value: str) -> Token:
+        """A Token for `value`, expiring at its `exp` claim or after default_ttl."""
+        return Token(value, token_expiry(value) or time.time() + self.default_ttl)
+
+    def _schedule_refresh(self, key: str, at: float):
+        task = self._refreshers.get(key)
+        if task is not None:
+            task.cancel()
+        self._refreshers[key] = asyncio.ensure_future(self._refresh_at(key, at))
+
+    async def _refresh_at(self, key: str, at: float):
+        await asyncio.sleep(max(0.0, at - time.time()))
+        while True:
+            token = await self.refresh(key)
+            if token is not None:
+                return  # the new token scheduled the next refresh
+            current = self._tokens.get(key)
+            if current is None or current.expires_in() <= 0:
+                # Nothing left to keep alive; the next get() fetches anew
+                self._refreshers.pop(key, None)
+                return
+            await asyncio.sleep(self.retry_delay)
+
+    def invalidate(self, key: str):
+        """Forget the token of `key` (e.g. on logout)."""
+        self._tokens.pop(key, None)
+        task = self._refreshers.pop(key, None)
+        if task is not None:
+            task.cancel()
+
+    async def close(self):
+        """Stop the background refreshes."""
+        tasks = list(self._refreshers.values())
+        self._refreshers.clear()
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
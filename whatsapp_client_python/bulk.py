@@ -0,0 +1,143 @@
+"""
+Bulk send engine for WhatsAppClient.
+
+Recipients are pulled lazily from any iterable or async iterable (a list,
+a generator reading a CSV, a database cursor) by at most `concurrency`
+workers, paced by an optional RateLimiter, and each result is handed back
+as soon as it is known. Results are streamed through a small bounded
+queue, so a slow consumer slows the senders down instead of piling up
+results, and nothing holds the whole list or all of its results.
+"""
+
+import asyncio
+from dataclasses import dataclass
+from typing import (Any, AsyncIterable, AsyncIterator, Awaitable, Callable, Dict,
+                    Iterable, Optional, Tuple, Union)
+
+Recipients = Union[Iterable[Dict[str, str]], AsyncIterable[Dict[str, str]]]
+
+
+@dataclass
+class BulkResult:
+    """Outcome of one recipient; `index` is its position in the input."""
+    index: int
+    phone: Optional[str]
+    status: str                    # "sent" or "failed"
+    error: Optional[str] = None
+
+    @property
+    def sent(self) -> bool:
+        return self.status == "sent"
+
+    def as_dict(self) -> Dict[str, Any]:
+        """The entry send_bulk_messages puts in its `details`."""
+        detail = {"phone": self.phone, "status": self.status}
+        if self.error is not None:
+            detail["error"] = self.error
+        return detail
+
+
+class RateLimiter:
+    """
+    At most `rate` acquisitions per second, allowing bursts of up to
+    `burst` after an idle period. Shared by all the tasks it paces (the
+    sends of one session, an SMTP batch in messaging.mailer).
+    """
+
+    def __init__(self, rate: float, burst: int = 1):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.interval = 1.0 / rate
+        self.burst = max(1, burst)
+        self._next_slot = 0.0
+
+    async def acquire(self):
+        """Wait for the next free send slot."""
+        now = asyncio.get_running_loop().time()
+        # Unused slots of an idle period carry over, up to `burst`
+        slot = max(self._next_slot, now - (self.burst - 1) * self.interval)
+        self._next_slot = slot + self.interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+
+async def _iterate(recipients: Recipients) -> AsyncIterator[Dict[str, str]]:
+    if hasattr(recipients, "__aiter__"):
+        async for recipient in recipients:
+            yield recipient
+    else:
+        for recipient in recipients:
+            yield recipient
+
+
+async def run_bulk(send: Callable[[str, str], Awaitable[bool]],
+                   recipients: Recipients,
+                   concurrency: int = 8,
+                   limiter: Optional[RateLimiter] = None) -> AsyncIterator[BulkResult]:
+    """
+    Send `{"phone", "message"}` recipients with `send(phone, message)`,
+    at most `concurrency` at a time, and yield each BulkResult as it
+    completes (not in input order). Closing the iterator early stops
+    the remaining sends.
+    """
+    if concurrency < 1:
+        raise ValueError("concurrency must be at least 1")
+    source = _iterate(recipients)
+    pull = asyncio.Lock()       # one worker at a time advances the source
+    counter = iter(range(1 << 62))
+    results: asyncio.Queue = asyncio.Queue(maxsize=concurrency)
+
+    async def next_recipient() -> Optional[Tuple[int, Dict[str, str]]]:
+        async with pull:
+            try:
+                recipient = await source.__anext__()
+            except StopAsyncIteration:
+                return None
+            return next(counter), recipient
+
+    async def worker():
+        while True:
+            item = await next_recipient()
+            if item is None:
+                return
+            index, recipient = item
+            phone = recipient.get("phone")
+            message = recipient.get("message")
+            if not phone or not message:
+                await results.put(BulkResult(index, phone, "failed",
+                                             "Missing phone or message"))
+                continue
+            if limiter is not None:
+                await limiter.acquire()
+            try:
+                sent = await send(phone, message)
+                result = BulkResult(index, phone, "sent" if sent else "failed")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                result = BulkResult(index, phone, "failed", str(e))
+            await results.put(result)
+
+    async def run_workers():
+        try:
+            await asyncio.gather(*(worker() for _ in range(concurrency)))
+        except asyncio.CancelledError:
+            raise  # the consumer left: nobody reads the end marker (the queue may be full)
+        except BaseException:
+            await results.put(None)
+            raise
+        await results.put(None)
+
+    runner = asyncio.ensure_future(run_workers())
+    try:
+        while True:
+            result = await results.get()
+            if result is None:
+                break
+            yield result
+        await runner  # re-raise a failure of the recipient source
+    finally:
+        if not runner.done():
+            runner.cancel()
+            await asyncio.gather(runner, return_exceptions=True)
+        await source.aclose()
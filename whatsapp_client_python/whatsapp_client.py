@@ -8,10 +8,15 @@ import asyncio
 import aiohttp
 import json
 import time
-from typing import Dict, List, Optional, Any, Callable
+from typing import AsyncIterator, Dict, List, Optional, Any, Callable, Union
 from dataclasses import dataclass
 from datetime import datetime
-import requests
+
+from .auth import Token, TokenManager
+from .bulk import BulkResult, RateLimiter, Recipients, run_bulk
+
+# Seconds to wait for the server to accept one message
+SEND_TIMEOUT = 90
 
 @dataclass
 class MessageInfo:
@@ -30,7 +35,11 @@ class WhatsAppClient:
     def __init__(self,
                  session_name: str = "mohamed_session",
                  server_url: Optional[str] = None,
-                 api_key: Optional[str] = None):
+                 api_key: Optional[str] = None,
+                 max_connections: int = 100,
+                 max_connections_per_host: int = 32,
+                 token_manager: Optional[TokenManager] = None,
+                 rate_limit: Union[None, float, RateLimiter] = None):
         """
         Initialize WhatsApp client
 
@@ -38,14 +47,35 @@ class WhatsAppClient:
             session_name: Name of the WhatsApp session
             server_url: Server URL (optional, uses default if not provided)
             api_key: Master API Key (for identification purposes)
+            max_connections: Size of the HTTP connection pool
+            max_connections_per_host: Pooled connections to the server
+                (bounds concurrent sends)
+            token_manager: Token cache to use (share one between clients
+                of the same sessions); by default the client has its own
+            rate_limit: Most messages per second this session sends, or a
+                RateLimiter shared with other clients of the session;
+                unlimited by default
         """
         self.session_name = session_name
         self.server_url = server_url or "https://siyadah-whatsapp-saas.onrender.com"
         self.api_key = api_key
+        self.max_connections = max_connections
+        self.max_connections_per_host = max_connections_per_host
         self.secret_key: Optional[str] = None
         self.auth_token: Optional[str] = None
         self.authenticated = False
 
+        # Cached auth tokens, refreshed in the background before they expire
+        self._owns_tokens = token_manager is None
+        self.tokens = token_manager or TokenManager()
+        self._token_key = f"{self.server_url}|{self.session_name}"
+
+        # Pacing of every send of this session, bulk or not
+        if isinstance(rate_limit, RateLimiter) or rate_limit is None:
+            self.rate_limiter = rate_limit
+        else:
+            self.rate_limiter = RateLimiter(rate_limit)
+
         # Webhook functionality
         self.webhook_running = False
         self.webhook_port: Optional[int] = None
@@ -57,20 +87,53 @@ class WhatsAppClient:
 
     async def __aenter__(self):
         """Async context manager entry"""
-        self.session = aiohttp.ClientSession()
+        self._ensure_session()
         await self._authenticate()
         return self
 
+    def _ensure_session(self) -> aiohttp.ClientSession:
+        """
+        The client's pooled HTTP session, created on first use. Connections
+        to the server are kept alive and reused by every request, DNS
+        answers are cached, and at most `max_connections_per_host` requests
+        are in flight at once.
+        """
+        if self.session is None or self.session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.max_connections,
+                limit_per_host=self.max_connections_per_host,
+                ttl_dns_cache=300,
+                keepalive_timeout=60,
+            )
+            self.session = aiohttp.ClientSession(connector=connector)
+        return self.session
+
     async def __aexit__(self, exc_type, exc_val, exc_tb):
         """Async context manager exit"""
-        if self.session:
-            await self.session.close()
+        await self.close()
 
-    async def _authenticate(self) -> bool:
-        """Internal authentication method"""
+    async def _authenticate(self, force: bool = False) -> bool:
+        """
+        Make sure the client holds a valid token: the cached one unless
+        `force`, otherwise a new one. Concurrent calls share one fetch.
+        """
+        if force:
+            token = await self.tokens.refresh(self._token_key, self._fetch_token)
+        else:
+            token = await self.tokens.get(self._token_key, self._fetch_token)
+        return self._use_token(token)
+
+    def _use_token(self, token: Optional[Token]) -> bool:
+        if token is None:
+            return False
+        self.auth_token = token.value
+        self.authenticated = True
+        return True
+
+    async def _fetch_token(self) -> Optional[Token]:
+        """Get a new auth token from the server (two round trips)."""
         try:
-            if not self.session:
-                self.session = aiohttp.ClientSession()
+            self._ensure_session()
 
             # Step 1: Get secret key
             async with self.session.get(
@@ -81,7 +144,7 @@ class WhatsAppClient:
                     self.secret_key = data.get("secretKey", "")
                 else:
                     print(f"❌ Failed to get secret key: {response.status}")
-                    return False
+                    return None
 
             # Step 2: Generate auth token
             async with self.session.post(
@@ -89,20 +152,18 @@ class WhatsAppClient:
                     timeout=aiohttp.ClientTimeout(total=10)) as response:
                 if response.status == 201:
                     data = await response.json()
-                    self.auth_token = data.get("full", "")
-                    self.authenticated = True
                     print(
                         f"✅ WhatsApp authentication successful for session: {self.session_name}"
                     )
-                    return True
+                    return self.tokens.make_token(data.get("full", ""))
                 else:
                     print(
                         f"❌ Failed to generate auth token: {response.status}")
-                    return False
+                    return None
 
         except Exception as e:
             print(f"❌ Authentication error: {e}")
-            return False
+            return None
 
     async def is_connected(self) -> bool:
         """Check if WhatsApp session is connected"""
@@ -122,82 +183,131 @@ class WhatsAppClient:
             print(f"❌ Connection check error: {e}")
             return False
 
-    
+    async def send_message(self, phone: str, message: str) -> bool:
+        """
+        Send a WhatsApp message.
 
-    def send_message(self, phone: str, message: str) -> bool:
+        Runs on the client's pooled session, so the event loop keeps
+        serving other sends while this one waits on the server (up to
+        SEND_TIMEOUT seconds). A send rejected with 401 (token expired or
+        revoked) is retried once with a refreshed token. Waits for a slot
+        of the session's rate limit first, if it has one.
         """
-        Send a WhatsApp message (synchronous version).
+        return await self.send_message_status(phone, message) in (200, 201)
+
+    async def send_message_status(self, phone: str, message: str) -> Optional[int]:
         """
-        if not self.authenticated:
-            if not self._authenticate():  # also needs to be rewritten sync
-                return False
+        Send a WhatsApp message like send_message, but return the server's
+        final HTTP status: None if no response was received (no token,
+        timeout, connection error).
+        """
+        if self.rate_limiter is not None:
+            await self.rate_limiter.acquire()
+        token = await self.tokens.get(self._token_key, self._fetch_token)
+        if not self._use_token(token):
+            return None
 
         try:
-            headers = {
-                "Content-Type": "application/json",
-                "Authorization": f"Bearer {self.auth_token}"
-            }
-
-            payload = {"phone": phone, "message": message}
-
-            resp = requests.post(
-                f"{self.server_url}/api/{self.session_name}/send-message",
-                json=payload,
-                headers=headers,
-                timeout=90
-            )
-            print(resp)
-            if resp.status_code in [200, 201]:
+            status = await self._post_message(phone, message, token)
+            if status == 401:
+                print(f"🔑 Token rejected, refreshing for session: {self.session_name}")
+                token = await self.tokens.refresh_stale(self._token_key, token,
+                                                        self._fetch_token)
+                if not self._use_token(token):
+                    return None
+                status = await self._post_message(phone, message, token)
+
+            if status in [200, 201]:
                 print(f"✅ Message sent successfully to {phone}")
-                return True
             else:
-                print(f"❌ Message send failed: {resp.status_code}")
-                return False
+                print(f"❌ Message send failed: {status}")
+            return status
 
         except Exception as e:
             print(f"❌ Send error: {e}")
-            return False
+            return None
+
+    async def _post_message(self, phone: str, message: str, token: Token) -> int:
+        """POST one message; returns the HTTP status."""
+        headers = {
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {token.value}"
+        }
+
+        payload = {"phone": phone, "message": message}
+
+        async with self._ensure_session().post(
+                f"{self.server_url}/api/{self.session_name}/send-message",
+                json=payload,
+                headers=headers,
+                timeout=aiohttp.ClientTimeout(total=SEND_TIMEOUT)) as response:
+            # Read the body so the connection goes back to the pool
+            await response.read()
+            return response.status
+
+    def stream_bulk_messages(self,
+                             recipients: Recipients,
+                             concurrency: int = 8,
+                             delay: float = 0) -> AsyncIterator[BulkResult]:
+        """
+        Send messages to many recipients, yielding each BulkResult as soon
+        as it is known (in completion order; `index` gives the position
+        in `recipients`).
 
+        Args:
+            recipients: Iterable or async iterable of dictionaries with
+                'phone' and 'message' keys; consumed lazily, so a generator
+                over a huge file is never loaded at once
+            concurrency: Most sends in flight at once
+            delay: Minimum seconds between the starts of two sends of this
+                run (on top of the session's rate_limit)
+
+        Usage:
+            async for result in client.stream_bulk_messages(rows, concurrency=16):
+                ...
+        """
+        limiter = RateLimiter(1.0 / delay) if delay > 0 else None
+        return run_bulk(self.send_message, recipients, concurrency, limiter)
 
     async def send_bulk_messages(self,
-                                 recipients: List[Dict[str, str]],
-                                 delay: int = 2) -> Dict[str, Any]:
+                                 recipients: Recipients,
+                                 delay: float = 2,
+                                 concurrency: int = 8,
+                                 on_result: Optional[Callable[[BulkResult], Any]] = None,
+                                 keep_details: bool = True) -> Dict[str, Any]:
         """
         Send messages to multiple recipients
 
         Args:
-            recipients: List of dictionaries with 'phone' and 'message' keys
-            delay: Delay between messages in seconds
+            recipients: Iterable or async iterable of dictionaries with
+                'phone' and 'message' keys
+            delay: Minimum seconds between the starts of two sends
+            concurrency: Most sends in flight at once
+            on_result: Called (or awaited, if it is a coroutine function)
+                with each BulkResult as it completes
+            keep_details: Collect a per-recipient `details` list (in input
+                order); turn it off for large lists and use on_result instead
 
         Returns:
             Results summary dictionary
         """
-        results = {"sent": 0, "failed": 0, "details": []}
-
-        for recipient in recipients:
-            phone = recipient.get("phone")
-            message = recipient.get("message")
-
-            if not phone or not message:
-                results["failed"] += 1
-                results["details"].append({
-                    "phone": phone,
-                    "status": "failed",
-                    "error": "Missing phone or message"
-                })
-                continue
-
-            success = await self.send_message(phone, message)
-            if success:
-                results["sent"] += 1
-                results["details"].append({"phone": phone, "status": "sent"})
-            else:
-                results["failed"] += 1
-                results["details"].append({"phone": phone, "status": "failed"})
-
-            if delay > 0:
-                await asyncio.sleep(delay)
+        results = {"sent": 0, "failed": 0}
+        details: List[BulkResult] = []
+        is_async = asyncio.iscoroutinefunction(on_result)
+
+        async for result in self.stream_bulk_messages(recipients, concurrency, delay):
+            results["sent" if result.sent else "failed"] += 1
+            if keep_details:
+                details.append(result)
+            if on_result is not None:
+                if is_async:
+                    await on_result(result)
+                else:
+                    on_result(result)
 
+        if keep_details:
+            details.sort(key=lambda result: result.index)
+            results["details"] = [result.as_dict() for result in details]
         return results
 
     def get_status(self) -> Dict[str, Any]:
@@ -216,7 +326,7 @@ class WhatsAppClient:
 
     async def refresh_authentication(self) -> bool:
         """Refresh authentication tokens"""
-        return await self._authenticate()
+        return await self._authenticate(force=True)
 
     def get_received_messages(self) -> List[MessageInfo]:
         """Get all received messages"""
@@ -306,7 +416,7 @@ class WhatsAppClient:
 
         try:
             # Test server reachability
-            async with self.session.get(
+            async with self._ensure_session().get(
                     f"{self.server_url}/api/secret-key",
                     timeout=aiohttp.ClientTimeout(total=5)) as response:
                 results["server_reachable"] = response.status == 200
@@ -333,7 +443,9 @@ class WhatsAppClient:
         return results
 
     async def close(self):
-        """Close the HTTP session"""
+        """Close the HTTP session (and stop refreshing this client's tokens)"""
+        if self._owns_tokens:
+            await self.tokens.close()
         if self.session:
             await self.session.close()
 